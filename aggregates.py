@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import DATA_PATH, cache_path, load_dataset
+
+# Customers above this net profitability count as "high value" on the overview page
+HIGH_VALUE_THRESHOLD = 2000
+# Pseudo-dimension holding the whole-base totals
+ALL = "__all__"
+CUBE_FILE = "overview_cube.pkl"
+# Profitability histogram: same column and bin count the dashboard used to hand to px.histogram
+PROFIT_COLUMN = "Rentabilite_Nette_Simulee"
+PROFIT_BINS = 40
+PROFIT_FILE = "profit_distribution.pkl"
+# Grid points of the binned KDE; cost is O(rows + grid log grid) whatever the row count
+KDE_GRID = 1024
+
+
+def build_overview_cube(df, dimensions=None):
+    """Counts, sums and means by each categorical dimension x Churn.
+
+    One small long-format table (dimension, value, Churn, ...) answers every
+    figure on the Executive Overview page without touching customer rows.
+    """
+    if dimensions is None:
+        dimensions = [c for c in df.select_dtypes(include=["category", "object"]).columns
+                      if c not in ("customerID", "Churn")]
+
+    base = pd.DataFrame({
+        "Churn": df["Churn"],
+        "count": np.ones(len(df), dtype=np.int64),
+        "total_charges": df["TotalCharges"].astype(np.float64),
+        "sentiment_sum": df["Score_Sentiment_Dernier_Mois"].astype(np.float64),
+        "high_value": (df["Rentabilite_Nette_Simulee"] > HIGH_VALUE_THRESHOLD).astype(np.int64),
+    })
+
+    parts = []
+    for dim in [ALL] + list(dimensions):
+        keys = [np.full(len(df), "All")] if dim == ALL else [df[dim]]
+        grouped = base.groupby(keys + [base["Churn"]], observed=True).sum(numeric_only=True)
+        grouped.index.names = ["value", "Churn"]
+        grouped = grouped.reset_index()
+        grouped.insert(0, "dimension", dim)
+        parts.append(grouped)
+
+    cube = pd.concat(parts, ignore_index=True)
+    cube["value"] = cube["value"].astype(str)
+    cube["Churn"] = cube["Churn"].astype(str)
+    cube["sentiment_mean"] = cube["sentiment_sum"] / cube["count"]
+    return cube
+
+
+def _load_or_build(path, filename, build):
+    # Aggregates are stored next to the data cache, so a new dataset version gets fresh ones
+    target = os.path.join(cache_path(path), filename)
+    if os.path.exists(target):
+        return pd.read_pickle(target)
+
+    result = build(load_dataset(path))
+    tmp = target + ".tmp"
+    pd.to_pickle(result, tmp)
+    os.replace(tmp, target)
+    return result
+
+
+def load_overview_cube(path=DATA_PATH):
+    """The cube for the current version of ``path``, built once and stored next to its data cache."""
+    return _load_or_build(path, CUBE_FILE, build_overview_cube)
+
+
+def build_profit_distribution(df, column=PROFIT_COLUMN, bins=PROFIT_BINS):
+    """Histogram counts and box-plot statistics of ``column`` for each Churn value.
+
+    Bin edges are shared (computed over the whole column, as ``px.histogram`` does),
+    box statistics follow Plotly's defaults (linear quartiles, Tukey whiskers at the
+    furthest points within 1.5 IQR). A few hundred numbers, whatever the row count.
+    """
+    values = df[column].to_numpy(dtype=np.float64)
+    churn = df["Churn"].astype(str).to_numpy()
+    present = ~np.isnan(values)
+    edges = np.histogram_bin_edges(values[present], bins=bins)
+
+    groups = {}
+    for label in sorted(np.unique(churn)):
+        group = values[present & (churn == label)]
+        if not len(group):
+            continue
+        q1, median, q3 = np.quantile(group, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        groups[label] = {
+            "counts": np.histogram(group, bins=edges)[0],
+            "box": {
+                "q1": float(q1), "median": float(median), "q3": float(q3), "mean": float(group.mean()),
+                "lowerfence": float(group[group >= q1 - 1.5 * iqr].min()),
+                "upperfence": float(group[group <= q3 + 1.5 * iqr].max()),
+                "n": int(len(group)),
+            },
+        }
+    return {"column": column, "edges": edges, "groups": groups}
+
+
+def load_profit_distribution(path=DATA_PATH):
+    return _load_or_build(path, PROFIT_FILE, build_profit_distribution)
+
+
+def binned_kde(values, grid_size=KDE_GRID, bw_adjust=1.0, cut=3):
+    """Gaussian KDE on a regular grid: linear binning, then one FFT convolution.
+
+    Same Scott's-rule bandwidth as seaborn's ``kdeplot`` (scaled by ``bw_adjust``), and
+    the grid spans the data plus ``cut`` bandwidths on each side. Returns ``(grid, density)``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    n = len(values)
+    bandwidth = bw_adjust * values.std(ddof=1) * n ** (-1 / 5) if n > 1 else 0.0
+    if bandwidth <= 0:
+        bandwidth = 1.0
+    grid = np.linspace(values.min() - cut * bandwidth, values.max() + cut * bandwidth, grid_size)
+    step = grid[1] - grid[0]
+
+    # Linear binning: each point splits its weight between the two nearest grid points
+    pos = (values - grid[0]) / step
+    left = np.clip(np.floor(pos).astype(np.intp), 0, grid_size - 2)
+    frac = pos - left
+    weights = (np.bincount(left, 1 - frac, minlength=grid_size)
+               + np.bincount(left + 1, frac, minlength=grid_size))
+
+    # Kernel sampled on the grid out to 4 bandwidths; zero padding makes the FFT convolution linear
+    half = min(grid_size - 1, int(np.ceil(4 * bandwidth / step)))
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = grid_size + len(kernel) - 1
+    density = np.fft.irfft(np.fft.rfft(weights, size) * np.fft.rfft(kernel, size), size)[half:half + grid_size]
+    return grid, np.maximum(density, 0) / n
+
+
+def overview_kpis(cube):
+    totals = cube[cube["dimension"] == ALL].set_index("Churn")
+    n = totals["count"].sum()
+    churned = totals.loc["Yes"] if "Yes" in totals.index else None
+    return {
+        "churn_rate": 100 * (churned["count"] / n if churned is not None else 0.0),
+        "revenue_at_risk": churned["total_charges"] if churned is not None else 0.0,
+        "avg_sentiment": totals["sentiment_sum"].sum() / n,
+        "high_value_losses": int(churned["high_value"]) if churned is not None else 0,
+    }
+
+
+def category_counts(cube, dimension):
+    # Same shape the dashboard used to build with groupby + merge
+    counts = cube[cube["dimension"] == dimension][["value", "Churn", "count"]]
+    counts = counts.rename(columns={"value": dimension, "count": "Count"})
+    counts["Total"] = counts.groupby(dimension)["Count"].transform("sum")
+    counts["Percentage"] = counts["Count"] / counts["Total"] * 100
+    return counts.reset_index(drop=True)
+
+
+def segment_churn_rate(cube, dimension, value):
+    rows = cube[(cube["dimension"] == dimension) & (cube["value"] == value)]
+    total = rows["count"].sum()
+    if total == 0:
+        return 0.0
+    return rows.loc[rows["Churn"] == "Yes", "count"].sum() / total
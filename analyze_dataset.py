@@ -1,134 +1,319 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-def analyze():
-    filename = "Telco_Churn_Enrichi_GCP.csv"
-    report_file = "analysis_report.md"
-    
+from data_cache import coerce_numeric, load_dataset
+from streaming_stats import DistinctRowHashes, Moments, QuantileSketch, RunningCovariance
+
+def _write_report(f, summary):
+    # Renders the markdown report (and its plots) from a summary that either the in-memory
+    # path (analyze) or the streaming path (analyze_streaming) fills in:
+    # filename, rows, columns, missing (Series), duplicates, target_col, target_counts (Series),
+    # describe (describe().transpose() layout) and corr (DataFrame, or None)
+    # Plotting libraries are imported by the report writer only: the profiling workers never need them
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    rows = summary['rows']
+    f.write(f"# Analysis of {summary['filename']}\n\n")
+
+    # Basic Info
+    f.write("## 1. Dataset Overview\n")
+    f.write(f"- **Rows:** {rows}\n")
+    f.write(f"- **Columns:** {len(summary['columns'])}\n\n")
+
+    f.write("### Columns:\n")
+    f.write(", ".join([f"`{c}`" for c in summary['columns']]) + "\n\n")
+
+    # Missing Values
+    f.write("## 2. Data Quality\n")
+    missing = summary['missing']
+    missing = missing[missing > 0]
+    if not missing.empty:
+        f.write("### Missing Values:\n| Column | Missing Count | Percentage |\n|---|---|---|\n")
+        for col, val in missing.items():
+            pct = (val / rows) * 100
+            f.write(f"| {col} | {val} | {pct:.2f}% |\n")
+    else:
+        f.write("No missing values found.\n")
+    f.write("\n")
+
+    # Duplicates
+    f.write(f"**Duplicate Rows:** {summary['duplicates']}\n\n")
+
+    # Target Analysis
+    target_col = summary['target_col']
+    if target_col:
+        f.write(f"## 3. Target Variable Analysis ({target_col})\n")
+        val_counts = summary['target_counts'].sort_values(ascending=False)
+        f.write("| Value | Count | Percentage |\n|---|---|---|\n")
+        for val, count in val_counts.items():
+            pct = (count / rows) * 100
+            f.write(f"| {val} | {count} | {pct:.2f}% |\n")
+        f.write("\n")
+
+        # Plot (from the counts, so both paths draw the same chart)
+        try:
+            plt.figure(figsize=(6, 4))
+            sns.barplot(x=val_counts.index.astype(str), y=val_counts.values)
+            plt.title(f'Distribution of {target_col}')
+            plt.xlabel(target_col)
+            plt.ylabel('count')
+            plt.savefig('churn_distribution.png')
+            plt.close()
+            f.write("![Churn Distribution](churn_distribution.png)\n\n")
+        except Exception as e:
+            f.write(f"*(Could not generate plot: {e})*\n\n")
+
+    # Numeric Summary
+    f.write("## 4. Numeric Features Summary\n")
+    desc = summary['describe']
+    # Convert to markdown table manually or use to_markdown if available (pandas > 1.0)
+    try:
+        f.write(desc.to_markdown())
+    except:
+         f.write(desc.to_string())
+    f.write("\n\n")
+
+    # Correlation
+    f.write("## 5. Correlations\n")
+    corr = summary['corr']
+    if corr is not None:
+        f.write("### Top Correlations:\n")
+        # Unstack and sort
+        corr_pairs = corr.unstack().sort_values(ascending=False)
+        # Remove self correlations (1.0) and duplicates
+        corr_pairs = corr_pairs[corr_pairs < 1.0]
+        # Drop duplicates (A-B is same as B-A) - messy to do easily, so just print top 10 distinct
+
+        f.write("| Feature 1 | Feature 2 | Correlation |\n|---|---|---|\n")
+        seen = set()
+        count = 0
+        for index, value in corr_pairs.items():
+            if count >= 10: break
+            (a, b) = index
+            if (b, a) not in seen:
+                seen.add((a, b))
+                f.write(f"| {a} | {b} | {value:.4f} |\n")
+                count += 1
+        f.write("\n")
+
+        try:
+            plt.figure(figsize=(10, 8))
+            sns.heatmap(corr, annot=False, cmap='coolwarm')
+            plt.title('Correlation Matrix')
+            plt.tight_layout()
+            plt.savefig('correlation_matrix.png')
+            plt.close()
+            f.write("![Correlation Matrix](correlation_matrix.png)\n\n")
+        except Exception as e:
+             f.write(f"*(Could not generate heatmap: {e})*\n")
+
+
+def analyze(filename="Telco_Churn_Enrichi_GCP.csv", report_file="analysis_report.md"):
     try:
-        df = pd.read_csv(filename)
+        df = load_dataset(filename)
     except Exception as e:
         print(f"Error reading file: {e}")
         return
 
-    with open(report_file, "w", encoding="utf-8") as f:
-        f.write(f"# Analysis of {filename}\n\n")
-        
-        # Basic Info
-        f.write("## 1. Dataset Overview\n")
-        f.write(f"- **Rows:** {df.shape[0]}\n")
-        f.write(f"- **Columns:** {df.shape[1]}\n\n")
-        
-        f.write("### Columns:\n")
-        f.write(", ".join([f"`{c}`" for c in df.columns]) + "\n\n")
-        
-        # Missing Values
-        f.write("## 2. Data Quality\n")
-        missing = df.isnull().sum()
-        missing = missing[missing > 0]
-        if not missing.empty:
-            f.write("### Missing Values:\n| Column | Missing Count | Percentage |\n|---|---|---|\n")
-            for col, val in missing.items():
-                pct = (val / len(df)) * 100
-                f.write(f"| {col} | {val} | {pct:.2f}% |\n")
-        else:
-            f.write("No missing values found.\n")
-        f.write("\n")
-        
-        # Duplicates
-        dupes = df.duplicated().sum()
-        f.write(f"**Duplicate Rows:** {dupes}\n\n")
-        
-        # Target Analysis
-        target_col = None
-        for col in df.columns:
-            if 'churn' in col.lower():
-                target_col = col
-                break
-        
-        if target_col:
-            f.write(f"## 3. Target Variable Analysis ({target_col})\n")
-            val_counts = df[target_col].value_counts()
-            f.write("| Value | Count | Percentage |\n|---|---|---|\n")
-            for val, count in val_counts.items():
-                pct = (count / len(df)) * 100
-                f.write(f"| {val} | {count} | {pct:.2f}% |\n")
-            f.write("\n")
-            
-            # Plot
-            try:
-                plt.figure(figsize=(6, 4))
-                sns.countplot(x=target_col, data=df)
-                plt.title(f'Distribution of {target_col}')
-                plt.savefig('churn_distribution.png')
-                plt.close()
-                f.write("![Churn Distribution](churn_distribution.png)\n\n")
-            except Exception as e:
-                f.write(f"*(Could not generate plot: {e})*\n\n")
-        
-        # Numeric Summary
-        f.write("## 4. Numeric Features Summary\n")
-        desc = df.describe().transpose()
-        # Convert to markdown table manually or use to_markdown if available (pandas > 1.0)
+    target_col = None
+    for col in df.columns:
+        if 'churn' in col.lower():
+            target_col = col
+            break
+
+    # Select numeric columns
+    numeric_df = df.select_dtypes(include=[np.number])
+    # Identify non-numeric columns that might be interesting to convert (like Target)
+    if target_col and target_col not in numeric_df.columns:
+        # Try to encode
         try:
-            f.write(desc.to_markdown())
+            numeric_df['encoded_target'] = df[target_col].factorize()[0]
         except:
-             f.write(desc.to_string())
-        f.write("\n\n")
-
-        # Correlation
-        f.write("## 5. Correlations\n")
-        # Select numeric columns
-        numeric_df = df.select_dtypes(include=[np.number])
-        
-        # Identify non-numeric columns that might be interesting to convert (like Target)
-        if target_col and target_col not in numeric_df.columns:
-            # Try to encode
-            try:
-                df['encoded_target'] = df[target_col].factorize()[0]
-                numeric_df['encoded_target'] = df['encoded_target']
-            except:
-                pass
-        
-        if not numeric_df.empty:
-            corr = numeric_df.corr()
-            f.write("### Top Correlations:\n")
-            # Unstack and sort
-            corr_pairs = corr.unstack().sort_values(ascending=False)
-            # Remove self correlations (1.0) and duplicates
-            corr_pairs = corr_pairs[corr_pairs < 1.0] 
-            # Drop duplicates (A-B is same as B-A) - messy to do easily, so just print top 10 distinct
-            
-            f.write("| Feature 1 | Feature 2 | Correlation |\n|---|---|---|\n")
-            seen = set()
-            count = 0
-            for index, value in corr_pairs.items():
-                if count >= 10: break
-                (a, b) = index
-                if (b, a) not in seen:
-                    seen.add((a, b))
-                    f.write(f"| {a} | {b} | {value:.4f} |\n")
-                    count += 1
-            f.write("\n")
-            
-            try:
-                plt.figure(figsize=(10, 8))
-                sns.heatmap(corr, annot=False, cmap='coolwarm')
-                plt.title('Correlation Matrix')
-                plt.tight_layout()
-                plt.savefig('correlation_matrix.png')
-                plt.close()
-                f.write("![Correlation Matrix](correlation_matrix.png)\n\n")
-            except Exception as e:
-                 f.write(f"*(Could not generate heatmap: {e})*\n")
-        
+            pass
+
+    summary = {
+        'filename': filename,
+        'rows': len(df),
+        'columns': list(df.columns),
+        'missing': df.isnull().sum(),
+        'duplicates': df.duplicated().sum(),
+        'target_col': target_col,
+        'target_counts': df[target_col].value_counts() if target_col else None,
+        'describe': df.describe().transpose(),
+        'corr': numeric_df.corr() if not numeric_df.empty else None,
+    }
+    with open(report_file, "w", encoding="utf-8") as f:
+        _write_report(f, summary)
+
     print(f"Analysis complete. Report saved to {report_file}")
 
+
+
+# --- STREAMING MODE ---
+# Same report, computed in one pass over CSV chunks with mergeable accumulators,
+# so the extract never has to fit in memory and chunks can be profiled in parallel.
+class ProfileState:
+    def __init__(self, columns, numeric_cols, target_col, target_codes, sketch_size=10_000, seed=0, part=0):
+        self.columns = list(columns)
+        self.numeric_cols = list(numeric_cols)
+        self.target_col = target_col
+        # Fixed label -> code mapping (from the first chunk) so every worker encodes the target alike
+        self.target_codes = target_codes
+        corr_cols = self.numeric_cols + (['encoded_target'] if target_col and target_col not in numeric_cols else [])
+        self.corr_cols = corr_cols
+
+        self.rows = 0
+        self.missing = pd.Series(0, index=self.columns, dtype=np.int64)
+        self.duplicates = DistinctRowHashes()
+        self.target_counts = pd.Series(dtype=np.int64)
+        self.moments = Moments(len(self.numeric_cols))
+        # Seeded per column and per chunk profiled apart (part), so merged sketches never share priorities
+        # and the streamed quartiles are the same on every run
+        self.seed = seed
+        self.sketches = {col: QuantileSketch(sketch_size, seed=[seed, part, i])
+                         for i, col in enumerate(self.numeric_cols)}
+        self.covariance = RunningCovariance(len(corr_cols))
+
+    def update(self, chunk):
+        # Chunks arrive as text (see profile_csv); numeric columns get the same dtype in every chunk
+        numeric = pd.DataFrame({col: pd.to_numeric(chunk[col], errors='coerce')
+                                for col in self.numeric_cols}, index=chunk.index, dtype=np.float64)
+        chunk = chunk.assign(**numeric)
+        self.rows += len(chunk)
+        self.missing = self.missing.add(chunk.isnull().sum(), fill_value=0).astype(np.int64)
+        self.duplicates.update(chunk)
+
+        values = numeric.to_numpy(dtype=np.float64)
+        self.moments.update(values)
+        for i, col in enumerate(self.numeric_cols):
+            self.sketches[col].update(values[:, i])
+
+        if self.target_col:
+            counts = chunk[self.target_col].value_counts()
+            self.target_counts = self.target_counts.add(counts, fill_value=0).astype(np.int64)
+            if 'encoded_target' in self.corr_cols:
+                numeric['encoded_target'] = chunk[self.target_col].map(self.target_codes).astype(np.float64)
+        self.covariance.update(numeric[self.corr_cols].to_numpy(dtype=np.float64))
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.missing = self.missing.add(other.missing, fill_value=0).astype(np.int64)
+        self.duplicates.merge(other.duplicates)
+        self.target_counts = self.target_counts.add(other.target_counts, fill_value=0).astype(np.int64)
+        self.moments.merge(other.moments)
+        for col in self.numeric_cols:
+            self.sketches[col].merge(other.sketches[col])
+        self.covariance.merge(other.covariance)
+        return self
+
+    def describe(self):
+        # Same layout as DataFrame.describe().transpose()
+        quartiles = np.array([self.sketches[col].quantile([0.25, 0.5, 0.75]) for col in self.numeric_cols])
+        return pd.DataFrame({
+            'count': self.moments.count, 'mean': self.moments.mean, 'std': self.moments.std,
+            'min': self.moments.min, '25%': quartiles[:, 0], '50%': quartiles[:, 1], '75%': quartiles[:, 2],
+            'max': self.moments.max,
+        }, index=self.numeric_cols)
+
+    def correlation(self):
+        return pd.DataFrame(self.covariance.correlation(), index=self.corr_cols, columns=self.corr_cols)
+
+
+def _new_state(first_chunk, seed=0):
+    target_col = next((c for c in first_chunk.columns if 'churn' in c.lower()), None)
+    numeric_cols = [c for c in first_chunk.columns
+                    if pd.api.types.is_numeric_dtype(first_chunk[c]) or coerce_numeric(first_chunk[c]) is not None]
+    if target_col in numeric_cols:
+        target_codes = None
+    elif target_col:
+        labels = sorted(first_chunk[target_col].dropna().unique())
+        target_codes = {label: code for code, label in enumerate(labels)}
+    else:
+        target_codes = None
+    return ProfileState(first_chunk.columns, numeric_cols, target_col, target_codes, seed=seed)
+
+
+def _profile_chunk(args):
+    template, part, chunk = args
+    state = ProfileState(template.columns, template.numeric_cols, template.target_col, template.target_codes,
+                         seed=template.seed, part=part)
+    return state.update(chunk)
+
+
+def profile_csv(filename, chunksize=100_000, workers=1, seed=0):
+    # Every column is read as text and ProfileState.update casts the numeric ones to float64.
+    # Left to per-chunk inference a column can come back as int64 in one chunk and float64
+    # (a blank cell) or object (a stray " ") in the next, which changes its row hashes and
+    # hides duplicates that span chunks.
+    reader = pd.read_csv(filename, chunksize=chunksize, dtype=str)
+    first = next(reader)
+    state = _new_state(first, seed).update(first)
+
+    if workers <= 1:
+        for chunk in reader:
+            state.update(chunk)
+        return state
+
+    # Workers profile chunks independently; partial states are merged as they come back.
+    # At most 2 chunks per worker are in flight so memory stays bounded by chunk size.
+    template = _new_state(first, seed)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for part, chunk in enumerate(reader, start=1):
+            pending.append(pool.submit(_profile_chunk, (template, part, chunk)))
+            if len(pending) >= 2 * workers:
+                state.merge(pending.pop(0).result())
+        for future in pending:
+            state.merge(future.result())
+    return state
+
+
+def analyze_streaming(filename="Telco_Churn_Enrichi_GCP.csv", report_file="analysis_report.md",
+                      chunksize=100_000, workers=1, seed=0):
+    try:
+        state = profile_csv(filename, chunksize, workers, seed)
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return
+
+    # Duplicates are counted with 64-bit row hashes, quartiles are approximate (bottom-k
+    # sample per column) and correlations use the rows with no missing numeric value
+    summary = {
+        'filename': filename,
+        'rows': state.rows,
+        'columns': state.columns,
+        'missing': state.missing,
+        'duplicates': state.duplicates.duplicates,
+        'target_col': state.target_col,
+        'target_counts': state.target_counts,
+        'describe': state.describe(),
+        'corr': state.correlation() if state.corr_cols else None,
+    }
+    with open(report_file, "w", encoding="utf-8") as f:
+        _write_report(f, summary)
+
+    print(f"Analysis complete ({state.rows} rows, streamed). Report saved to {report_file}")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EDA report for the churn dataset")
+    parser.add_argument("filename", nargs="?", default="Telco_Churn_Enrichi_GCP.csv")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the CSV in chunks of this many rows (single pass, bounded memory)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes profiling chunks in streaming mode")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the streamed quartile sketches (same seed, chunksize and workers, same report)")
+    parser.add_argument("--report", default="analysis_report.md")
+    args = parser.parse_args()
     try:
-        analyze()
+        if args.chunksize:
+            analyze_streaming(args.filename, args.report, args.chunksize, args.workers, args.seed)
+        else:
+            analyze(args.filename, args.report)
     except Exception as e:
         print(f"Fatal error: {e}")
@@ -0,0 +1,363 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue as queue_mod
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from aggregates import build_overview_cube, build_profit_distribution
+from compact_model import CompactForest, flatten_forest
+from data_cache import DATA_PATH, load_dataset
+from encoding import CategoryEncoder, fit_encoders
+
+BENCH_DIR = "benchmarks"
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DATA_DIR = os.path.join(".cache", "bench")
+MODEL_PATH = os.path.join(DATA_DIR, "bench_model.pkl")
+# Longest a single case (setup + repeats) may run before it is killed and reported as failed
+CASE_TIMEOUT_S = 1800
+
+CASES = {}
+# Cold import budget per entry point, in seconds (cumulative time of `python -X importtime -c "import X"`).
+# Importing dashboard runs it in streamlit's bare mode, i.e. a fresh replica rendering the Overview page.
+IMPORT_BUDGETS_S = {
+    "score": 0.75,
+    "scoring_server": 0.75,
+    "whatif": 0.75,
+    "train_model": 2.0,
+    "pipeline": 2.0,
+    "dashboard": 2.0,
+}
+
+
+def case(name, max_scale=None, repeat=3):
+    # Register a benchmark. The decorated function does the (untimed) setup and
+    # returns (callable to time, rows processed per call).
+    def register(fn):
+        CASES[name] = {"setup": fn, "max_scale": max_scale, "repeat": repeat}
+        return fn
+    return register
+
+
+def _features(df):
+    X = df.drop(columns=["customerID", "Churn"])
+    cat_cols = X.select_dtypes(include=["category", "object", "string"]).columns
+    return X, cat_cols
+
+
+def _encoded(path):
+    df = load_dataset(path)
+    X, cat_cols = _features(df)
+    return CategoryEncoder(fit_encoders(X, cat_cols)).transform(X), (df["Churn"] == "Yes").astype(int)
+
+
+@case("csv_load", repeat=1)
+def bench_csv_load(path):
+    return lambda: pd.read_csv(path), None
+
+
+@case("cache_load")
+def bench_cache_load(path):
+    load_dataset(path)  # build once, time the memory-mapped load
+    return lambda: load_dataset(path), None
+
+
+@case("encode")
+def bench_encode(path):
+    X, cat_cols = _features(load_dataset(path))
+    encoder = CategoryEncoder(fit_encoders(X, cat_cols))
+    return lambda: encoder.transform(X), len(X)
+
+
+@case("rf_fit", max_scale=10, repeat=1)
+def bench_rf_fit(path):
+    from sklearn.ensemble import RandomForestClassifier
+    X, y = _encoded(path)
+    return lambda: RandomForestClassifier(n_estimators=100, random_state=42).fit(X, y), len(X)
+
+
+@case("hgb_fit", max_scale=10, repeat=1)
+def bench_hgb_fit(path):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    X, y = _encoded(path)
+    _, cat_cols = _features(load_dataset(path))
+    categorical = list(cat_cols)
+    return lambda: HistGradientBoostingClassifier(random_state=42, categorical_features=categorical).fit(X, y), len(X)
+
+
+@case("ooc_fit", max_scale=100, repeat=1)
+def bench_ooc_fit(path):
+    # Streams the CSV: peak RSS should stay flat across scales while rf_fit/hgb_fit grow
+    from streaming_gbdt import StreamingGBDT
+    model = StreamingGBDT(n_trees=20, patience=20, verbose=False)
+    return lambda: model.fit_file(path, chunksize=50_000), None
+
+
+@case("predict_single", max_scale=1, repeat=20)
+def bench_predict_single(path):
+    model = joblib.load(MODEL_PATH)
+    X, _ = _encoded(path)
+    row = X.iloc[[0]]
+    return lambda: model.predict_proba(row), 1
+
+
+@case("predict_single_compact", max_scale=1, repeat=200)
+def bench_predict_single_compact(path):
+    compact = CompactForest(flatten_forest(joblib.load(MODEL_PATH)))
+    X, _ = _encoded(path)
+    row = X.to_numpy()[0]
+    return lambda: compact.predict_proba(row), 1
+
+
+@case("predict_batch")
+def bench_predict_batch(path):
+    model = joblib.load(MODEL_PATH)
+    X, _ = _encoded(path)
+    return lambda: model.predict_proba(X), len(X)
+
+
+@case("whatif_sweep", max_scale=1)
+def bench_whatif_sweep(path):
+    from whatif import axis_values, sweep
+    model = joblib.load(MODEL_PATH)
+    df = load_dataset(path)
+    X, cat_cols = _features(df)
+    encoder = CategoryEncoder(fit_encoders(X, cat_cols))
+    base = encoder.transform(X.iloc[[0]]).to_numpy(dtype=np.float64)
+    axes = {col: axis_values(df, col) for col in ("tenure", "Contract", "MonthlyCharges")}
+    n_scenarios = int(np.prod([len(v) for v in axes.values()]))
+    return lambda: sweep(model, encoder, base, axes), n_scenarios
+
+
+@case("overview_aggregates")
+def bench_overview_aggregates(path):
+    df = load_dataset(path)
+    return lambda: build_overview_cube(df), len(df)
+
+
+@case("profit_distribution")
+def bench_profit_distribution(path):
+    df = load_dataset(path)
+    return lambda: build_profit_distribution(df), len(df)
+
+
+def upsample_dataset(scale, source=DATA_PATH, seed=42):
+    """Write ``scale`` jittered copies of the bundled data (unique customerIDs) to a CSV."""
+    path = os.path.join(DATA_DIR, f"telco_x{scale}.csv")
+    if scale == 1:
+        return source
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    base = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    tmp = path + ".tmp"
+    for i in range(scale):
+        copy = base.copy()
+        copy["customerID"] = copy["customerID"] + f"-{i}"
+        jitter = rng.normal(1.0, 0.01, len(copy))
+        for col in ("MonthlyCharges", "TotalCharges"):
+            copy[col] = (copy[col] * jitter).round(2)
+        copy["Rentabilite_Nette_Simulee"] = copy["TotalCharges"] - copy["Cout_Acquisition_Client"]
+        copy.to_csv(tmp, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def _run_case(name, path, queue):
+    spec = CASES[name]
+    fn, rows = spec["setup"](path)
+    times = []
+    for _ in range(spec["repeat"]):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    # ru_maxrss is in KiB on Linux
+    queue.put((min(times), rows, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def run_case(name, path, rows_in_file, timeout=CASE_TIMEOUT_S):
+    # Fresh process per case so peak RSS belongs to that case alone
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(name, path, queue))
+    proc.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            wall, rows, peak_mb = queue.get(timeout=1)
+            break
+        except queue_mod.Empty:
+            if not proc.is_alive():
+                # The result may still be in flight if the child put it just before exiting
+                try:
+                    wall, rows, peak_mb = queue.get(timeout=1)
+                    break
+                except queue_mod.Empty:
+                    raise RuntimeError(f"exited with code {proc.exitcode} before reporting a result")
+            if time.monotonic() > deadline:
+                proc.terminate()
+                proc.join()
+                raise RuntimeError(f"no result after {timeout}s, killed")
+    proc.join()
+    rows = rows or rows_in_file
+    return {"wall_s": wall, "peak_rss_mb": peak_mb, "rows": rows, "rows_per_s": rows / wall if wall > 0 else None}
+
+
+def measure_import(module, repeat=3):
+    # Fresh interpreter each time: nothing is in sys.modules yet, as on a cold start
+    best = float("inf")
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True)
+        match = re.search(rf"^import time:\s+\d+ \|\s+(\d+) \| {module}$", proc.stderr, re.MULTILINE)
+        if proc.returncode or match is None:
+            # Whatever the module printed besides the -X importtime table (traceback, warnings)
+            output = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+            raise RuntimeError(f"Could not time 'import {module}' (exit code {proc.returncode}):\n{output}")
+        best = min(best, int(match.group(1)) / 1e6)
+    return best
+
+
+def run_import_budgets(budgets=IMPORT_BUDGETS_S):
+    results, over = {}, []
+    for module, budget in budgets.items():
+        seconds = measure_import(module)
+        results[f"import:{module}"] = {"wall_s": seconds, "peak_rss_mb": None, "rows": None, "rows_per_s": None}
+        status = "ok" if seconds <= budget else "OVER BUDGET"
+        print(f"{'import:' + module:32s} {seconds * 1000:10.2f} ms   budget {budget * 1000:6.0f} ms  {status}")
+        if seconds > budget:
+            over.append(f"import:{module}: {seconds:.3g}s over its {budget:.3g}s budget")
+    return results, over
+
+
+def _ensure_model():
+    if not os.path.exists(MODEL_PATH):
+        from sklearn.ensemble import RandomForestClassifier
+        os.makedirs(DATA_DIR, exist_ok=True)
+        X, y = _encoded(DATA_PATH)
+        joblib.dump(RandomForestClassifier(n_estimators=100, random_state=42).fit(X, y), MODEL_PATH)
+
+
+def run_suite(scales, cases=None, timeout=CASE_TIMEOUT_S):
+    _ensure_model()
+    results, failures = {}, []
+    base_rows = len(pd.read_csv(DATA_PATH, usecols=["customerID"]))
+    for scale in scales:
+        path = upsample_dataset(scale)
+        n_rows = base_rows * scale
+        for name in cases or CASES:
+            max_scale = CASES[name]["max_scale"]
+            if max_scale is not None and scale > max_scale:
+                continue
+            key = f"{name}@x{scale}"
+            try:
+                results[key] = run_case(name, path, n_rows, timeout)
+            except RuntimeError as e:
+                # Keep going: one broken case shouldn't hide the numbers of the others
+                failures.append(f"{key} failed: {e}")
+                print(f"{key:32s} FAILED: {e}")
+                continue
+            r = results[key]
+            print(f"{key:32s} {r['wall_s'] * 1000:10.2f} ms {r['peak_rss_mb']:8.1f} MB "
+                  f"{(r['rows_per_s'] or 0):14,.0f} rows/s")
+    return results, failures
+
+
+def compare(results, baseline, threshold, rss_threshold):
+    # Returns (regressions, keys of this run that have nothing in the baseline to compare with)
+    regressions = []
+    base_results = baseline.get("results", {})
+    unbaselined = sorted(key for key in results if key not in base_results)
+    for key, base in base_results.items():
+        current = results.get(key)
+        if current is None:
+            # Not part of this run (--cases / --scales subset)
+            continue
+        for metric, limit in (("wall_s", threshold), ("peak_rss_mb", rss_threshold)):
+            if base[metric] and current[metric] > base[metric] * (1 + limit):
+                change = current[metric] / base[metric] - 1
+                regressions.append(f"{key} {metric}: {base[metric]:.4g} -> {current[metric]:.4g} (+{change:.0%})")
+    return regressions, unbaselined
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for loading, encoding, training and scoring")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Upsampling factors of the bundled data (e.g. 1 10 100 1000)")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="Subset of benchmarks to run")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--rss-threshold", type=float, default=0.5, help="Allowed peak RSS growth before failing")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--skip-imports", action="store_true", help="Don't check the cold import budgets")
+    parser.add_argument("--case-timeout", type=float, default=CASE_TIMEOUT_S,
+                        help="Seconds a case may run before it is killed and counted as failed")
+    args = parser.parse_args()
+
+    results, failures = run_suite(args.scales, args.cases, args.case_timeout)
+    over_budget = []
+    if not args.skip_imports:
+        import_results, over_budget = run_import_budgets()
+        results.update(import_results)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.update_baseline:
+        if failures:
+            print(f"Baseline not updated, {len(failures)} case(s) failed:")
+            for line in failures:
+                print(f"  {line}")
+            return 1
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        for line in failures:
+            print(f"  {line}")
+        return 1 if over_budget or failures else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    # Budgets are absolute: exceeding one fails the run even if the baseline was just as slow
+    slower, unbaselined = compare(results, baseline, args.threshold, args.rss_threshold)
+    if unbaselined:
+        print(f"\n{len(unbaselined)} case(s) not in {args.baseline}, unchecked (run --update-baseline to add them):")
+        for key in unbaselined:
+            print(f"  {key}")
+    regressions = failures + over_budget + slower
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regressions (time +{args.threshold:.0%}, RSS +{args.rss_threshold:.0%}) against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import numpy as np
+import joblib
+
+COMPACT_MODEL_PATH = "rf_compact.pkl"
+# Rows traversed together in predict_proba; bounds the (rows x trees) index matrix
+BATCH_ROWS = 10_000
+
+
+def flatten_forest(rf):
+    """Flatten a fitted sklearn forest into contiguous per-node arrays.
+
+    All trees are concatenated. Leaves point to themselves (threshold=+inf), so
+    every row can be walked a fixed number of steps without branching on leaves.
+    """
+    features, thresholds, lefts, rights, values, missing_left, covers = [], [], [], [], [], [], []
+    roots = []
+    offset = 0
+    for est in rf.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        idx = np.arange(n) + offset
+        leaf = tree.children_left == -1
+
+        left = np.where(leaf, idx, tree.children_left + offset)
+        right = np.where(leaf, idx, tree.children_right + offset)
+        feature = np.where(leaf, 0, tree.feature)
+        threshold = np.where(leaf, np.inf, tree.threshold)
+        counts = tree.value[:, 0, :]
+        proba = counts[:, 1] / counts.sum(axis=1)
+        mgl = getattr(tree, "missing_go_to_left", np.zeros(n, dtype=np.uint8))
+
+        roots.append(offset)
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(left)
+        rights.append(right)
+        values.append(proba)
+        covers.append(tree.weighted_n_node_samples)
+        missing_left.append(np.where(leaf, 1, mgl))
+        offset += n
+
+    return {
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "value": np.concatenate(values).astype(np.float64),
+        "missing_go_to_left": np.concatenate(missing_left).astype(bool),
+        # Weighted training samples per node; only the explainer (tree_explainer.py) needs it
+        "cover": np.concatenate(covers).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.int32(max(est.tree_.max_depth for est in rf.estimators_)),
+        "feature_names": np.asarray(rf.feature_names_in_, dtype=object),
+    }
+
+
+class CompactForest:
+    """Pure-numpy churn predictor over the arrays produced by ``flatten_forest``.
+
+    ``predict_proba`` mirrors ``RandomForestClassifier.predict_proba`` (shape
+    ``(n, 2)``) so it can be dropped in wherever the sklearn model is used.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.missing_go_to_left = arrays["missing_go_to_left"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.feature_names_in_ = arrays["feature_names"]
+        self.n_features_in_ = len(self.feature_names_in_)
+
+    @classmethod
+    def load(cls, path=COMPACT_MODEL_PATH, mmap_mode=None):
+        return cls(joblib.load(path, mmap_mode=mmap_mode))
+
+    def _leaf_values(self, X):
+        return self.value[self._leaves(X)].reshape(X.shape[0], -1)
+
+    def _leaves(self, X):
+        n = X.shape[0]
+        if n == 1:
+            # Single customer: walk one node per tree on a flat row (cheaper indexing)
+            X = X[0]
+            nodes = self.roots
+            rows = ()
+        else:
+            nodes = np.broadcast_to(self.roots, (n, len(self.roots)))
+            rows = (np.arange(n)[:, None],)
+        has_nan = np.isnan(X).any()
+        for _ in range(self.max_depth):
+            x = X[rows + (self.feature[nodes],)]
+            go_left = x <= self.threshold[nodes]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_go_to_left[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            # Leaves point to themselves: stop as soon as nothing moved
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return nodes
+
+    def apply(self, X):
+        """Leaf node (index into the flat arrays) each row reaches in every tree, ``(n, n_trees)``."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        parts = [self._leaves(X[i:i + BATCH_ROWS]).reshape(-1, len(self.roots)) for i in range(0, len(X), BATCH_ROWS)]
+        return np.concatenate(parts) if parts else np.empty((0, len(self.roots)), dtype=self.left.dtype)
+
+    def predict_churn(self, X):
+        # sklearn trees compare float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[0] <= BATCH_ROWS:
+            return self._leaf_values(X).mean(axis=1)
+        return np.concatenate([
+            self._leaf_values(X[i:i + BATCH_ROWS]).mean(axis=1) for i in range(0, X.shape[0], BATCH_ROWS)
+        ])
+
+    def predict_proba(self, X):
+        p = self.predict_churn(X)
+        return np.column_stack([1 - p, p])
+
+
+def export_compact_model(rf, X_check, path=COMPACT_MODEL_PATH, tol=1e-9):
+    """Flatten ``rf``, check parity against ``rf.predict_proba`` on ``X_check`` and save it."""
+    arrays = flatten_forest(rf)
+    compact = CompactForest(arrays)
+
+    expected = rf.predict_proba(X_check)[:, 1]
+    got = compact.predict_churn(X_check)
+    max_diff = float(np.abs(expected - got).max())
+    if max_diff > tol:
+        raise RuntimeError(f"Compact model disagrees with the forest (max |diff| = {max_diff:.3g})")
+
+    joblib.dump(arrays, path)
+    return compact, max_diff
@@ -1,8 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import joblib
+import json
+import os
+import time
+
+from data_cache import dataset_version, load_dataset
+import instrumentation
+from instrumentation import count, span
+# Each page imports what it draws with (plotly.express alone is ~90 ms): the model, the customer rows and
+# the modules that score them (joblib, sklearn, the explainer) are only loaded when the Simulator page
+# opens, the aggregates and drift modules only on the Overview page, which renders from the cube alone
 
 # Page Config
 st.set_page_config(
@@ -12,6 +20,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Stage timings / stack samples when CHURN_METRICS / CHURN_PROFILE are set (off otherwise)
+instrumentation.enable_from_env()
+rerun_start = time.perf_counter()
+
 # Custom CSS for Static Dark Mode
 st.markdown("""
 <style>
@@ -89,19 +101,115 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Load Assets
+# Current registry version, kept loaded by a background thread; a promote or rollback is picked up
+# on the next rerun without restarting the app (single rows go through the compact numpy forest)
+@st.cache_resource
+def get_model_watcher():
+    return ModelWatcher(kind="compact").start()
+
+# Load Assets (per model version; the previous one stays cached for sessions still on it)
+@st.cache_resource(max_entries=2)
+def load_assets(version, _bundle):
+    bundle = _bundle
+    model, encoders = bundle.model, bundle.encoders
+    df = load_dataset("Telco_Churn_Enrichi_GCP.csv")
+
+    # Simulator defaults, built once: the first customer's profile in model feature order,
+    # already encoded, so a rerun only overwrites the fields the user controls
+    encoder = CategoryEncoder(encoders, unknown="error")
+    template = df.drop(['Churn', 'customerID'], axis=1).iloc[[0]]
+    encoded = encoder.transform(template)[list(model.feature_names_in_)].to_numpy(dtype=np.float64)[0]
+    defaults = {
+        'encoder': encoder,
+        'encoded': encoded,
+        'index': {col: i for i, col in enumerate(model.feature_names_in_)},
+        'model_version': bundle.version,
+    }
+    return model, encoders, df, defaults
+
+# One LRU of simulator predictions shared by every session
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache(maxsize=10_000)
+
+# Drivers get their own LRU so their lookups don't count towards the prediction hit rate
 @st.cache_resource
-def load_assets():
-    model = joblib.load("rf_model.pkl")
-    encoders = joblib.load("encoders.pkl")
-    df = pd.read_csv("Telco_Churn_Enrichi_GCP.csv")
-    return model, encoders, df
-
-try:
-    model, encoders, df = load_assets()
-except Exception as e:
-    st.error(f"Error loading assets: {e}")
-    st.stop()
+def get_driver_cache():
+    return PredictionCache(maxsize=10_000)
+
+# Per-customer risk drivers; building the leaf-path tables takes a second, so do it once
+@st.cache_resource(max_entries=2)
+def get_explainer(version):
+    return TreeExplainer(model)
+
+# Sweeps score thousands of rows at once, where the sklearn forest beats the single-row compact one
+@st.cache_resource(max_entries=2)
+def get_sweep_model(version):
+    return load_version(version, kind="forest").model
+
+@st.cache_data(max_entries=50)
+def run_sweep(version, base, axes, segment):
+    # base: the simulator profile (tuple) or None to average over the real customers of ``segment``
+    sweep_model = get_sweep_model(version)
+    if base is None:
+        axes_dict = dict(axes)
+        n_scenarios = int(np.prod([len(v) for v in axes_dict.values()]))
+        customers = sample_segment(df[segment_mask(df, dict(segment))], n_scenarios)
+        base = encode_chunk(customers, defaults['encoder'], list(sweep_model.feature_names_in_)).to_numpy()
+    return sweep(sweep_model, defaults['encoder'], np.asarray(base), dict(axes))
+
+@st.cache_data(max_entries=50)
+def run_segment_whatif(version, segment, changes):
+    customers = df[segment_mask(df, dict(segment))]
+    return segment_whatif(get_sweep_model(version), defaults['encoder'], customers, dict(changes))
+
+# Hazard model with its per-segment curves; keyed on the file's mtime so a retrain is picked up
+@st.cache_resource(max_entries=2)
+def load_hazard_model(mtime):
+    return joblib.load(HAZARD_MODEL_PATH)
+
+# Aggregates for the overview page: rebuilt only when the dataset's content hash changes
+@st.cache_data
+def load_cube(version):
+    from aggregates import load_overview_cube
+    return load_overview_cube("Telco_Churn_Enrichi_GCP.csv")
+
+# Histogram bins and box statistics of profitability, computed server-side per dataset version
+@st.cache_data
+def load_profit_bins(version):
+    from aggregates import load_profit_distribution
+    return load_profit_distribution("Telco_Churn_Enrichi_GCP.csv")
+
+def profit_distribution_figure(dist):
+    # Same look as px.histogram(marginal="box"), drawn from ~100 pre-aggregated numbers instead of every row
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    colors = {'No': '#2962FF', 'Yes': '#FF3D00'}
+    edges = dist['edges']
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.03)
+    for label, group in dist['groups'].items():
+        box = group['box']
+        fig.add_trace(go.Box(
+            name=label, y=[label], q1=[box['q1']], median=[box['median']], q3=[box['q3']], mean=[box['mean']],
+            lowerfence=[box['lowerfence']], upperfence=[box['upperfence']], orientation='h',
+            marker_color=colors.get(label), legendgroup=label, showlegend=False,
+        ), row=1, col=1)
+        fig.add_trace(go.Bar(
+            name=label, x=(edges[:-1] + edges[1:]) / 2, y=group['counts'], width=np.diff(edges),
+            marker_color=colors.get(label), opacity=0.7, legendgroup=label,
+        ), row=2, col=1)
+    fig.update_layout(barmode='relative', title="Profitability Distribution: Churned vs Retained",
+                      legend_title_text='Churn')
+    fig.update_xaxes(title_text=dist['column'], row=2, col=1)
+    fig.update_yaxes(title_text='count', row=2, col=1)
+    return fig
+
+# Latest drift report written by score.py / drift_monitor.py (re-read when the file changes)
+@st.cache_data
+def load_drift_report(path, mtime):
+    with open(path) as f:
+        return json.load(f)
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -114,6 +222,8 @@ with st.sidebar:
     page = st.radio("Navigate", ["📊 Overview & Insights", "🔮 Churn Simulator"], label_visibility="collapsed")
     
     st.markdown("---")
+    from model_registry import current_version
+    st.caption(f"Model {current_version()}")
     st.markdown("Built with 🧠 by Mouad Bakhchane")
 
 # --- HELPER: METRIC CARD ---
@@ -135,17 +245,31 @@ def metric_card(title, value, delta=None, delta_color="normal"):
 
 # --- PAGE 1: OVERVIEW & INSIGHTS ---
 if page == "📊 Overview & Insights":
+    import plotly.express as px
+    from aggregates import category_counts, overview_kpis, segment_churn_rate
+    from drift_monitor import PSI_DRIFT, PSI_MODERATE, REPORT_PATH
+
+    try:
+        with span("dashboard.load"):
+            data_version = dataset_version("Telco_Churn_Enrichi_GCP.csv")
+            cube = load_cube(data_version)
+    except Exception as e:
+        st.error(f"Error loading assets: {e}")
+        st.stop()
+
     st.title("Executive Overview")
     st.markdown("Real-time monitoring of customer retention and financial health.")
     
     # KPIs Row
     col1, col2, col3, col4 = st.columns(4)
     
-    # Calculate Metrics
-    churn_rate = (df['Churn'].value_counts(normalize=True)['Yes'] * 100)
-    total_rev_risk = df[df['Churn'] == 'Yes']['TotalCharges'].sum()
-    avg_sentiment = df['Score_Sentiment_Dernier_Mois'].mean()
-    high_value_risk = len(df[(df['Rentabilite_Nette_Simulee'] > 2000) & (df['Churn'] == 'Yes')])
+    # Calculate Metrics (read from the precomputed cube, not the customer rows)
+    with span("dashboard.aggregate", what="kpis"):
+        kpis = overview_kpis(cube)
+    churn_rate = kpis['churn_rate']
+    total_rev_risk = kpis['revenue_at_risk']
+    avg_sentiment = kpis['avg_sentiment']
+    high_value_risk = kpis['high_value_losses']
 
     with col1:
         metric_card("Churn Rate", f"{churn_rate:.1f}%", "2.1% vs Last Month", "green") 
@@ -167,47 +291,39 @@ if page == "📊 Overview & Insights":
         with tab1:
             col_filter = st.selectbox("Select Category:", ['Contract', 'InternetService', 'PaymentMethod'], key="cat_filter")
             
-            # Prepare Data for Plotly
-            churn_counts = df.groupby([col_filter, 'Churn']).size().reset_index(name='Count')
-            # Calculate percentages
-            total_counts = df.groupby(col_filter).size().reset_index(name='Total')
-            churn_counts = churn_counts.merge(total_counts, on=col_filter)
-            churn_counts['Percentage'] = (churn_counts['Count'] / churn_counts['Total']) * 100
+            # Prepare Data for Plotly (counts and percentages come straight from the cube)
+            with span("dashboard.aggregate", what="category_counts"):
+                churn_counts = category_counts(cube, col_filter)
             
-            fig = px.bar(
-                churn_counts, 
-                x=col_filter, 
-                y='Count', 
-                color='Churn', 
-                barmode='group',
-                text_auto=True,
-                color_discrete_map={'No': '#2962FF', 'Yes': '#FF3D00'},
-                title=f"Customer Distribution by {col_filter}"
-            )
-            fig.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)", 
-                paper_bgcolor="rgba(0,0,0,0)",
-                font={'color': '#FAFAFA'}
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            with span("dashboard.render", chart="category"):
+                fig = px.bar(
+                    churn_counts, 
+                    x=col_filter, 
+                    y='Count', 
+                    color='Churn', 
+                    barmode='group',
+                    text_auto=True,
+                    color_discrete_map={'No': '#2962FF', 'Yes': '#FF3D00'},
+                    title=f"Customer Distribution by {col_filter}"
+                )
+                fig.update_layout(
+                    plot_bgcolor="rgba(0,0,0,0)", 
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    font={'color': '#FAFAFA'}
+                )
+                st.plotly_chart(fig, use_container_width=True)
             
         with tab2:
-            fig2 = px.histogram(
-                df, 
-                x="Rentabilite_Nette_Simulee", 
-                color="Churn", 
-                nbins=40,
-                marginal="box",
-                title="Profitability Distribution: Churned vs Retained",
-                color_discrete_map={'No': '#2962FF', 'Yes': '#FF3D00'},
-                opacity=0.7
-            )
-            fig2.update_layout(
-                plot_bgcolor="rgba(0,0,0,0)", 
-                paper_bgcolor="rgba(0,0,0,0)",
-                font={'color': '#FAFAFA'}
-            )
-            st.plotly_chart(fig2, use_container_width=True)
+            with span("dashboard.aggregate", what="profit_bins"):
+                profit_bins = load_profit_bins(data_version)
+            with span("dashboard.render", chart="profit_distribution"):
+                fig2 = profit_distribution_figure(profit_bins)
+                fig2.update_layout(
+                    plot_bgcolor="rgba(0,0,0,0)", 
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    font={'color': '#FAFAFA'}
+                )
+                st.plotly_chart(fig2, use_container_width=True)
 
     with c2:
         st.markdown(f"""
@@ -218,20 +334,71 @@ if page == "📊 Overview & Insights":
         
         # Dynamic Commentary Logic
         st.markdown("**1. Contract Risk**")
-        month_to_month_churn = df[df['Contract'] == 'Month-to-month']['Churn'].value_counts(normalize=True).get('Yes', 0)
+        month_to_month_churn = segment_churn_rate(cube, 'Contract', 'Month-to-month')
         st.caption(f"Month-to-month users tend to churn at a rate of **{month_to_month_churn*100:.1f}%**, making them the highest risk segment.")
         
         st.markdown("**2. Fiber Optic Alert**")
-        fiber_churn = df[df['InternetService'] == 'Fiber optic']['Churn'].value_counts(normalize=True).get('Yes', 0)
+        fiber_churn = segment_churn_rate(cube, 'InternetService', 'Fiber optic')
         st.caption(f"Fiber Optic users have a **{fiber_churn*100:.1f}%** churn rate. Investigate technical support tickets for this segment.")
         
         st.markdown("**3. Payment Friction**")
-        check_churn = df[df['PaymentMethod'] == 'Electronic check']['Churn'].value_counts(normalize=True).get('Yes', 0)
+        check_churn = segment_churn_rate(cube, 'PaymentMethod', 'Electronic check')
         st.caption(f"Users paying via Electronic Check expire at **{check_churn*100:.1f}%**. Push for Auto-Pay adoption.")
         st.markdown("</div>", unsafe_allow_html=True)
 
+    st.markdown("### 🛰️ Data Drift Monitor")
+    if not os.path.exists(REPORT_PATH):
+        st.info("No drift report yet. Score a new batch with `python score.py batch.csv` "
+                "(or run `python drift_monitor.py batch.csv`) to compare it with the training data.")
+    else:
+        drift = load_drift_report(REPORT_PATH, os.path.getmtime(REPORT_PATH))
+        st.caption(f"Last batch: {drift['rows']:,} customers vs. {drift['reference']['rows']:,} training rows "
+                   f"(reference built {drift['reference']['created']})")
+        if drift['drifted']:
+            st.warning(f"⚠️ Significant drift (PSI ≥ {PSI_DRIFT}) in: {', '.join(drift['drifted'])}")
+        for col, values in drift['unseen_categories'].items():
+            st.error(f"🚨 Unseen {col} values: {', '.join(f'{v} ({n})' for v, n in values.items())}")
+
+        drift_table = pd.DataFrame([
+            {'Feature': col, 'PSI': f['psi'], 'KS': f.get('ks'), 'Status': f['status'],
+             'Missing': f['missing_rate'], 'Unseen': f.get('unseen_rate')}
+            for col, f in drift['features'].items()
+        ]).sort_values('PSI', ascending=False)
+        d1, d2 = st.columns([2, 1])
+        with d1:
+            with span("dashboard.render", chart="drift"):
+                fig_drift = px.bar(drift_table, x='Feature', y='PSI', color='Status',
+                                   color_discrete_map={'stable': '#00E676', 'moderate': '#FFAB00', 'drift': '#FF3D00'},
+                                   title="Population Stability Index by Feature")
+                fig_drift.add_hline(y=PSI_MODERATE, line_dash="dot", line_color="#FFAB00")
+                fig_drift.add_hline(y=PSI_DRIFT, line_dash="dot", line_color="#FF3D00")
+                fig_drift.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+                                        font={'color': '#FAFAFA'})
+                st.plotly_chart(fig_drift, use_container_width=True)
+        with d2:
+            st.dataframe(drift_table, hide_index=True, use_container_width=True)
+
 # --- PAGE 2: CHURN SIMULATOR ---
 elif page == "🔮 Churn Simulator":
+    import joblib
+    import plotly.express as px
+    from encoding import CategoryEncoder
+    from model_registry import ModelWatcher, load_version
+    from prediction_cache import PredictionCache
+    from score import HIGH_RISK_THRESHOLD, WATCHLIST_THRESHOLD, encode_chunk
+    from survival import HAZARD_MODEL_PATH, median_months
+    from tree_explainer import TreeExplainer
+    from whatif import axis_values, sample_segment, segment_mask, segment_whatif, summarize_whatif, sweep
+
+    try:
+        # Grab the bundle once: the watcher may swap in a newer one mid-run
+        with span("dashboard.load", what="model"):
+            bundle = get_model_watcher().bundle
+            model, encoders, df, defaults = load_assets(bundle.version, bundle)
+    except Exception as e:
+        st.error(f"Error loading assets: {e}")
+        st.stop()
+
     st.title("Predictive Intelligence")
     st.markdown("Simulate customer scenarios to identify retention opportunities.")
     
@@ -271,42 +438,68 @@ elif page == "🔮 Churn Simulator":
         'StreamingMovies': 'No', 'PaperlessBilling': 'Yes'
     }
     
-    # Reconstruct Layout
-    template = df.drop(['Churn', 'customerID'], axis=1).iloc[0].copy()
-    template['tenure'] = tenure
-    template['MonthlyCharges'] = monthly_charges
-    template['TotalCharges'] = total_charges
-    template['Score_Sentiment_Dernier_Mois'] = sentiment
-    for col, val in cat_mapping.items():
-        template[col] = val
-        
-    input_df = pd.DataFrame([template])
-    
-    # Encode
-    for col, le in encoders.items():
-        if col in input_df.columns:
-            try:
-                input_df[col] = input_df[col].apply(lambda x: le.transform([x])[0] if x in le.classes_ else 0) 
-            except: pass
-
-    # Predict
-    prob = model.predict_proba(input_df)[0][1]
+    # Reconstruct Layout: start from the pre-encoded template and overwrite the simulated fields
+    with span("dashboard.encode"):
+        features = defaults['encoded'].copy()
+        numeric_inputs = {
+            'tenure': tenure, 'MonthlyCharges': monthly_charges,
+            'TotalCharges': total_charges, 'Score_Sentiment_Dernier_Mois': sentiment,
+        }
+        for col, val in numeric_inputs.items():
+            features[defaults['index'][col]] = val
+        for col, val in cat_mapping.items():
+            features[defaults['index'][col]] = defaults['encoder'].encode_value(col, val)
+
+    # Predict (profiles already simulated by anyone come straight from the shared cache)
+    prediction_cache = get_prediction_cache()
+    cache_key = (defaults['model_version'], tuple(features))
+    with span("dashboard.predict"):
+        prob = prediction_cache.get_or_compute(
+            cache_key,
+            lambda: float(model.predict_proba(pd.DataFrame([features], columns=model.feature_names_in_))[0][1]),
+        )
+    # Why: exact TreeSHAP contribution of every feature, cached under the same key as the prediction
+    driver_cache = get_driver_cache()
+    try:
+        with span("dashboard.explain"):
+            contributions = driver_cache.get_or_compute(
+                cache_key, lambda: get_explainer(defaults['model_version']).shap_values(features)[0],
+            )
+    except ValueError as e:
+        contributions = None
+        drivers_error = str(e)
     
     with col_result:
         st.subheader("Risk Assessment")
         
         # Risk Gauge
-        fig_gauge = px.pie(values=[prob, 1-prob], names=["Risk", "Safe"], hole=0.7, 
-                           color_discrete_sequence=['#FF3D00', '#E0E0E0'])
-        fig_gauge.update_layout(showlegend=False, margin=dict(t=0,b=0,l=0,r=0), height=200,
-                                paper_bgcolor="rgba(0,0,0,0)")
-        st.plotly_chart(fig_gauge, use_container_width=True)
+        with span("dashboard.render", chart="gauge"):
+            fig_gauge = px.pie(values=[prob, 1-prob], names=["Risk", "Safe"], hole=0.7, 
+                               color_discrete_sequence=['#FF3D00', '#E0E0E0'])
+            fig_gauge.update_layout(showlegend=False, margin=dict(t=0,b=0,l=0,r=0), height=200,
+                                    paper_bgcolor="rgba(0,0,0,0)")
+            st.plotly_chart(fig_gauge, use_container_width=True)
         
         st.markdown(f"<h2 style='text-align: center; color: {'#FF3D00' if prob > 0.5 else '#00E676'};'>{prob*100:.1f}% Risk</h2>", unsafe_allow_html=True)
         
+        st.markdown("### 🧭 Top Risk Drivers")
+        if contributions is None:
+            st.caption(f"Drivers unavailable: {drivers_error}")
+        else:
+            drivers = pd.DataFrame({'Feature': model.feature_names_in_, 'Impact': contributions * 100})
+            drivers = drivers.loc[drivers['Impact'].abs().sort_values(ascending=False).index[:5]]
+            drivers['Effect'] = np.where(drivers['Impact'] > 0, "Raises risk", "Lowers risk")
+            with span("dashboard.render", chart="drivers"):
+                fig_drivers = px.bar(drivers.iloc[::-1], x='Impact', y='Feature', orientation='h', color='Effect',
+                                     color_discrete_map={"Raises risk": '#FF3D00', "Lowers risk": '#00E676'},
+                                     labels={'Impact': "Contribution to risk (pts)", 'Feature': ""})
+                fig_drivers.update_layout(margin=dict(t=0, b=0, l=0, r=0), height=220, legend_title_text="",
+                                          paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                st.plotly_chart(fig_drivers, use_container_width=True)
+
         st.markdown("### 📋 Strategic Action Plan")
         
-        if prob > 0.7:
+        if prob > HIGH_RISK_THRESHOLD:
              st.error("🚨 **High Risk Alert**")
              st.markdown("""
              **Recommendation: Immediate Retention Offer**
@@ -314,7 +507,7 @@ elif page == "🔮 Churn Simulator":
              *   **Script:** "We noticed you might be looking elsewhere. We value you..."
              *   **Priority:** 🔥 Critical
              """)
-        elif prob > 0.4:
+        elif prob > WATCHLIST_THRESHOLD:
             st.warning("⚠️ **Watchlist**")
             st.markdown("""
             **Recommendation: Value Enhancement**
@@ -331,3 +524,144 @@ elif page == "🔮 Churn Simulator":
             
         with st.expander("See Technical Details"):
             st.json(input_data.to_dict(orient='records')[0])
+            for label, cache in (("Prediction", prediction_cache), ("Drivers", driver_cache)):
+                cache_stats = cache.stats()
+                st.caption(
+                    f"{label} cache: {cache_stats['hit_rate']*100:.1f}% hit rate "
+                    f"({cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+                    f"{cache_stats['size']}/{cache_stats['maxsize']} entries)"
+                )
+
+    # --- TIME TO CHURN: discrete-time hazard curves (survival.py) ---
+    st.markdown("---")
+    st.subheader("⏳ Time to Churn")
+    if not os.path.exists(HAZARD_MODEL_PATH):
+        st.info("Run `python survival.py train` to add time-to-churn curves.")
+    else:
+        hazard = load_hazard_model(os.path.getmtime(HAZARD_MODEL_PATH))
+        profile = pd.DataFrame([{**cat_mapping, **numeric_inputs, 'Cout_Acquisition_Client': acq_cost,
+                                 'SeniorCitizen': 0}])
+        with span("dashboard.predict", what="hazard_curve"):
+            own_curve = hazard.customer_curves(profile)[0]
+        # The segment's curve is precomputed for every tenure: a lookup, no scoring
+        segment_curve = hazard.segment_curve((contract, internet, payment), tenure)
+        curve_df = pd.DataFrame({'Month': np.arange(1, hazard.horizon + 1), 'This profile': own_curve * 100})
+        if segment_curve is not None:
+            curve_df['Segment average'] = segment_curve * 100
+        curve_df = curve_df.melt('Month', var_name='Curve', value_name='Churned by then (%)')
+
+        col_curve, col_stats = st.columns([2, 1])
+        with col_curve:
+            with span("dashboard.render", chart="hazard_curve"):
+                fig_curve = px.line(curve_df, x='Month', y='Churned by then (%)', color='Curve',
+                                    color_discrete_map={'This profile': '#FF3D00', 'Segment average': '#2962FF'},
+                                    labels={'Month': "Months from now"})
+                fig_curve.update_layout(margin=dict(t=10, b=0, l=0, r=0), height=300, legend_title_text="",
+                                        paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                st.plotly_chart(fig_curve, use_container_width=True)
+        with col_stats:
+            metric_card("Churn within 3 months", f"{own_curve[min(3, hazard.horizon) - 1] * 100:.1f}%")
+            metric_card(f"Churn within {hazard.horizon} months", f"{own_curve[-1] * 100:.1f}%")
+            median = median_months(own_curve[None, :])[0]
+            metric_card("Median time to churn",
+                        f"{median:.0f} months" if not np.isnan(median) else f"> {hazard.horizon} months")
+        st.caption(f"{contract} · {internet} · {payment} at {tenure} months tenure. The segment curve averages "
+                   "the segment's customers; both assume the customer is active today.")
+
+    # --- WHAT-IF SWEEPS: many scenarios scored as one matrix ---
+    st.markdown("---")
+    st.subheader("🧪 What-If Sweeps")
+    sweep_numeric = ['tenure', 'MonthlyCharges', 'Score_Sentiment_Dernier_Mois', 'Cout_Acquisition_Client']
+    sweep_categorical = ['Contract', 'InternetService', 'PaymentMethod', 'PaperlessBilling', 'TechSupport']
+    tab_grid, tab_segment = st.tabs(["Scenario Grid", "Segment What-If"])
+
+    with tab_grid:
+        g1, g2, g3 = st.columns(3)
+        x_axis = g1.selectbox("X axis", sweep_numeric, key="sweep_x")
+        y_axis = g2.selectbox("Y axis", sweep_categorical + [c for c in sweep_numeric if c != x_axis], key="sweep_y")
+        panel = g3.selectbox("Panels", ["None"] + [c for c in sweep_categorical + sweep_numeric
+                                                    if c not in (x_axis, y_axis)], key="sweep_panel")
+        applied_to = st.radio("Apply to", ["This profile", "Real customers (average)"], horizontal=True,
+                              key="sweep_base")
+        segment = ()
+        if applied_to != "This profile":
+            s1, s2 = st.columns(2)
+            seg_col = s1.selectbox("Segment", ["All customers"] + sweep_categorical, key="sweep_seg_col")
+            if seg_col != "All customers":
+                segment = ((seg_col, s2.selectbox("Value", axis_values(df, seg_col), key="sweep_seg_val")),)
+
+        # Panels get a handful of levels so every heatmap stays readable
+        axes = [(x_axis, tuple(axis_values(df, x_axis))), (y_axis, tuple(axis_values(df, y_axis)))]
+        if panel != "None":
+            axes.append((panel, tuple(axis_values(df, panel, levels=4))))
+        start = time.perf_counter()
+        with span("dashboard.predict", what="sweep"):
+            grid = run_sweep(defaults['model_version'], tuple(features) if applied_to == "This profile" else None,
+                             tuple(axes), segment)
+        elapsed = time.perf_counter() - start
+        count("dashboard.scenarios", len(grid))
+
+        # One (y x x) risk surface per panel value, exactly on the swept grid
+        with span("dashboard.render", chart="sweep"):
+            panel_values = axes[2][1] if panel != "None" else (None,)
+            surfaces = np.stack([
+                (grid if value is None else grid[grid[panel] == value])
+                .pivot_table(index=y_axis, columns=x_axis, values='churn_probability', sort=False).to_numpy()
+                for value in panel_values
+            ])
+            fig_sweep = px.imshow(
+                surfaces, x=[str(v) for v in axes[0][1]], y=[str(v) for v in axes[1][1]], facet_col=0,
+                facet_col_wrap=2, zmin=0, zmax=1, aspect='auto', color_continuous_scale='RdYlGn_r',
+                labels={'x': x_axis, 'y': y_axis, 'color': 'Churn risk'},
+            )
+            fig_sweep.for_each_annotation(lambda a: a.update(
+                text="" if panel == "None" else f"{panel} = {panel_values[int(a.text.split('=')[-1])]}"))
+            fig_sweep.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
+                                    font={'color': '#FAFAFA'}, height=420 if panel == "None" else 640)
+            st.plotly_chart(fig_sweep, use_container_width=True)
+        st.caption(f"{len(grid):,} scenarios scored in {elapsed*1000:.0f} ms"
+                   + (" (TotalCharges and profitability follow tenure x charges)" if {x_axis, y_axis, panel}
+                      & {'tenure', 'MonthlyCharges'} else ""))
+
+    with tab_segment:
+        w1, w2 = st.columns(2)
+        seg_col = w1.selectbox("Customers with", sweep_categorical, index=2, key="whatif_seg_col")
+        seg_val = w2.selectbox("equal to", axis_values(df, seg_col), key="whatif_seg_val")
+        w3, w4 = st.columns(2)
+        change_col = w3.selectbox("Change", sweep_categorical, index=2, key="whatif_change_col")
+        change_val = w4.selectbox("to", axis_values(df, change_col), key="whatif_change_val")
+
+        with span("dashboard.predict", what="segment_whatif"):
+            result = run_segment_whatif(defaults['model_version'], ((seg_col, seg_val),),
+                                        ((change_col, change_val),))
+        summary = summarize_whatif(result)
+        m1, m2, m3 = st.columns(3)
+        with m1:
+            metric_card("Customers", f"{summary['customers']:,}")
+        with m2:
+            metric_card("Mean Churn Risk", f"{summary['mean_after']*100:.1f}%",
+                        f"{(summary['mean_after'] - summary['mean_before'])*100:+.1f} pts",
+                        "green" if summary['mean_after'] <= summary['mean_before'] else "red")
+        with m3:
+            metric_card("High Risk Customers", f"{summary['high_risk_after']:,}",
+                        f"{summary['leave_high_risk']:,} out / {summary['enter_high_risk']:,} in",
+                        "green" if summary['high_risk_after'] <= summary['high_risk_before'] else "red")
+        # Binned here so the payload doesn't grow with the segment
+        edges = np.linspace(0, 1, 21)
+        risk_bins = pd.DataFrame({
+            'Risk': np.tile((edges[:-1] + edges[1:]) / 2, 2),
+            'Customers': np.r_[np.histogram(result['before'], edges)[0], np.histogram(result['after'], edges)[0]],
+            'Scenario': ['Today'] * 20 + ['After change'] * 20,
+        })
+        with span("dashboard.render", chart="segment_whatif"):
+            fig_delta = px.bar(risk_bins, x='Risk', y='Customers', color='Scenario', barmode='overlay', opacity=0.7,
+                               color_discrete_map={'Today': '#FF3D00', 'After change': '#2962FF'})
+            fig_delta.update_traces(width=0.05)
+            fig_delta.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
+                                    font={'color': '#FAFAFA'}, height=300)
+            st.plotly_chart(fig_delta, use_container_width=True)
+
+# Whole-script time of this rerun, next to the stages above; written out after every rerun
+instrumentation.record("dashboard.rerun", time.perf_counter() - rerun_start)
+count("dashboard.reruns")
+instrumentation.flush()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = "Telco_Churn_Enrichi_GCP.csv"
+CACHE_DIR = os.path.join(".cache", "dataset")
+# Bump when the on-disk layout changes so old caches are rebuilt
+CACHE_FORMAT = 1
+
+
+def file_hash(path):
+    # Hashing is skipped when size and mtime match the last build (see _stat_key)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def dataset_version(path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Content hash of ``path`` (the cache key), reusing the last hash if the file is untouched."""
+    index_path = os.path.join(cache_dir, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+
+    key = _stat_key(path)
+    if key in index:
+        return index[key]
+
+    version = f"{file_hash(path)[:16]}-v{CACHE_FORMAT}"
+    index[key] = version
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)
+    return version
+
+
+def coerce_numeric(series):
+    # Text columns that are numbers apart from blank cells (TotalCharges in the raw
+    # Telco extract) become float; anything else stays categorical
+    stripped = series.astype("string").str.strip()
+    blank = stripped.isna() | (stripped == "")
+    numeric = pd.to_numeric(stripped.mask(blank), errors="coerce")
+    if numeric.notna().sum() == (~blank).sum() and (~blank).any():
+        return numeric
+    return None
+
+
+def read_chunks(path, chunksize=100_000, columns=None):
+    """DataFrames of ``chunksize`` rows from a CSV or Parquet file, one chunk in memory at a time.
+
+    ``columns`` restricts the read to those columns (ones the file doesn't have are ignored).
+    """
+    wanted = None if columns is None else set(columns)
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)")
+        parquet = pq.ParquetFile(path)
+        names = None if wanted is None else [c for c in parquet.schema_arrow.names if c in wanted]
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=names):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=None if wanted is None else wanted.__contains__)
+
+
+def _smallest_int(max_value):
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def build_cache(path, target_dir):
+    read = pd.read_parquet if path.endswith(".parquet") else pd.read_csv
+    df = read(path, dtype_backend="numpy_nullable")
+    columns = {}
+
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(target_dir))
+    try:
+        for col in df.columns:
+            s = df[col]
+            if not pd.api.types.is_numeric_dtype(s.dtype):
+                numeric = coerce_numeric(s)
+                if numeric is not None:
+                    s = numeric
+
+            if pd.api.types.is_numeric_dtype(s.dtype):
+                if pd.api.types.is_integer_dtype(s.dtype) and not s.isna().any():
+                    values = s.to_numpy(dtype=_smallest_int(max(abs(s.min()), abs(s.max()))))
+                else:
+                    values = s.to_numpy(dtype=np.float32, na_value=np.nan)
+                np.save(os.path.join(tmp_dir, f"{col}.npy"), values)
+                columns[col] = {"kind": "numeric"}
+            else:
+                # Sorted categories, so codes match LabelEncoder's ordering; -1 = missing
+                codes, categories = pd.factorize(s, sort=True, use_na_sentinel=True)
+                codes = codes.astype(_smallest_int(max(len(categories), 1)))
+                np.save(os.path.join(tmp_dir, f"{col}.codes.npy"), codes)
+                np.save(os.path.join(tmp_dir, f"{col}.categories.npy"), np.asarray(categories, dtype=str))
+                columns[col] = {"kind": "categorical"}
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"source": os.path.abspath(path), "rows": len(df), "columns": columns}, f, indent=2)
+
+        # Publish the finished cache in one step; a concurrent builder may have won the race
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def cache_path(path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Directory of the typed cache for ``path``, (re)building it if the CSV changed."""
+    version = dataset_version(path, cache_dir)
+    target = os.path.join(cache_dir, version)
+    if not os.path.exists(os.path.join(target, "meta.json")):
+        os.makedirs(cache_dir, exist_ok=True)
+        build_cache(path, target)
+    return target
+
+
+def load_columns(path=DATA_PATH, cache_dir=CACHE_DIR, columns=None):
+    """Raw memory-mapped arrays: ``{col: array}`` for numerics, ``{col: (codes, categories)}`` otherwise."""
+    target = cache_path(path, cache_dir)
+    with open(os.path.join(target, "meta.json")) as f:
+        meta = json.load(f)
+
+    out = {}
+    for col, info in meta["columns"].items():
+        if columns is not None and col not in columns:
+            continue
+        if info["kind"] == "numeric":
+            out[col] = np.load(os.path.join(target, f"{col}.npy"), mmap_mode="r")
+        else:
+            codes = np.load(os.path.join(target, f"{col}.codes.npy"), mmap_mode="r")
+            categories = np.load(os.path.join(target, f"{col}.categories.npy"))
+            out[col] = (codes, categories)
+    return out
+
+
+def load_dataset(path=DATA_PATH, cache_dir=CACHE_DIR, columns=None):
+    """Typed DataFrame of ``path``: float32/int numerics, text columns as pandas categoricals.
+
+    The first call converts the CSV (or Parquet file) into a per-column ``.npy`` cache keyed by the
+    file's content hash; later calls memory-map it instead of re-parsing text.
+    """
+    data = {}
+    for col, values in load_columns(path, cache_dir, columns).items():
+        if isinstance(values, tuple):
+            codes, categories = values
+            # Codes were checked when the cache was built; validating them again copies them off the mmap
+            dtype = pd.CategoricalDtype(categories.astype(object))
+            data[col] = pd.Series(pd.Categorical.from_codes(codes, dtype=dtype, validate=False), name=col, copy=False)
+        else:
+            data[col] = pd.Series(values, name=col, copy=False)
+    # One block per column: consolidating same-dtype columns into 2-D blocks would copy every
+    # memory-mapped array into RAM. A plain dict of arrays is consolidated by some pandas versions.
+    return pd.DataFrame(data, copy=False)
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from encoding import CategoryEncoder
+
+REFERENCE_PATH = "drift_reference.json"
+REPORT_PATH = "drift_report.json"
+DEFAULT_CHUNKSIZE = 100_000
+
+# Population Stability Index bands (industry rule of thumb)
+PSI_MODERATE = 0.1
+PSI_DRIFT = 0.25
+# Reference quantiles: deciles for PSI, percentiles for the (binned) KS statistic
+PSI_QUANTILES = np.linspace(0, 1, 11)[1:-1]
+KS_QUANTILES = np.linspace(0, 1, 101)[1:-1]
+# Floor on bin shares so empty bins don't blow PSI up to infinity
+EPS = 1e-4
+
+
+def _cuts(values, quantiles):
+    return np.unique(np.quantile(values, quantiles)).tolist() if len(values) else []
+
+
+def build_reference(X, encoders, source=None):
+    """Compact training-time sketch of every feature in ``X`` (the encoded training matrix).
+
+    Numeric features keep decile and percentile cut points with the training counts
+    per bin (plus missing values and the observed range); categorical features keep
+    their category frequencies. A few kB of JSON, whatever the training set size.
+    """
+    features = {}
+    for col in X.columns:
+        values = X[col].to_numpy()
+        if col in encoders:
+            # Missing categories are NaN codes when encoded with unknown="nan" (e.g. out-of-core samples)
+            values = values.astype(np.float64)
+            present = np.isfinite(values)
+            codes = values[present].astype(np.int64)
+            features[col] = {
+                "type": "categorical",
+                "categories": [str(c) for c in encoders[col].classes_],
+                "counts": np.bincount(codes, minlength=len(encoders[col].classes_)).tolist(),
+                "missing": int(len(values) - present.sum()),
+            }
+        else:
+            values = values.astype(np.float64)
+            present = values[~np.isnan(values)]
+            psi_cuts, ks_cuts = _cuts(present, PSI_QUANTILES), _cuts(present, KS_QUANTILES)
+            features[col] = {
+                "type": "numeric",
+                "psi_cuts": psi_cuts,
+                "psi_counts": np.bincount(np.searchsorted(psi_cuts, present, side="right"),
+                                          minlength=len(psi_cuts) + 1).tolist(),
+                "ks_cuts": ks_cuts,
+                "ks_counts": np.bincount(np.searchsorted(ks_cuts, present, side="right"),
+                                         minlength=len(ks_cuts) + 1).tolist(),
+                "missing": int(len(values) - len(present)),
+                "min": float(present.min()) if len(present) else None,
+                "max": float(present.max()) if len(present) else None,
+            }
+    return {"rows": len(X), "source": source, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "features": features}
+
+
+def fold_batch(reference, chunk, sign=1, source=None):
+    """``reference`` with the rows of ``chunk`` added to its counts (``sign=-1``: removed).
+
+    The cut points are kept, so the reference can follow a training set that grows
+    (or drops old batches) without re-reading the rows already in it. Unseen categories
+    join the reference; the numeric range only widens until the next full ``build_reference``.
+    """
+    monitor = DriftMonitor(reference)
+    monitor.update(chunk)
+    features = {}
+    for col, f in reference["features"].items():
+        counts, f = monitor.counts[col], dict(f)
+        if f["type"] == "categorical":
+            n_known = len(f["categories"])
+            f["counts"] = (np.asarray(f["counts"]) + sign * counts[:n_known]).tolist()
+            unseen = monitor.unseen.get(col, {})
+            f["categories"] = f["categories"] + list(unseen)
+            f["counts"] = f["counts"] + [sign * n for n in unseen.values()]
+            f["missing"] = int(f.get("missing", 0) + sign * counts[-1])
+        else:
+            f["psi_counts"] = (np.asarray(f["psi_counts"]) + sign * counts["psi"]).tolist()
+            f["ks_counts"] = (np.asarray(f["ks_counts"]) + sign * counts["ks"]).tolist()
+            f["missing"] = int(f["missing"] + sign * counts["missing"])
+            present = pd.to_numeric(chunk[col], errors="coerce").dropna() if col in chunk.columns else []
+            if sign > 0 and len(present):
+                f["min"] = float(present.min()) if f["min"] is None else min(f["min"], float(present.min()))
+                f["max"] = float(present.max()) if f["max"] is None else max(f["max"], float(present.max()))
+        features[col] = f
+    return {"rows": reference["rows"] + sign * monitor.rows, "source": source or reference["source"],
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "features": features}
+
+
+def save_reference(reference, path=REFERENCE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(reference, f)
+    os.replace(tmp, path)
+
+
+def load_reference(path=REFERENCE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def psi(expected, actual):
+    expected = np.maximum(np.asarray(expected, dtype=np.float64) / max(np.sum(expected), 1), EPS)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64) / max(np.sum(actual), 1), EPS)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _status(value):
+    if value >= PSI_DRIFT:
+        return "drift"
+    return "moderate" if value >= PSI_MODERATE else "stable"
+
+
+class DriftMonitor:
+    """Streaming comparison of incoming batches against a training reference.
+
+    ``update`` only bins and counts each raw chunk (one ``searchsorted`` or category
+    lookup per column), so it can run inline with scoring; ``merge`` combines
+    monitors from parallel workers and ``report`` turns the counts into PSI/KS.
+    """
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.features = reference["features"]
+        self.encoder = CategoryEncoder.from_categories(
+            {col: f["categories"] for col, f in self.features.items() if f["type"] == "categorical"})
+        self.rows = 0
+        self.counts = {}
+        for col, f in self.features.items():
+            if f["type"] == "categorical":
+                # One slot per known category + unseen + missing
+                self.counts[col] = np.zeros(len(f["categories"]) + 2, dtype=np.int64)
+            else:
+                self.counts[col] = {
+                    "psi": np.zeros(len(f["psi_cuts"]) + 1, dtype=np.int64),
+                    "ks": np.zeros(len(f["ks_cuts"]) + 1, dtype=np.int64),
+                    "missing": 0, "below_min": 0, "above_max": 0,
+                }
+        self.unseen = {}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for col, f in self.features.items():
+            if col not in chunk.columns:
+                # A column the batch doesn't carry at all counts as missing
+                if f["type"] == "categorical":
+                    self.counts[col][-1] += len(chunk)
+                else:
+                    self.counts[col]["missing"] += len(chunk)
+                continue
+
+            if f["type"] == "categorical":
+                values = chunk[col]
+                codes = self.encoder.codes(col, values)
+                missing = values.isna().to_numpy()
+                n_known = len(f["categories"])
+                self.counts[col] += np.bincount(np.where(missing, n_known + 1, np.where(codes < 0, n_known, codes)),
+                                                minlength=n_known + 2)
+                unseen = (codes < 0) & ~missing
+                if unseen.any():
+                    seen = self.unseen.setdefault(col, {})
+                    for value, count in pd.Series(np.asarray(values)[unseen]).astype(str).value_counts().items():
+                        seen[value] = seen.get(value, 0) + int(count)
+            else:
+                # Raw extracts can carry numbers as text (blank TotalCharges)
+                values = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=np.float64)
+                present = values[~np.isnan(values)]
+                counts = self.counts[col]
+                counts["missing"] += len(values) - len(present)
+                counts["psi"] += np.bincount(np.searchsorted(f["psi_cuts"], present, side="right"),
+                                             minlength=len(counts["psi"]))
+                counts["ks"] += np.bincount(np.searchsorted(f["ks_cuts"], present, side="right"),
+                                            minlength=len(counts["ks"]))
+                if f["min"] is not None:
+                    counts["below_min"] += int((present < f["min"]).sum())
+                    counts["above_max"] += int((present > f["max"]).sum())
+
+    def merge(self, other):
+        self.rows += other.rows
+        for col, counts in other.counts.items():
+            if isinstance(counts, dict):
+                for key, value in counts.items():
+                    self.counts[col][key] = self.counts[col][key] + value
+            else:
+                self.counts[col] += counts
+        for col, values in other.unseen.items():
+            seen = self.unseen.setdefault(col, {})
+            for value, count in values.items():
+                seen[value] = seen.get(value, 0) + count
+
+    def report(self):
+        ref_rows = self.reference["rows"]
+        rows = max(self.rows, 1)
+        features = {}
+        for col, f in self.features.items():
+            counts = self.counts[col]
+            if f["type"] == "categorical":
+                n_known = len(f["categories"])
+                # Unseen values are a bucket the reference never had, so they show up in PSI too;
+                # missing values are compared with the training share of missing ones
+                value = psi(f["counts"] + [0, f.get("missing", 0)], counts)
+                shares = counts[:n_known] / rows
+                ref_shares = np.asarray(f["counts"]) / max(ref_rows, 1)
+                shifts = sorted(zip(f["categories"], ref_shares, shares), key=lambda s: -abs(s[2] - s[1]))[:3]
+                unseen = sorted(self.unseen.get(col, {}).items(), key=lambda item: -item[1])[:10]
+                features[col] = {
+                    "type": "categorical",
+                    "psi": round(value, 4),
+                    "status": _status(value),
+                    "missing_rate": round(float(counts[-1] / rows), 4),
+                    "unseen_rate": round(float(counts[n_known] / rows), 4),
+                    "unseen_values": dict(unseen),
+                    "largest_shifts": {cat: {"reference": round(float(r), 4), "batch": round(float(b), 4)}
+                                       for cat, r, b in shifts},
+                }
+            else:
+                present = counts["ks"].sum()
+                value = psi(f["psi_counts"] + [f["missing"]], np.append(counts["psi"], counts["missing"]))
+                # KS on the percentile grid: max CDF gap at the reference cut points
+                ref_cdf = np.cumsum(f["ks_counts"])[:-1] / max(sum(f["ks_counts"]), 1)
+                cdf = np.cumsum(counts["ks"])[:-1] / max(present, 1)
+                ks = float(np.abs(cdf - ref_cdf).max()) if len(ref_cdf) and present else 0.0
+                features[col] = {
+                    "type": "numeric",
+                    "psi": round(value, 4),
+                    "ks": round(ks, 4),
+                    "status": _status(value),
+                    "missing_rate": round(counts["missing"] / rows, 4),
+                    "reference_missing_rate": round(f["missing"] / max(ref_rows, 1), 4),
+                    "below_training_min_rate": round(counts["below_min"] / rows, 4),
+                    "above_training_max_rate": round(counts["above_max"] / rows, 4),
+                }
+        return {
+            "rows": self.rows,
+            "reference": {"rows": ref_rows, "source": self.reference.get("source"),
+                          "created": self.reference.get("created")},
+            "drifted": [col for col, f in features.items() if f["status"] == "drift"],
+            "unseen_categories": {col: f["unseen_values"] for col, f in features.items()
+                                  if f.get("unseen_values")},
+            "features": features,
+        }
+
+
+def write_report(report, path=REPORT_PATH):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def print_summary(report):
+    for col, f in report["features"].items():
+        if f["status"] != "stable":
+            ks = f" KS={f['ks']:.3f}" if "ks" in f else ""
+            print(f"Drift [{f['status']}] {col}: PSI={f['psi']:.3f}{ks}")
+    for col, values in report["unseen_categories"].items():
+        print(f"Unseen categories in {col}: {', '.join(f'{v} ({n})' for v, n in values.items())}")
+    if not report["drifted"] and not report["unseen_categories"]:
+        print("No drift detected.")
+
+
+def monitor_file(input_path, reference_path=REFERENCE_PATH, report_path=REPORT_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    monitor = DriftMonitor(load_reference(reference_path))
+    start = time.perf_counter()
+    for chunk in pd.read_csv(input_path, chunksize=chunksize, usecols=lambda c: c in monitor.features):
+        monitor.update(chunk)
+    report = monitor.report()
+    write_report(report, report_path)
+    print(f"Checked {monitor.rows:,} rows in {time.perf_counter() - start:.2f}s -> {report_path}")
+    print_summary(report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a customer batch against the training distribution")
+    parser.add_argument("input", help="Customer CSV (same columns as Telco_Churn_Enrichi_GCP.csv)")
+    parser.add_argument("--reference", default=REFERENCE_PATH, help="Written by train_model.py")
+    parser.add_argument("--report", default=REPORT_PATH)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+    monitor_file(args.input, args.reference, args.report, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
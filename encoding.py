@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# What to do with a category that the encoders never saw:
+#   "error" -> raise ValueError listing the unseen values
+#   "zero"  -> map it to code 0 (the historical dashboard behaviour)
+#   "nan"   -> leave it missing; the forest routes NaN to the larger child at each split
+UNKNOWN_POLICIES = ("error", "zero", "nan")
+
+
+def fit_encoders(df, columns):
+    # Same objects as before (dict of LabelEncoder) so encoders.pkl keeps its format,
+    # but classes come from one vectorized unique() per column.
+    # Imported here: scorers and the dashboard only read encoders and shouldn't pay for importing sklearn
+    from sklearn.preprocessing import LabelEncoder
+    encoders = {}
+    for col in columns:
+        le = LabelEncoder()
+        le.classes_ = np.asarray(pd.Series(df[col]).dropna().unique(), dtype=object)
+        le.classes_.sort()
+        encoders[col] = le
+    return encoders
+
+
+def extend_encoders(encoders, df):
+    # New categories are appended after the existing classes so no existing code moves.
+    # classes_ is then no longer sorted: encode with CategoryEncoder, not LabelEncoder.transform.
+    added = {}
+    for col, le in encoders.items():
+        if col not in df.columns:
+            continue
+        values = pd.Series(df[col]).dropna().unique()
+        new = values[pd.Index(le.classes_).get_indexer(values) < 0]
+        if len(new):
+            new = sorted(np.asarray(new, dtype=object))
+            le.classes_ = np.concatenate([le.classes_, np.asarray(new, dtype=object)])
+            added[col] = new
+    return added
+
+
+class CategoryEncoder:
+    """Whole-column categorical encoding built from the encoders.pkl dict.
+
+    Each column's classes are turned into a pandas Index once, so transforming a
+    column is a single hash lookup (``Index.get_indexer``) instead of one
+    ``LabelEncoder.transform`` call per cell.
+    """
+
+    def __init__(self, encoders, unknown="error"):
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError(f"unknown must be one of {UNKNOWN_POLICIES}, got {unknown!r}")
+        self.unknown = unknown
+        self.categories = {col: pd.Index(le.classes_) for col, le in encoders.items()}
+        # Running count of unseen values per column, for reporting
+        self.unknown_counts = {}
+
+    @classmethod
+    def from_categories(cls, categories, unknown="error"):
+        # Same lookups from plain ``{col: [category, ...]}`` lists (e.g. a JSON artifact)
+        encoder = cls({}, unknown=unknown)
+        encoder.categories = {col: pd.Index(values) for col, values in categories.items()}
+        return encoder
+
+    @property
+    def columns(self):
+        return list(self.categories)
+
+    def codes(self, col, values):
+        index = self.categories[col]
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Already categorical: map the (few) categories, then gather by code
+            lut = index.get_indexer(values.cat.categories)
+            raw = values.cat.codes.to_numpy()
+            codes = np.where(raw < 0, -1, lut[raw])
+        else:
+            codes = index.get_indexer(values)
+        return codes
+
+    def transform_column(self, col, values):
+        codes = self.codes(col, values)
+        unseen = codes < 0
+        if not unseen.any():
+            return codes
+
+        n_unseen = int(unseen.sum())
+        self.unknown_counts[col] = self.unknown_counts.get(col, 0) + n_unseen
+        if self.unknown == "error":
+            sample = pd.unique(np.asarray(values, dtype=object)[unseen])[:5]
+            raise ValueError(f"Unseen categories in column '{col}': {list(sample)}")
+        if self.unknown == "zero":
+            return np.where(unseen, 0, codes)
+        return np.where(unseen, np.nan, codes)
+
+    def transform(self, df, columns=None):
+        out = df.copy()
+        for col in columns or self.columns:
+            if col in out.columns:
+                out[col] = self.transform_column(col, out[col])
+        return out
+
+    def encode_value(self, col, value):
+        # Scalar fast path (one dict-style lookup) for single-profile callers like the simulator
+        try:
+            return self.categories[col].get_loc(value)
+        except KeyError:
+            self.unknown_counts[col] = self.unknown_counts.get(col, 0) + 1
+            if self.unknown == "error":
+                raise ValueError(f"Unseen category in column '{col}': {value!r}")
+            return 0 if self.unknown == "zero" else float("nan")
+
+    def inverse_transform_column(self, col, codes):
+        return self.categories[col].take(np.asarray(codes, dtype=np.intp))
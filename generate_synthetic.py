@@ -0,0 +1,268 @@
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_cache import DATA_PATH
+from drift_monitor import REFERENCE_PATH, DriftMonitor, load_reference, print_summary
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Categorical columns in sampling order, each drawn from its distribution given the listed
+# (already sampled) parents. Structural links such as "No internet service" come out exact
+# because a parent combination only ever yields values seen with it in the source data.
+CATEGORICAL_PARENTS = {
+    "Contract": [],
+    "Churn": ["Contract"],
+    "gender": [],
+    "SeniorCitizen": ["Churn"],
+    "Partner": ["Contract"],
+    "Dependents": ["Partner"],
+    "InternetService": ["Contract", "Churn"],
+    "PhoneService": ["InternetService"],
+    "MultipleLines": ["PhoneService", "InternetService", "Churn"],
+    # Add-ons chained on each other: customers who take one tend to take the next
+    "OnlineSecurity": ["InternetService", "Churn"],
+    "OnlineBackup": ["InternetService", "OnlineSecurity", "Churn"],
+    "DeviceProtection": ["InternetService", "OnlineBackup", "Churn"],
+    "TechSupport": ["InternetService", "OnlineSecurity", "Churn"],
+    "StreamingTV": ["InternetService", "DeviceProtection", "Churn"],
+    "StreamingMovies": ["InternetService", "StreamingTV", "Churn"],
+    "PaperlessBilling": ["Churn"],
+    "PaymentMethod": ["Contract", "Churn"],
+}
+# Numeric columns resampled from the source rows that share these categorical values
+EMPIRICAL_PARENTS = {
+    "tenure": ["Contract", "Churn"],
+    "Score_Sentiment_Dernier_Mois": ["Churn"],
+}
+# MonthlyCharges is (almost) a price list: linear in the subscribed services
+PRICE_COLUMNS = ["PhoneService", "MultipleLines", "InternetService", "OnlineSecurity", "OnlineBackup",
+                 "DeviceProtection", "TechSupport", "StreamingTV", "StreamingMovies"]
+PRICE_STEP = 0.05
+COLUMNS = ["customerID", "gender", "SeniorCitizen", "Partner", "Dependents", "tenure", "PhoneService",
+           "MultipleLines", "InternetService", "OnlineSecurity", "OnlineBackup", "DeviceProtection", "TechSupport",
+           "StreamingTV", "StreamingMovies", "Contract", "PaperlessBilling", "PaymentMethod", "MonthlyCharges",
+           "TotalCharges", "Churn", "Cout_Acquisition_Client", "Rentabilite_Nette_Simulee",
+           "Score_Sentiment_Dernier_Mois"]
+
+
+def _group_index(codes, parents, values, n_rows):
+    # Row -> flat index into the grid of parent value combinations
+    if not parents:
+        return np.zeros(n_rows, dtype=np.intp)
+    return np.ravel_multi_index([codes[p] for p in parents], [len(values[p]) for p in parents])
+
+
+def _price_design(codes, values):
+    # Intercept plus one indicator per (service, value) except each service's first value
+    columns = [np.ones(len(codes[PRICE_COLUMNS[0]]))]
+    for col in PRICE_COLUMNS:
+        columns.extend((codes[col] == k).astype(np.float64) for k in range(1, len(values[col])))
+    return np.column_stack(columns)
+
+
+def fit_spec(df):
+    """Learn what ``sample_chunk`` needs from the enriched Telco data.
+
+    - categorical columns: probability tables given their ``CATEGORICAL_PARENTS``
+    - ``tenure`` and the sentiment score: the source values of each parent group
+    - ``MonthlyCharges``: least squares on the services plus the observed residuals
+    - ``TotalCharges`` and ``Cout_Acquisition_Client``: observed ratios to
+      ``tenure * MonthlyCharges`` and ``MonthlyCharges``
+    - ``Rentabilite_Nette_Simulee``: exactly ``TotalCharges - Cout_Acquisition_Client``
+    """
+    df = df.copy()
+    df["TotalCharges"] = pd.to_numeric(df["TotalCharges"], errors="coerce").fillna(0.0)
+    df = df.dropna(subset=list(CATEGORICAL_PARENTS))
+    values = {col: sorted(df[col].unique().tolist()) for col in CATEGORICAL_PARENTS}
+    codes = {col: pd.Categorical(df[col], categories=values[col]).codes for col in CATEGORICAL_PARENTS}
+
+    tables = {}
+    for col, parents in CATEGORICAL_PARENTS.items():
+        n_groups = int(np.prod([len(values[p]) for p in parents])) if parents else 1
+        counts = np.zeros((n_groups, len(values[col])))
+        np.add.at(counts, (_group_index(codes, parents, values, len(df)), codes[col]), 1)
+        marginal = counts.sum(axis=0)
+        # Parent combinations never seen in the source fall back to the column's marginal
+        counts[counts.sum(axis=1) == 0] = marginal
+        tables[col] = np.cumsum(counts / counts.sum(axis=1, keepdims=True), axis=1)
+
+    empirical = {}
+    for col, parents in EMPIRICAL_PARENTS.items():
+        groups = _group_index(codes, parents, values, len(df))
+        source = df[col].to_numpy()
+        n_groups = int(np.prod([len(values[p]) for p in parents]))
+        empirical[col] = [source[groups == g] if (groups == g).any() else source for g in range(n_groups)]
+
+    design = _price_design(codes, values)
+    monthly = df["MonthlyCharges"].to_numpy()
+    coef = np.linalg.lstsq(design, monthly, rcond=None)[0]
+
+    billed = df["tenure"].to_numpy() * monthly
+    has_bill = billed > 0
+    return {
+        "values": values,
+        "tables": tables,
+        "empirical": empirical,
+        "price_coef": coef,
+        "price_residuals": monthly - design @ coef,
+        "price_range": (float(monthly.min()), float(monthly.max())),
+        "total_ratio": df["TotalCharges"].to_numpy()[has_bill] / billed[has_bill],
+        "cac_ratio": df["Cout_Acquisition_Client"].to_numpy() / monthly,
+        "source_rows": len(df),
+    }
+
+
+def sample_chunk(spec, n_rows, rng, start_id=0):
+    """``n_rows`` synthetic customers with the source schema; customerIDs start at ``start_id``."""
+    values = spec["values"]
+    ids = pd.Series(np.arange(start_id, start_id + n_rows)).astype(str).str.zfill(10)
+    frame = pd.DataFrame({"customerID": "SYN-" + ids})
+    codes = {}
+    for col, parents in CATEGORICAL_PARENTS.items():
+        # Inverse CDF: count the cumulative probabilities below each uniform draw
+        cum = spec["tables"][col][_group_index(codes, parents, values, n_rows)]
+        codes[col] = np.minimum((rng.random(n_rows)[:, None] >= cum).sum(axis=1), len(values[col]) - 1)
+        # Categoricals, like load_dataset returns them: cheap to build and to write
+        frame[col] = pd.Categorical.from_codes(codes[col], categories=values[col])
+
+    for col, parents in EMPIRICAL_PARENTS.items():
+        group = _group_index(codes, parents, values, n_rows)
+        column = np.empty(n_rows, dtype=spec["empirical"][col][0].dtype)
+        for g in np.unique(group):
+            rows = group == g
+            column[rows] = rng.choice(spec["empirical"][col][g], rows.sum())
+        frame[col] = column
+
+    price = _price_design(codes, values) @ spec["price_coef"] + rng.choice(spec["price_residuals"], n_rows)
+    lo, hi = spec["price_range"]
+    frame["MonthlyCharges"] = (np.clip(price, lo, hi) / PRICE_STEP).round() * PRICE_STEP
+    frame["MonthlyCharges"] = frame["MonthlyCharges"].round(2)
+    total = frame["tenure"] * frame["MonthlyCharges"] * rng.choice(spec["total_ratio"], n_rows)
+    frame["TotalCharges"] = total.round(2)
+    frame["Cout_Acquisition_Client"] = frame["MonthlyCharges"] * rng.choice(spec["cac_ratio"], n_rows)
+    frame["Rentabilite_Nette_Simulee"] = frame["TotalCharges"] - frame["Cout_Acquisition_Client"]
+    return frame[COLUMNS]
+
+
+def _write_csv_part(frame, path):
+    # pyarrow's CSV writer is ~10x faster than DataFrame.to_csv, which would dominate the run
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pc
+    except ImportError:
+        frame.to_csv(path, header=False, index=False)
+        return
+    # Unquoted like the source file, unless some category would need quotes
+    plain = not any(set(str(v)) & set(',"\n') for col in CATEGORICAL_PARENTS for v in frame[col].cat.categories)
+    pc.write_csv(pa.Table.from_pandas(frame, preserve_index=False), path,
+                 pc.WriteOptions(include_header=False, quoting_style="none" if plain else "needed"))
+
+
+def _write_part(spec, start, n_rows, seed, part_path, fmt, reference):
+    # Each chunk has its own seed, so the output doesn't depend on the number of workers
+    frame = sample_chunk(spec, n_rows, np.random.default_rng(seed), start_id=start)
+    if fmt == "parquet":
+        frame.to_parquet(part_path, index=False)
+    else:
+        _write_csv_part(frame, part_path)
+    monitor = None
+    if reference is not None:
+        monitor = DriftMonitor(reference)
+        monitor.update(frame)
+    return monitor
+
+
+def _merge_parts(parts, output_path, fmt):
+    tmp = output_path + ".tmp"
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        writer = None
+        for part in parts:
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table)
+        writer.close()
+    else:
+        with open(tmp, "wb") as out:
+            out.write((",".join(COLUMNS) + "\n").encode())
+            for part in parts:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out, 1 << 24)
+    os.replace(tmp, output_path)
+
+
+def generate(n_rows, output_path, source=DATA_PATH, chunksize=DEFAULT_CHUNKSIZE, workers=None, seed=42, fmt=None,
+             reference_path=REFERENCE_PATH):
+    """Write ``n_rows`` synthetic customers to ``output_path`` (CSV or Parquet) from parallel chunks.
+
+    The same ``seed`` and ``chunksize`` give the same file whatever ``workers`` is.
+    With a drift reference, the result is also checked against the training
+    distribution (PSI per column) as it is generated.
+    """
+    if n_rows < 1:
+        raise ValueError(f"n_rows must be at least 1, got {n_rows}")
+    fmt = fmt or ("parquet" if output_path.endswith(".parquet") else "csv")
+    start_time = time.perf_counter()
+    spec = fit_spec(pd.read_csv(source))
+    reference = load_reference(reference_path) if reference_path and os.path.exists(reference_path) else None
+
+    parts_dir = output_path + ".parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    starts = list(range(0, n_rows, chunksize))
+    parts = [os.path.join(parts_dir, f"part-{i:05d}.{fmt}") for i in range(len(starts))]
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    print(f"Generating {n_rows:,} rows in {len(starts)} chunks from {spec['source_rows']:,} source rows...")
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            monitors = list(pool.map(
+                _write_part, [spec] * len(starts), starts, [min(chunksize, n_rows - s) for s in starts], seeds,
+                parts, [fmt] * len(starts), [reference] * len(starts),
+            ))
+        _merge_parts(parts, output_path, fmt)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Done. {n_rows:,} rows in {elapsed:.1f}s ({n_rows / elapsed:,.0f} rows/s) -> {output_path}")
+    if reference is not None:
+        monitor = monitors[0]
+        for other in monitors[1:]:
+            monitor.merge(other)
+        print(f"Fidelity vs {reference_path}:")
+        print_summary(monitor.report())
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic customers with the enriched Telco schema")
+    parser.add_argument("rows", type=float, help="Number of rows (e.g. 5e6)")
+    parser.add_argument("-o", "--output", default="synthetic_customers.csv",
+                        help="Output .csv or .parquet. Both work with score.py, survival.py, train_model.py "
+                             "and the other load_dataset readers; the dashboard always shows the bundled CSV")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Override output format")
+    parser.add_argument("--source", default=DATA_PATH, help="Data the distributions are learned from")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per worker task")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-check", action="store_true", help="Skip the PSI check against the drift reference")
+    args = parser.parse_args()
+    if int(args.rows) < 1:
+        parser.error("rows must be at least 1")
+    if args.chunksize < 1:
+        parser.error("--chunksize must be at least 1")
+    generate(int(args.rows), args.output, args.source, args.chunksize, args.workers, args.seed, args.format,
+             None if args.no_check else REFERENCE_PATH)
+
+
+if __name__ == "__main__":
+    main()
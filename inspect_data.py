@@ -1,13 +1,15 @@
 import pandas as pd
 import os
 
+from data_cache import load_dataset
+
 files = ["Telco_Churn_Enrichi_GCP.csv", "WA_Fn-UseC_-Telco-Customer-Churn.csv"]
 
 for f in files:
     if os.path.exists(f):
         print(f"\n--- Analyzing {f} ---")
         try:
-            df = pd.read_csv(f)
+            df = load_dataset(f)
             print("Shape:", df.shape)
             print("\nColumns:", df.columns.tolist())
             print("\nFirst 3 rows:")
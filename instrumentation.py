@@ -0,0 +1,302 @@
+"""Timing spans, counters and a sampling profiler for the training, scoring and dashboard hot paths.
+
+Everything is off until ``enable()`` (the ``--metrics`` / ``--profile`` flags of the entry points, or the
+CHURN_METRICS / CHURN_PROFILE environment variables for the dashboard). While off, ``span()`` hands back
+one shared no-op context manager and ``count()`` returns at once, so instrumented code costs a global lookup.
+
+Span names are ``<entry point>.<stage>`` with the stages load, preprocess, encode, fit, predict,
+aggregate and render, e.g. ``score.predict`` or ``dashboard.render``.
+"""
+import atexit
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+METRICS_ENV = "CHURN_METRICS"
+PROFILE_ENV = "CHURN_PROFILE"
+STAGES = ("load", "preprocess", "encode", "fit", "predict", "aggregate", "render")
+# Prometheus histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+DEFAULT_PROFILE_INTERVAL_MS = 5.0
+# Span events held in memory before they are appended to the JSON-lines file
+MAX_BUFFERED_EVENTS = 10_000
+
+_NULL_SPAN = contextlib.nullcontext()
+_END = object()
+_recorder = None
+_profiler = None
+
+
+class Recorder:
+    """Per-span latency histograms, counters and a buffer of span events, exported on ``flush()``.
+
+    A path ending in ``.prom`` gets the Prometheus text format (rewritten on every flush);
+    anything else gets one JSON object per span appended to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fmt = "prometheus" if path.endswith(".prom") else "jsonl"
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = collections.Counter()
+        self.events = []
+        # Span names open in each thread, so nested spans know their parent and samples their stage
+        self.active = collections.defaultdict(list)
+
+    def record(self, name, start, seconds, attrs=None):
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+                    break
+            if self.fmt == "jsonl":
+                event = {"ts": round(start, 6), "span": name, "ms": round(seconds * 1000, 3),
+                         "thread": threading.current_thread().name}
+                parents = self.active.get(threading.get_ident())
+                if parents:
+                    event["parent"] = parents[-1]
+                if attrs:
+                    event.update(attrs)
+                self.events.append(event)
+                full = len(self.events) >= MAX_BUFFERED_EVENTS
+            else:
+                full = False
+        if full:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "spans": {name: {"count": s["count"], "total_ms": s["sum"] * 1000, "max_ms": s["max"] * 1000,
+                                 "mean_ms": s["sum"] * 1000 / s["count"]} for name, s in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+            if self.fmt == "jsonl":
+                counters = [{"ts": round(time.time(), 6), "counter": name, "value": value}
+                            for name, value in self.counters.items()]
+                with open(self.path, "a") as f:
+                    for event in events + counters:
+                        f.write(json.dumps(event) + "\n")
+            else:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w") as f:
+                    f.write(self._prometheus())
+                # Scrapers never see a half-written file
+                os.replace(tmp, self.path)
+
+    def _prometheus(self):
+        lines = ["# HELP churn_span_seconds Time spent in instrumented stages",
+                 "# TYPE churn_span_seconds histogram"]
+        for name, s in sorted(self.spans.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, s["buckets"]):
+                cumulative += n
+                lines.append(f'churn_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'churn_span_seconds_bucket{{span="{name}",le="+Inf"}} {s["count"]}')
+            lines.append(f'churn_span_seconds_sum{{span="{name}"}} {s["sum"]:.6f}')
+            lines.append(f'churn_span_seconds_count{{span="{name}"}} {s["count"]}')
+        lines += ["# HELP churn_events_total Counted events (rows scored, cache hits, ...)",
+                  "# TYPE churn_events_total counter"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'churn_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class Span:
+    __slots__ = ("recorder", "name", "attrs", "start", "wall")
+
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.recorder.active[threading.get_ident()].append(self.name)
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.recorder.active[threading.get_ident()].pop()
+        self.recorder.record(self.name, self.wall, seconds, self.attrs)
+        return False
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack each ``interval_ms`` and counts them as folded stacks.
+
+    ``write()`` produces one ``frame;frame;frame count`` line per distinct stack, root first,
+    the input of flamegraph.pl, speedscope or inferno. Each stack starts with the thread name and
+    the instrumented span it was sampled in, so the flame graph splits by stage.
+    """
+
+    def __init__(self, path, interval_ms=DEFAULT_PROFILE_INTERVAL_MS, recorder=None):
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.recorder = recorder
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                root = [names.get(ident, str(ident))]
+                if self.recorder is not None:
+                    root += [f"[{name}]" for name in self.recorder.active.get(ident, ())]
+                sampled.append(";".join(root + frames[::-1]))
+            with self.lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+
+    def write(self):
+        with self.lock:
+            stacks = self.stacks.most_common()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for stack, n in stacks:
+                f.write(f"{stack} {n}\n")
+        os.replace(tmp, self.path)
+
+
+# --- PUBLIC API ---
+def enable(metrics_path=None, profile_path=None, profile_interval_ms=DEFAULT_PROFILE_INTERVAL_MS,
+           flush_interval=None):
+    """Start recording spans to ``metrics_path`` and/or sampling stacks to ``profile_path``.
+
+    Spans are recorded whenever either is given: the profiler uses them to tag samples with their stage.
+    Both files are written at exit, and every ``flush_interval`` seconds for long-running services.
+    """
+    global _recorder, _profiler
+    if _recorder is not None or not (metrics_path or profile_path):
+        return
+    _recorder = Recorder(metrics_path or os.devnull)
+    if profile_path:
+        _profiler = SamplingProfiler(profile_path, profile_interval_ms, _recorder).start()
+    if flush_interval:
+        threading.Thread(target=_flush_every, args=(flush_interval,), name="metrics-flush", daemon=True).start()
+    atexit.register(_shutdown)
+
+
+def _flush_every(interval):
+    while True:
+        time.sleep(interval)
+        flush()
+
+
+def enable_from_env():
+    # For processes without a CLI of their own (streamlit run dashboard.py); a no-op once enabled
+    enable(os.environ.get(METRICS_ENV), os.environ.get(PROFILE_ENV))
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--metrics", metavar="PATH", default=os.environ.get(METRICS_ENV),
+                       help="Record stage timings and counters: .prom = Prometheus text, else JSON lines")
+    group.add_argument("--profile", metavar="PATH", default=os.environ.get(PROFILE_ENV),
+                       help="Sample stacks into a folded-stack file for flame graphs")
+    group.add_argument("--profile-interval-ms", type=float, default=DEFAULT_PROFILE_INTERVAL_MS,
+                       help="Milliseconds between stack samples")
+
+
+def enable_from_args(args, flush_interval=None):
+    enable(args.metrics, args.profile, args.profile_interval_ms, flush_interval)
+
+
+def enabled():
+    return _recorder is not None
+
+
+def span(name, **attrs):
+    """Context manager timing the block as ``name``; a shared no-op while instrumentation is off."""
+    if _recorder is None:
+        return _NULL_SPAN
+    return Span(_recorder, name, attrs)
+
+
+def iter_spans(name, iterable):
+    """Yield from ``iterable``, timing each ``next()`` as ``name`` (lazy readers such as CSV chunks)."""
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+def record(name, seconds):
+    # A duration measured by the caller, for code that cannot sit in a with block (a whole dashboard rerun)
+    if _recorder is not None:
+        _recorder.record(name, time.time() - seconds, seconds)
+
+
+def count(name, value=1):
+    if _recorder is not None:
+        with _recorder.lock:
+            _recorder.counters[name] += value
+
+
+def snapshot():
+    return _recorder.snapshot() if _recorder is not None else {"spans": {}, "counters": {}}
+
+
+def flush():
+    if _recorder is not None:
+        _recorder.flush()
+    if _profiler is not None:
+        _profiler.write()
+
+
+def _shutdown():
+    if _profiler is not None:
+        _profiler.stop()
+    flush()
+    print_summary()
+    for path in (_recorder.path, _profiler and _profiler.path):
+        if path and path != os.devnull:
+            print(f"Instrumentation -> {path}")
+
+
+def print_summary():
+    spans = snapshot()["spans"]
+    for name, s in sorted(spans.items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"  {name:<24} {s['count']:>6}x {s['total_ms']:>10.1f} ms total {s['mean_ms']:>9.2f} ms mean")
@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import joblib
+
+from compact_model import COMPACT_MODEL_PATH, CompactForest
+
+REGISTRY_DIR = "model_registry"
+# Plain files next to the scripts: what train_model.py writes and what is served if there is no registry yet
+LEGACY_MODEL_PATH = "rf_model.pkl"
+LEGACY_ENCODERS_PATH = "encoders.pkl"
+# Files copied into every version (the model/encoders pickles are required, the rest if present)
+ARTIFACTS = {
+    "model": "rf_model.pkl",
+    "compact": "rf_compact.pkl",
+    "encoders": "encoders.pkl",
+    "drift_reference": "drift_reference.json",
+}
+# What identifies a version: a retrain that reproduces these reuses the existing version, whatever
+# else changed (the drift reference carries a fresh timestamp on every run)
+IDENTITY_ARTIFACTS = ("model", "compact", "encoders")
+# Versions kept by publish() besides CURRENT; older ones are pruned
+KEEP_VERSIONS = 10
+
+
+def _versions_dir(registry_dir):
+    return os.path.join(registry_dir, "versions")
+
+
+def _content_hash(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Metadata of every published version, oldest first."""
+    root = _versions_dir(registry_dir)
+    if not os.path.isdir(root):
+        return []
+    versions = []
+    for name in sorted(os.listdir(root)):
+        meta_path = os.path.join(root, name, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                versions.append(json.load(f))
+    return versions
+
+
+def set_current(version, registry_dir=REGISTRY_DIR):
+    # Readers see either the old or the new pointer, never a half-written one
+    if not os.path.exists(os.path.join(_versions_dir(registry_dir), version, "meta.json")):
+        raise ValueError(f"No version {version!r} in {registry_dir}")
+    fd, tmp = tempfile.mkstemp(dir=registry_dir, prefix=".CURRENT-")
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(registry_dir, "CURRENT"))
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    """Version the CURRENT pointer names, or a stat key of the legacy files when there is no registry."""
+    try:
+        with open(os.path.join(registry_dir, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        parts = []
+        for path in (COMPACT_MODEL_PATH, LEGACY_MODEL_PATH, LEGACY_ENCODERS_PATH):
+            if os.path.exists(path):
+                st = os.stat(path)
+                parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        return "local:" + ";".join(parts)
+
+
+def _version_number(name):
+    try:
+        return int(name[1:].split("-")[0])
+    except ValueError:
+        return 0
+
+
+def prune_versions(keep=KEEP_VERSIONS, registry_dir=REGISTRY_DIR):
+    """Delete all but the ``keep`` newest versions; CURRENT is always kept. Returns the removed names."""
+    current = current_version(registry_dir)
+    versions = [meta["version"] for meta in list_versions(registry_dir)]
+    stale = [v for v in versions[:max(len(versions) - keep, 0)] if v != current]
+    for version in stale:
+        # Processes that already loaded it keep their copy (a memory-mapped file outlives its unlink)
+        shutil.rmtree(os.path.join(_versions_dir(registry_dir), version), ignore_errors=True)
+    return stale
+
+
+def publish(files, metrics=None, source=None, registry_dir=REGISTRY_DIR, make_current=True, keep=KEEP_VERSIONS):
+    """Copy ``files`` (``{artifact: path}``, see ARTIFACTS) into a new immutable version.
+
+    The version is assembled in a temporary directory and renamed into place, so a
+    reader never sees it half-written; publishing the same model, compact forest and
+    encoders again reuses the existing version. Only the ``keep`` newest versions (and
+    CURRENT) are kept. Returns the version name.
+    """
+    missing = [key for key in ("model", "encoders") if key not in files]
+    if missing:
+        raise ValueError(f"A version needs at least: {missing}")
+    files = {key: path for key, path in files.items() if path and os.path.exists(path)}
+    digest = _content_hash([files[key] for key in IDENTITY_ARTIFACTS if key in files])
+
+    for meta in list_versions(registry_dir):
+        if meta["content_hash"] == digest:
+            print(f"Artifacts unchanged, already published as {meta['version']}")
+            if make_current:
+                set_current(meta["version"], registry_dir)
+            return meta["version"]
+
+    root = _versions_dir(registry_dir)
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+    try:
+        for key, path in files.items():
+            shutil.copyfile(path, os.path.join(tmp_dir, ARTIFACTS[key]))
+        model = joblib.load(files["model"])
+        meta = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "content_hash": digest,
+            "feature_names": [str(c) for c in model.feature_names_in_],
+            # Forest trees, or boosting iterations for a gradient-boosted model
+            "n_trees": len(getattr(model, "estimators_", [])) or int(getattr(model, "n_iter_", 0)),
+            "artifacts": sorted(ARTIFACTS[key] for key in files),
+            "metrics": metrics or {},
+            "params": model.get_params() if hasattr(model, "get_params") else {},
+            "source": source,
+        }
+        # Sequential names; if another publisher took the number first, try the next one
+        number = max([_version_number(name) for name in os.listdir(root) if name.startswith("v")], default=0) + 1
+        while True:
+            version = f"v{number:04d}-{digest[:8]}"
+            meta["version"] = version
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2, default=str)
+            try:
+                os.rename(tmp_dir, os.path.join(root, version))
+                break
+            except OSError:
+                number += 1
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if make_current:
+        set_current(version, registry_dir)
+    print(f"Published model version {version}")
+    if keep is not None:
+        for old in prune_versions(keep, registry_dir):
+            print(f"Pruned model version {old}")
+    return version
+
+
+class ModelBundle:
+    """Everything a scorer needs from one version: model, encoders, feature order and metadata."""
+
+    def __init__(self, version, model, encoders, meta, path=None):
+        self.version = version
+        self.model = model
+        self.encoders = encoders
+        self.meta = meta
+        self.path = path
+        self.feature_names = list(model.feature_names_in_)
+
+    def artifact(self, key):
+        # Path of an optional artifact of this version (e.g. its drift reference), or None
+        if self.path is None:
+            return ARTIFACTS[key] if os.path.exists(ARTIFACTS[key]) else None
+        path = os.path.join(self.path, ARTIFACTS[key])
+        return path if os.path.exists(path) else None
+
+
+def _load_model(model_path, compact_path, kind, mmap_mode):
+    # "compact": flattened numpy forest (fast single rows, memory-mapped so worker processes
+    # share one copy through the page cache); "forest": the sklearn model (fastest on big batches)
+    if kind == "compact" and compact_path and os.path.exists(compact_path):
+        return CompactForest.load(compact_path, mmap_mode=mmap_mode)
+    return joblib.load(model_path)
+
+
+def load_version(version, registry_dir=REGISTRY_DIR, kind="compact", mmap_mode="r"):
+    if version.startswith("local:"):
+        # No registry: the plain files next to the scripts
+        model = _load_model(LEGACY_MODEL_PATH, COMPACT_MODEL_PATH, kind, None)
+        return ModelBundle(version, model, joblib.load(LEGACY_ENCODERS_PATH), {"version": version})
+    path = os.path.join(_versions_dir(registry_dir), version)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    model = _load_model(os.path.join(path, ARTIFACTS["model"]), os.path.join(path, ARTIFACTS["compact"]),
+                        kind, mmap_mode)
+    encoders = joblib.load(os.path.join(path, ARTIFACTS["encoders"]))
+    return ModelBundle(version, model, encoders, meta, path)
+
+
+def load_current(registry_dir=REGISTRY_DIR, kind="compact", mmap_mode="r"):
+    """Bundle of the CURRENT version, falling back to the legacy files when nothing is published."""
+    return load_version(current_version(registry_dir), registry_dir, kind, mmap_mode)
+
+
+class ModelWatcher:
+    """Keeps the current version loaded and swaps in new ones from a background thread.
+
+    ``bundle`` is replaced with a single assignment once the new version is fully
+    loaded, so a request that already grabbed the old bundle finishes with it.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR, kind="compact", interval=2.0, on_reload=None):
+        self.registry_dir = registry_dir
+        self.kind = kind
+        self.interval = interval
+        self.on_reload = on_reload
+        self.bundle = load_current(registry_dir, kind)
+        self.reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        if current_version(self.registry_dir) == self.bundle.version:
+            return False
+        try:
+            bundle = load_current(self.registry_dir, self.kind)
+        except Exception as e:
+            # Keep serving the old version rather than going down on a bad publish
+            print(f"Model reload failed, still serving {self.bundle.version}: {e}")
+            return False
+        self.bundle = bundle
+        self.reloads += 1
+        print(f"Now serving model version {bundle.version}")
+        if self.on_reload is not None:
+            self.on_reload(bundle)
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the model registry or roll back to another version")
+    parser.add_argument("command", choices=["list", "current", "promote", "prune"])
+    parser.add_argument("version", nargs="?", help="Version to make current (promote)")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="Versions kept by prune (plus CURRENT)")
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        removed = prune_versions(args.keep, args.registry)
+        print(f"Removed {len(removed)} versions" + (f": {', '.join(removed)}" if removed else ""))
+    elif args.command == "promote":
+        if not args.version:
+            parser.error("promote needs a version")
+        set_current(args.version, args.registry)
+        print(f"CURRENT -> {args.version}")
+    elif args.command == "current":
+        print(current_version(args.registry))
+    else:
+        current = current_version(args.registry)
+        for meta in list_versions(args.registry):
+            auc = meta["metrics"].get("roc_auc")
+            print(f"{'*' if meta['version'] == current else ' '} {meta['version']}  {meta['created']}  "
+                  f"{meta['n_trees']} trees  AUC={auc if auc is not None else '-'}  {meta.get('source') or ''}")
+
+
+if __name__ == "__main__":
+    main()
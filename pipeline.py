@@ -0,0 +1,257 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import analyze_dataset
+import profitability_analysis
+import survival
+import train_model
+from compact_model import COMPACT_MODEL_PATH
+from data_cache import DATA_PATH, cache_path, file_hash
+from drift_monitor import REFERENCE_PATH
+from model_registry import REGISTRY_DIR
+
+STATE_PATH = os.path.join(".cache", "pipeline", "state.json")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stage:
+    """One pipeline step: ``func(**params)`` reads ``inputs`` and writes ``outputs``.
+
+    A stage depends on whichever stages produce its inputs. It is skipped when the
+    content of its inputs, its params and the source files of ``func``'s module and
+    every repo module it imports hash to the same key as last run and its outputs are intact.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+
+def training_stages(data_path=DATA_PATH, rf_params=None, backend="rf"):
+    encoded, metrics = train_model.ENCODED_PATH, train_model.METRICS_PATH
+    predictions = train_model.TEST_PREDICTIONS_PATH
+    return [
+        Stage("prepare", train_model.prepare_training_data, [data_path], [encoded, "encoders.pkl"],
+              {"data_path": data_path}),
+        Stage("fit", train_model.fit_model, [encoded, "encoders.pkl"], ["rf_model.pkl"],
+              {"rf_params": rf_params, "backend": backend}),
+        Stage("evaluate", train_model.evaluate_model, [encoded, "rf_model.pkl"],
+              ["model_performance.txt", predictions, metrics]),
+        Stage("compact", train_model.export_compact, [encoded, "rf_model.pkl"], [COMPACT_MODEL_PATH]),
+        Stage("drift_reference", train_model.write_drift_reference, [encoded, "encoders.pkl"], [REFERENCE_PATH]),
+        Stage("training_store", train_model.reset_training_store, [encoded, "rf_model.pkl"],
+              [train_model.TRAINING_STORE_DIR]),
+        Stage("register", train_model.register_model,
+              ["rf_model.pkl", COMPACT_MODEL_PATH, "encoders.pkl", REFERENCE_PATH, metrics],
+              [os.path.join(REGISTRY_DIR, "CURRENT")]),
+        Stage("hazard_curves", survival.train_hazard_model, [data_path], [survival.HAZARD_MODEL_PATH],
+              {"data_path": data_path}),
+        Stage("feature_importance_plot", train_model.plot_feature_importance, ["rf_model.pkl", encoded],
+              ["feature_importance.png"]),
+        Stage("confusion_matrix_plot", train_model.plot_confusion_matrix, [predictions], ["confusion_matrix.png"]),
+        Stage("analysis_report", analyze_dataset.analyze, [data_path],
+              ["analysis_report.md", "churn_distribution.png", "correlation_matrix.png"],
+              {"filename": data_path, "report_file": "analysis_report.md"}),
+        Stage("profitability_plots", profitability_analysis.plot_profitability, [data_path],
+              ["profitability_impact.png", "profitability_distribution.png"]),
+    ]
+
+
+def _load_state(path=STATE_PATH):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+
+def _save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _digest(path, state):
+    """Content hash of a file or directory; files whose size and mtime are unchanged aren't re-read."""
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        h = hashlib.sha256()
+        for root, _, names in sorted(os.walk(path)):
+            for name in sorted(names):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update(_digest(full, state).encode())
+        return h.hexdigest()
+
+    st = os.stat(path)
+    stat_key = f"{st.st_size}:{st.st_mtime_ns}"
+    known = state["files"].get(path)
+    if known and known["stat"] == stat_key:
+        return known["hash"]
+    digest = file_hash(path)
+    state["files"][path] = {"stat": stat_key, "hash": digest}
+    return digest
+
+
+def _imported_modules(path):
+    # Every module named in an import statement of the file, including imports deferred into functions
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return names
+
+
+def source_files(module):
+    """Source file of ``module`` plus those of the repo modules it imports, directly or not."""
+    seen, todo = set(), [module]
+    while todo:
+        path = os.path.join(REPO_DIR, todo.pop().split(".")[0] + ".py")
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        todo.extend(_imported_modules(path))
+    return sorted(seen)
+
+
+def stage_key(stage, state):
+    payload = {
+        # Whole files rather than the function's source: helpers, constants and lazily imported
+        # modules (encoding, compact_model, data_cache, ...) all change what a stage produces
+        "code": {os.path.relpath(path, REPO_DIR): _digest(path, state)
+                 for path in source_files(stage.func.__module__)},
+        "params": stage.params,
+        "inputs": {path: _digest(path, state) for path in stage.inputs},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _up_to_date(stage, key, state):
+    last = state["stages"].get(stage.name)
+    if last is None or last["key"] != key:
+        return False
+    # Outputs edited or deleted since (e.g. an incremental update overwrote the model) -> rerun
+    return all(_digest(path, state) == last["outputs"].get(path) for path in stage.outputs)
+
+
+def _run_stage(func, params):
+    func(**params)
+
+
+def run_pipeline(stages, jobs=None, force=(), dry_run=False):
+    """Run ``stages`` in dependency order, in parallel where independent; returns ``{name: status}``."""
+    names = [stage.name for stage in stages]
+    unknown = set(force) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    deps = {stage.name: {producers[p] for p in stage.inputs if p in producers} for stage in stages}
+
+    state = _load_state()
+    status, running = {}, {}
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(jobs) if jobs != 1 and not dry_run else None
+    try:
+        while len(status) < len(stages):
+            # Queue every stage whose upstream is settled (skipping can unblock more, hence the loop)
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in stages:
+                    if stage.name in status or stage.name in running or not deps[stage.name] <= set(status):
+                        continue
+                    if dry_run and any(status[d] != "skipped" for d in deps[stage.name]):
+                        status[stage.name] = "would run (upstream changed)"
+                        progressed = True
+                        continue
+                    key = stage_key(stage, state)
+                    if stage.name not in force and _up_to_date(stage, key, state):
+                        print(f"[skip] {stage.name}")
+                        status[stage.name] = "skipped"
+                        progressed = True
+                    elif dry_run:
+                        status[stage.name] = "would run"
+                        progressed = True
+                    elif pool is None:
+                        print(f"[run]  {stage.name}")
+                        t0 = time.perf_counter()
+                        _run_stage(stage.func, stage.params)
+                        _finish(stage, key, state, status, t0)
+                        progressed = True
+                    else:
+                        print(f"[run]  {stage.name}")
+                        running[stage.name] = (pool.submit(_run_stage, stage.func, stage.params), key,
+                                               time.perf_counter())
+
+            if len(status) == len(stages):
+                break
+            if not running:
+                raise RuntimeError(f"Dependency cycle between stages: {sorted(set(names) - set(status))}")
+            finished, _ = wait([future for future, _, _ in running.values()], return_when=FIRST_COMPLETED)
+            for stage in stages:
+                if stage.name in running and running[stage.name][0] in finished:
+                    future, key, t0 = running.pop(stage.name)
+                    future.result()
+                    _finish(stage, key, state, status, t0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    ran = [name for name, s in status.items() if s.startswith("ran")]
+    print(f"Pipeline done in {time.perf_counter() - start:.1f}s: {len(ran)} ran, "
+          f"{sum(s == 'skipped' for s in status.values())} skipped")
+    return status
+
+
+def _finish(stage, key, state, status, t0):
+    elapsed = time.perf_counter() - t0
+    # Recorded only after success, so a failed stage always reruns
+    state["stages"][stage.name] = {
+        "key": key,
+        "outputs": {path: _digest(path, state) for path in stage.outputs},
+        "seconds": round(elapsed, 2),
+    }
+    _save_state(state)
+    status[stage.name] = f"ran ({elapsed:.1f}s)"
+    print(f"[done] {stage.name} in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild model and report artifacts, skipping unchanged stages")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--params", help="JSON file of model params for --backend (e.g. best_params.json)")
+    parser.add_argument("--backend", choices=train_model.BACKENDS, default="rf")
+    parser.add_argument("--jobs", type=int, default=None, help="Stages run at once (1 = sequential, in-process)")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Rerun these stages regardless")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would run")
+    args = parser.parse_args()
+
+    rf_params = None
+    if args.params:
+        with open(args.params) as f:
+            rf_params = json.load(f)
+
+    # Build the typed dataset cache once up front instead of racing to build it in every worker
+    cache_path(args.data)
+    status = run_pipeline(training_stages(args.data, rf_params, args.backend), jobs=args.jobs, force=args.force,
+                          dry_run=args.dry_run)
+    for name, s in status.items():
+        print(f"  {name:<25} {s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+from aggregates import PROFIT_COLUMN, binned_kde
+from data_cache import load_dataset
 
 def plot_profitability():
-    df = pd.read_csv("Telco_Churn_Enrichi_GCP.csv")
+    # Imported here so pipeline.py (and its workers) can import this module without loading matplotlib
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    df = load_dataset("Telco_Churn_Enrichi_GCP.csv")
     
     # We want to show "Profitability Risk" - i.e., Average Profitability of Churned vs Retained customers
     # Or maybe "Total Profit" lost due to Churn.
@@ -31,8 +35,16 @@ def plot_profitability():
     print("Saved profitability_impact.png")
     
     # Also, let's do a distribution plot to see if High Profit customers churn more?
+    # Binned FFT KDE per group (each normalized on its own, like common_norm=False):
+    # cost is one pass over the rows, not a kernel evaluation per row and grid point
     plt.figure(figsize=(10, 6))
-    sns.kdeplot(data=df, x='Rentabilite_Nette_Simulee', hue='Churn', fill=True, common_norm=False, palette=['#4CAF50', '#F44336'])
+    for label, color in zip(['No', 'Yes'], ['#4CAF50', '#F44336']):
+        grid, density = binned_kde(df.loc[df['Churn'] == label, PROFIT_COLUMN])
+        plt.fill_between(grid, density, color=color, alpha=0.25, linewidth=0)
+        plt.plot(grid, density, color=color, label=label)
+    plt.legend(title='Churn')
+    plt.ylim(bottom=0)
+    plt.ylabel('Density')
     plt.title('Profitability Distribution by Churn Status')
     plt.xlabel('Net Profitability ($)')
     plt.savefig('profitability_distribution.png')
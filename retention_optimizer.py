@@ -0,0 +1,128 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_cache import DATA_PATH, load_dataset
+from encoding import CategoryEncoder
+from score import DEFAULT_CHUNKSIZE, encode_chunk, load_scoring_assets
+
+# Offers from the simulator's Strategic Action Plan.
+# cost: per contacted customer, either fixed or a share of the monthly bill over a number of months.
+# uplift: share of the customer's churn risk the offer is assumed to remove.
+OFFERS = {
+    "discount_15pct": {"label": "15% discount for 6 months", "bill_share": 0.15, "months": 6, "fixed_cost": 0.0,
+                       "uplift": 0.35},
+    "speed_upgrade": {"label": "Free upgrade to higher speed tier", "bill_share": 0.0, "months": 0,
+                      "fixed_cost": 60.0, "uplift": 0.20},
+    "bundle": {"label": "Bundle Device Protection", "bill_share": 0.0, "months": 0, "fixed_cost": 25.0,
+               "uplift": 0.10},
+}
+
+
+def offer_matrices(df, offers=OFFERS):
+    """(n_customers x n_offers) cost and eligibility matrices."""
+    monthly = df["MonthlyCharges"].to_numpy(dtype=np.float64)
+    costs = np.column_stack([o["fixed_cost"] + o["bill_share"] * o["months"] * monthly for o in offers.values()])
+
+    has_internet = (df["InternetService"] != "No").to_numpy()
+    eligible = {
+        "speed_upgrade": has_internet,
+        "bundle": has_internet & (df["DeviceProtection"] == "No").to_numpy(),
+    }
+    allowed = np.column_stack([eligible.get(name, np.ones(len(df), dtype=bool)) for name in offers])
+    return costs, allowed
+
+
+def optimize_campaign(df, probs, budget, offers=OFFERS):
+    """Pick at most one offer per customer to maximize expected retained profit within ``budget``.
+
+    Expected gain of an offer = churn probability x uplift x value at stake - offer cost,
+    where the value at stake is the customer's net profitability (floored at 0) plus the
+    acquisition cost we would pay to replace them. Each customer keeps their best offer,
+    customers are ranked by return per dollar, and the ranking is cut where the
+    cumulative cost exceeds the budget (greedy knapsack). Everything is vectorized.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    value = (np.maximum(df["Rentabilite_Nette_Simulee"].to_numpy(dtype=np.float64), 0)
+             + df["Cout_Acquisition_Client"].to_numpy(dtype=np.float64))
+    uplift = np.array([o["uplift"] for o in offers.values()])
+    costs, allowed = offer_matrices(df, offers)
+
+    gains = probs[:, None] * uplift[None, :] * value[:, None] - costs
+    gains = np.where(allowed, gains, -np.inf)
+
+    best = gains.argmax(axis=1)
+    rows = np.arange(len(df))
+    best_gain = gains[rows, best]
+    best_cost = costs[rows, best]
+
+    candidates = np.flatnonzero(best_gain > 0)
+    roi = best_gain[candidates] / np.maximum(best_cost[candidates], 1e-9)
+    order = candidates[np.argsort(-roi, kind="stable")]
+    cumulative = np.cumsum(best_cost[order])
+    chosen = order[cumulative <= budget]
+
+    names = np.array(list(offers))
+    return pd.DataFrame({
+        "rank": np.arange(1, len(chosen) + 1),
+        "customerID": df["customerID"].to_numpy()[chosen],
+        "offer": names[best[chosen]],
+        "churn_probability": probs[chosen],
+        "value_at_stake": value[chosen],
+        "offer_cost": best_cost[chosen],
+        "expected_gain": best_gain[chosen],
+        "roi": best_gain[chosen] / np.maximum(best_cost[chosen], 1e-9),
+        "cumulative_cost": cumulative[:len(chosen)],
+    })
+
+
+def score_base(df, chunksize=DEFAULT_CHUNKSIZE):
+    # Churn probability for every customer, scored chunk by chunk with the saved forest
+    model, encoders = load_scoring_assets()
+    encoder = CategoryEncoder(encoders, unknown="nan")
+    features = list(model.feature_names_in_)
+    return np.concatenate([
+        model.predict_proba(encode_chunk(df.iloc[i:i + chunksize], encoder, features))[:, 1]
+        for i in range(0, len(df), chunksize)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Budgeted retention campaign optimizer")
+    parser.add_argument("--data", default=DATA_PATH, help="Customer base CSV")
+    parser.add_argument("--scores", help="Output of score.py (customerID, churn_probability); scored here if omitted")
+    parser.add_argument("--budget", type=float, required=True, help="Campaign budget in $")
+    parser.add_argument("-o", "--output", default="retention_contact_list.csv")
+    args = parser.parse_args()
+
+    df = load_dataset(args.data)
+    start = time.perf_counter()
+    if args.scores:
+        scores = pd.read_csv(args.scores) if not args.scores.endswith(".parquet") else pd.read_parquet(args.scores)
+        # A customer scored twice (concatenated score files) would otherwise be targeted twice
+        n_dupes = int(scores["customerID"].duplicated().sum())
+        if n_dupes:
+            print(f"Warning: {n_dupes} duplicate customerIDs in {args.scores}; keeping the last score of each")
+            scores = scores.drop_duplicates("customerID", keep="last")
+        probs = df[["customerID"]].merge(scores, on="customerID", how="left")["churn_probability"]
+        if probs.isna().any():
+            print(f"Warning: {int(probs.isna().sum())} customers have no score and are skipped")
+        probs = probs.fillna(0).to_numpy()
+    else:
+        print("Scoring customer base...")
+        probs = score_base(df)
+
+    plan = optimize_campaign(df, probs, args.budget)
+    elapsed = time.perf_counter() - start
+    plan.to_csv(args.output, index=False)
+
+    print(f"Contacting {len(plan):,} of {len(df):,} customers for ${plan['offer_cost'].sum():,.0f} "
+          f"(budget ${args.budget:,.0f}); expected retained profit ${plan['expected_gain'].sum():,.0f}")
+    print(plan["offer"].value_counts().to_string())
+    print(f"Done in {elapsed:.2f}s. Ranked contact list saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from data_cache import read_chunks
+from drift_monitor import REFERENCE_PATH, REPORT_PATH, DriftMonitor, load_reference, print_summary, write_report
+from encoding import UNKNOWN_POLICIES, CategoryEncoder
+import instrumentation
+from instrumentation import count, iter_spans, span
+from model_registry import ModelBundle, load_current
+from tree_explainer import PathExplainer, TreeExplainer, is_forest, top_drivers
+
+MODEL_PATH = "rf_model.pkl"
+ENCODERS_PATH = "encoders.pkl"
+DEFAULT_CHUNKSIZE = 100_000
+
+# Risk tiers used by the Strategic Action Plan in the dashboard
+HIGH_RISK_THRESHOLD = 0.7
+WATCHLIST_THRESHOLD = 0.4
+
+
+def risk_tiers(probs):
+    probs = np.asarray(probs)
+    return np.select([probs > HIGH_RISK_THRESHOLD, probs > WATCHLIST_THRESHOLD], ["high", "watchlist"], "safe")
+
+
+def load_scoring_bundle(model_path=None, encoders_path=None, kind="forest"):
+    # Explicit files win; otherwise the registry's current version (or the plain files if nothing is published).
+    # The sklearn forest is the fastest on large chunks, the compact one on single rows.
+    if model_path is None and encoders_path is None:
+        return load_current(kind=kind)
+    model = joblib.load(model_path or MODEL_PATH)
+    encoders = joblib.load(encoders_path or ENCODERS_PATH)
+    return ModelBundle(f"file:{model_path or MODEL_PATH}", model, encoders, {})
+
+
+def load_scoring_assets(model_path=None, encoders_path=None, kind="forest"):
+    # Loaded once per run, every chunk reuses the same forest and encoders
+    bundle = load_scoring_bundle(model_path, encoders_path, kind)
+    return bundle.model, bundle.encoders
+
+
+def encode_chunk(chunk, encoder, feature_names):
+    # Keep only the model's features, in training order (missing columns become NaN)
+    X = chunk.reindex(columns=feature_names)
+
+    for col in X.columns:
+        if col in encoder.categories:
+            X[col] = encoder.transform_column(col, X[col])
+        else:
+            # TotalCharges & co. can arrive as text (blank strings) in raw extracts
+            X[col] = pd.to_numeric(X[col], errors="coerce")
+    return X
+
+
+def score_chunks(chunks, model, encoder, id_col="customerID", explainer=None, n_drivers=3, monitor=None):
+    feature_names = list(model.feature_names_in_)
+    for chunk in chunks:
+        if monitor is not None:
+            # Drift counts come from the raw values, before unseen categories are encoded away
+            with span("score.aggregate"):
+                monitor.update(chunk)
+        with span("score.encode"):
+            X = encode_chunk(chunk, encoder, feature_names)
+        with span("score.predict", rows=len(X)):
+            prob = model.predict_proba(X)[:, 1]
+        count("score.rows", len(X))
+        scored = pd.DataFrame({id_col: chunk[id_col].to_numpy(), "churn_probability": prob})
+        if explainer is not None:
+            # Features pushing each customer's risk up the most, with their contribution
+            with span("score.explain", rows=len(X)):
+                names, impacts = top_drivers(explainer.contributions(X), feature_names, n_drivers)
+            for k in range(n_drivers):
+                scored[f"driver_{k + 1}"] = names[:, k]
+                scored[f"driver_{k + 1}_impact"] = impacts[:, k]
+        yield scored
+
+
+class ScoreWriter:
+    """Appends scored chunks to a CSV or Parquet file without holding them in memory."""
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv")
+        self._parquet = None
+        self._first = True
+
+    def write(self, frame):
+        if self.fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def score_file(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, fmt=None, n_jobs=None,
+               model_path=None, encoders_path=None, id_col="customerID", unknown="nan", drivers=0,
+               exact_drivers=False, drift_report=REPORT_PATH, reference_path=None, bundle=None):
+    if bundle is None:
+        with span("score.load", what="model"):
+            bundle = load_scoring_bundle(model_path, encoders_path)
+    model, encoders = bundle.model, bundle.encoders
+    print(f"Scoring with model version {bundle.version}")
+    # Compare against the training data of the model actually used
+    reference_path = reference_path or bundle.artifact("drift_reference") or REFERENCE_PATH
+    encoder = CategoryEncoder(encoders, unknown=unknown)
+    if n_jobs is not None:
+        model.n_jobs = n_jobs
+    explainer = None
+    if drivers:
+        explainer = TreeExplainer(model, n_jobs=n_jobs) if exact_drivers else PathExplainer(model)
+    monitor = None
+    if drift_report:
+        if os.path.exists(reference_path):
+            monitor = DriftMonitor(load_reference(reference_path))
+        else:
+            print(f"No drift reference at {reference_path} (written by train_model.py); skipping drift check")
+
+    # Only parse the columns the model needs (CSV or Parquet, same reader as survival.py / streaming_gbdt)
+    wanted = set(model.feature_names_in_) | {id_col}
+    reader = iter_spans("score.load", read_chunks(input_path, chunksize, columns=wanted))
+
+    writer = ScoreWriter(output_path, fmt)
+    n_rows = 0
+    start = time.perf_counter()
+    try:
+        for scored in score_chunks(reader, model, encoder, id_col=id_col, explainer=explainer, n_drivers=drivers,
+                                   monitor=monitor):
+            with span("score.write"):
+                writer.write(scored)
+            n_rows += len(scored)
+            elapsed = time.perf_counter() - start
+            print(f"Scored {n_rows:,} rows ({n_rows / elapsed:,.0f} rows/s)")
+    finally:
+        writer.close()
+
+    for col, n_unknown in encoder.unknown_counts.items():
+        print(f"Warning: {n_unknown:,} unseen '{col}' values encoded with the {unknown!r} policy")
+
+    elapsed = time.perf_counter() - start
+    rate = n_rows / elapsed if elapsed > 0 else float("inf")
+    print(f"Done. {n_rows:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/s) -> {output_path}")
+
+    if monitor is not None:
+        with span("score.aggregate", what="drift_report"):
+            report = monitor.report()
+        write_report(report, drift_report)
+        print(f"Drift report -> {drift_report}")
+        print_summary(report)
+    return n_rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch churn scoring with the current model version")
+    parser.add_argument("input", help="Customer .csv or .parquet (same columns as Telco_Churn_Enrichi_GCP.csv)")
+    parser.add_argument("-o", "--output", default="churn_scores.csv", help="Output .csv or .parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Override output format")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Threads used by predict_proba")
+    parser.add_argument("--unknown", choices=UNKNOWN_POLICIES, default="nan",
+                        help="How to encode categories never seen in training")
+    parser.add_argument("--drivers", type=int, default=0, metavar="K",
+                        help="Also write each customer's top K risk drivers "
+                             "(decision-path contributions, random forest only)")
+    parser.add_argument("--exact-drivers", action="store_true",
+                        help="Rank drivers by exact TreeSHAP instead. Slow: ~100 rows/s per core on the "
+                             "100-tree forest, plus ~2 s to build the explainer")
+    parser.add_argument("--drift-report", default=REPORT_PATH, help="PSI/KS drift report written alongside the scores")
+    parser.add_argument("--no-drift", action="store_true", help="Skip the inline drift check")
+    parser.add_argument("--model", help=f"Model pickle (default: current registry version, else {MODEL_PATH})")
+    parser.add_argument("--encoders", help=f"Encoders pickle (default: current registry version, else {ENCODERS_PATH})")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    if not os.path.exists(args.input):
+        parser.error(f"{args.input} not found")
+    if args.drivers < 0:
+        parser.error("--drivers must be >= 0")
+
+    with span("score.load", what="model"):
+        bundle = load_scoring_bundle(args.model, args.encoders)
+    if args.drivers and not is_forest(bundle.model):
+        parser.error(f"--drivers needs a random forest; model {bundle.version} is a {type(bundle.model).__name__}")
+
+    score_file(args.input, args.output, chunksize=args.chunksize, fmt=args.format, n_jobs=args.n_jobs,
+               model_path=args.model, encoders_path=args.encoders, unknown=args.unknown, drivers=args.drivers,
+               exact_drivers=args.exact_drivers, drift_report=None if args.no_drift else args.drift_report,
+               bundle=bundle)
+
+
+if __name__ == "__main__":
+    main()
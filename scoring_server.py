@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from encoding import CategoryEncoder
+import instrumentation
+from instrumentation import count, span
+from model_registry import ModelWatcher
+from score import encode_chunk, load_scoring_bundle, risk_tiers
+
+MAX_BODY_BYTES = 10 * 2**20
+
+
+class ScoringError(Exception):
+    pass
+
+
+class LatencyStats:
+    """Rolling window of request latencies and batch sizes for /metrics."""
+
+    def __init__(self, window=10_000):
+        self.latencies_ms = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def record_request(self, latency_ms, ok=True):
+        self.requests += 1
+        self.errors += not ok
+        self.latencies_ms.append(latency_ms)
+
+    def snapshot(self):
+        lat = np.asarray(self.latencies_ms)
+        p50, p90, p99 = np.percentile(lat, [50, 90, 99]) if lat.size else (0.0, 0.0, 0.0)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": {"p50": float(p50), "p90": float(p90), "p99": float(p99),
+                           "max": float(lat.max()) if lat.size else 0.0},
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "batches": len(self.batch_sizes),
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent requests for up to ``max_wait_ms`` and scores them in one predict_proba call."""
+
+    def __init__(self, model, encoders, max_batch_size=256, max_wait_ms=5.0, stats=None):
+        self.swap(model, encoders)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = stats or LatencyStats()
+        self.queue = asyncio.Queue()
+
+    def swap(self, model, encoders):
+        # One tuple, replaced in one assignment: a batch already being scored keeps the model it started with
+        self.assets = (model, CategoryEncoder(encoders, unknown="nan"), list(model.feature_names_in_))
+
+    def _score(self, records):
+        model, encoder, feature_names = self.assets
+        with span("server.encode"):
+            X = encode_chunk(pd.DataFrame.from_records(records), encoder, feature_names)
+        with span("server.predict", rows=len(X)):
+            probs = model.predict_proba(X)[:, 1]
+        count("server.rows", len(X))
+        return probs
+
+    async def submit(self, records):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, size
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch, size = await self._next_batch()
+            self.stats.batch_sizes.append(size)
+            count("server.batches")
+            records = [r for recs, _ in batch for r in recs]
+            try:
+                # predict_proba runs in a worker thread so the loop keeps accepting requests
+                probs = await loop.run_in_executor(None, self._score, records)
+            except Exception:
+                # One bad request must not fail its neighbours: retry each one on its own
+                for recs, future in batch:
+                    if future.done():
+                        continue
+                    try:
+                        probs = await loop.run_in_executor(None, self._score, recs)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(ScoringError(str(e)))
+                        continue
+                    if not future.done():
+                        future.set_result(probs)
+                continue
+
+            start = 0
+            for recs, future in batch:
+                # A request cancelled while queued (client gone, timeout) already has its future done;
+                # setting it again would raise InvalidStateError and stop this loop for good
+                if not future.done():
+                    future.set_result(probs[start:start + len(recs)])
+                start += len(recs)
+
+
+class ScoringServer:
+    def __init__(self, batcher, model_version, id_col="customerID"):
+        self.batcher = batcher
+        # A string, or a callable when a ModelWatcher can swap the model underneath
+        self.model_version = model_version
+        self.id_col = id_col
+        self.started = time.time()
+
+    async def score(self, payload):
+        records = payload.get("customers", payload) if isinstance(payload, dict) else payload
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            raise ScoringError("Expected a customer object, a list of them, or {\"customers\": [...]}")
+
+        probs = await self.batcher.submit(records)
+        tiers = risk_tiers(probs)
+        return {"predictions": [
+            {self.id_col: r.get(self.id_col), "churn_probability": float(p), "risk_tier": str(t)}
+            for r, p, t in zip(records, probs, tiers)
+        ]}
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            version = self.model_version() if callable(self.model_version) else self.model_version
+            return 200, {"status": "ok", "model": version, "uptime_s": round(time.time() - self.started, 1),
+                         "queue_depth": self.batcher.queue.qsize()}
+        if method == "GET" and path == "/metrics":
+            return 200, self.batcher.stats.snapshot()
+        if method == "POST" and path == "/score":
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                return 400, {"error": "Body is not valid JSON"}
+            try:
+                return 200, await self.score(payload)
+            except ScoringError as e:
+                return 422, {"error": str(e)}
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: enough for a CRM client or curl on localhost
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, result = 413, {"error": "Request body too large"}
+                    body = b""
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, result = await self.route(method, target.split("?", 1)[0], body)
+
+                if target.startswith("/score"):
+                    self.batcher.stats.record_request((time.perf_counter() - start) * 1000, ok=status == 200)
+
+                payload = json.dumps(result).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, max_batch_size=256, max_wait_ms=5.0,
+                model_path=None, encoders_path=None, reload_interval=2.0):
+    watcher = None
+    if model_path is None and encoders_path is None:
+        # Follow the registry: a newly promoted version is loaded in the background and swapped in
+        watcher = ModelWatcher(kind="compact", interval=reload_interval)
+        bundle = watcher.bundle
+    else:
+        bundle = load_scoring_bundle(model_path, encoders_path, kind="compact")
+    batcher = MicroBatcher(bundle.model, bundle.encoders, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    if watcher is not None:
+        watcher.on_reload = lambda new: batcher.swap(new.model, new.encoders)
+        watcher.start()
+    app = ScoringServer(batcher, (lambda: watcher.bundle.version) if watcher else bundle.version)
+
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(app.handle, host, port)
+    print(f"Scoring server on http://{host}:{port} with model {bundle.version} "
+          f"(max batch {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+        if watcher is not None:
+            watcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP churn scoring service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=256, help="Customers per predict_proba call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long to gather requests into a batch")
+    parser.add_argument("--model", help="Serve this model pickle instead of following the registry")
+    parser.add_argument("--encoders", help="Encoders pickle to use with --model")
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between registry checks")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    # A long-running service: write the files every 10 s, not only at exit
+    instrumentation.enable_from_args(args, flush_interval=10)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms, args.model, args.encoders,
+                          args.reload_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+"""Out-of-core gradient-boosted trees trained from histogram statistics streamed off disk.
+
+``StreamingGBDT.fit_file`` never holds the dataset in memory:
+
+1. a first pass over the CSV/Parquet chunks collects the categories and a bottom-k sample of
+   every numeric column, which gives per-feature quantile bin edges;
+2. a second pass bins every row to one byte per feature and appends it, with its label,
+   holdout flag and running score, to row files in a scratch directory;
+3. each boosting level is one pass over those files in fixed-size blocks, accumulating
+   gradient/hessian/count histograms for the nodes being split (the larger sibling comes
+   from parent - smaller child). The pass that adds a finished tree to the scores also
+   builds the next tree's root histogram and the held-out log loss and AUC.
+
+Memory is one chunk plus one block plus the histograms, whatever the number of rows.
+The fitted model looks like a sklearn classifier to the scorers (``feature_names_in_``,
+``predict_proba`` on encoded features, ``feature_importances_``).
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_cache import coerce_numeric, read_chunks
+from encoding import CategoryEncoder, fit_encoders
+from instrumentation import span
+from score import encode_chunk
+from streaming_stats import QuantileSketch, StreamingAUC
+
+DEFAULT_CHUNKSIZE = 100_000
+# Rows per step of a histogram pass; bounds the temporaries of one pass
+BLOCK_ROWS = 65_536
+# One byte per feature and row: up to 255 value bins (quantile bins or category codes), the last is missing
+N_BINS = 256
+MISSING_BIN = 255
+# Values sampled per numeric column to place its bin edges
+SKETCH_SIZE = 100_000
+# Raw rows sampled uniformly from the stream for the drift reference
+SAMPLE_ROWS = 50_000
+HOLDOUT_BUCKETS = 1000
+# Rows per predict_proba step (the [rows, trees] node matrix stays small)
+PREDICT_BATCH_ROWS = 10_000
+
+
+def churn_labels(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy() != 0
+    return series.astype(str).str.strip().str.lower().isin(["yes", "true", "1"]).to_numpy()
+
+
+def holdout_mask(chunk, id_col, fraction):
+    # Hash of the customer ID: the same rows are held out however the file is chunked or re-read
+    keys = chunk[id_col] if id_col in chunk.columns else chunk
+    buckets = pd.util.hash_pandas_object(keys, index=False).to_numpy() % HOLDOUT_BUCKETS
+    return buckets < fraction * HOLDOUT_BUCKETS
+
+
+class FileScan:
+    """What the first pass learns about a file: schema, encoders, bin sketches and a row sample."""
+
+    def __init__(self, path, features, categorical, encoders, sketches, n_rows, positives, sample):
+        self.path = path
+        self.features = features
+        self.categorical = categorical
+        self.encoders = encoders
+        self.sketches = sketches
+        self.n_rows = n_rows
+        self.positives = positives
+        self.sample = sample
+
+
+def scan_file(path, target="Churn", id_col="customerID", chunksize=DEFAULT_CHUNKSIZE, seed=42):
+    """First pass: column kinds, category sets, value sketches, row and churn counts, a row sample."""
+    rng = np.random.default_rng(seed)
+    features = categorical = None
+    categories, sketches = {}, {}
+    n_rows = positives = 0
+    sample, priorities = None, np.empty(0)
+    for chunk in read_chunks(path, chunksize):
+        if features is None:
+            # Column kinds come from the first chunk, as the dataset cache decides them
+            features = [c for c in chunk.columns if c not in (target, id_col)]
+            categorical = [c for c in features if not pd.api.types.is_numeric_dtype(chunk[c])
+                           and coerce_numeric(chunk[c]) is None]
+            categories = {c: set() for c in categorical}
+            sketches = {c: QuantileSketch(SKETCH_SIZE, seed=seed) for c in features if c not in categories}
+        for col in categorical:
+            categories[col].update(chunk[col].dropna().unique())
+        for col, sketch in sketches.items():
+            sketch.update(pd.to_numeric(chunk[col], errors="coerce"))
+        n_rows += len(chunk)
+        positives += int(churn_labels(chunk[target]).sum())
+
+        # Bottom-k over random priorities: a uniform sample of the whole file
+        chunk_priorities = rng.random(len(chunk))
+        sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+        priorities = np.concatenate([priorities, chunk_priorities])
+        if len(sample) > SAMPLE_ROWS:
+            keep = np.sort(np.argpartition(priorities, SAMPLE_ROWS)[:SAMPLE_ROWS])
+            sample, priorities = sample.iloc[keep].reset_index(drop=True), priorities[keep]
+    if not n_rows:
+        raise ValueError(f"{path} has no rows")
+
+    encoders = fit_encoders({col: pd.Series(list(values)) for col, values in categories.items()}, categorical)
+    too_many = [col for col, le in encoders.items() if len(le.classes_) > MISSING_BIN]
+    if too_many:
+        raise ValueError(f"More than {MISSING_BIN} categories in {too_many}; one-byte bins can't hold them")
+    if not pd.api.types.is_numeric_dtype(sample[target]):
+        # Same encoders.pkl layout as the in-memory training (the target has its encoder too)
+        encoders[target] = fit_encoders({target: sample[target]}, [target])[target]
+    return FileScan(path, features, categorical, encoders, sketches, n_rows, positives, sample)
+
+
+def bin_edges(sketch, max_bins):
+    # One bin per distinct value when there are few (tenure, flags), else quantile bins
+    distinct = np.unique(sketch.values)
+    if len(distinct) <= max_bins:
+        return (distinct[:-1] + distinct[1:]) / 2
+    return np.unique(sketch.quantile(np.linspace(0, 1, max_bins + 1)[1:-1]))
+
+
+class _RowFiles:
+    """Fixed-width per-row arrays on disk, read and written a block of rows at a time.
+
+    Plain file I/O rather than memory maps: only the current block is ever resident,
+    the OS page cache does the rest.
+    """
+
+    def __init__(self, work_dir, n_features):
+        self.n_rows = 0
+        self.layout = {"bins": (np.uint8, n_features), "label": (np.uint8, 1),
+                       "holdout": (np.uint8, 1), "score": (np.float64, 1)}
+        self.files = {name: open(os.path.join(work_dir, name), "w+b") for name in self.layout}
+
+    def _row_bytes(self, name):
+        dtype, width = self.layout[name]
+        return np.dtype(dtype).itemsize * width
+
+    def append(self, **columns):
+        for name, values in columns.items():
+            f = self.files[name]
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(values, dtype=self.layout[name][0]).tobytes())
+        self.n_rows += len(columns["label"])
+
+    def read(self, name, start, stop):
+        dtype, width = self.layout[name]
+        out = np.empty((stop - start, width) if width > 1 else stop - start, dtype=dtype)
+        f = self.files[name]
+        f.seek(start * self._row_bytes(name))
+        f.readinto(out)
+        return out
+
+    def write(self, name, start, values):
+        f = self.files[name]
+        f.seek(start * self._row_bytes(name))
+        f.write(np.ascontiguousarray(values, dtype=self.layout[name][0]).tobytes())
+
+    def blocks(self, block_rows=BLOCK_ROWS):
+        for start in range(0, self.n_rows, block_rows):
+            yield start, min(start + block_rows, self.n_rows)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def _gradients(score, y):
+    # Logistic loss: gradient p - y, hessian p(1 - p)
+    p = 1.0 / (1.0 + np.exp(-score))
+    return p - y, np.maximum(p * (1.0 - p), 1e-16)
+
+
+def _route(bins, feature, goes_left, left, right, steps):
+    # Nodes reached after ``steps`` levels; leaves point at themselves so rows settle in them
+    node = np.zeros(len(bins), dtype=np.int32)
+    rows = np.arange(len(bins))
+    for _ in range(steps):
+        go = goes_left[node, bins[rows, feature[node]]]
+        node = np.where(go, left[node], right[node])
+    return node
+
+
+class _Tree:
+    """Nodes of one tree as growing lists; splits are a 256-entry bin -> left lookup table."""
+
+    def __init__(self):
+        self.feature, self.goes_left, self.left, self.right, self.value = [], [], [], [], []
+        self.add_node()
+
+    def add_node(self):
+        node = len(self.feature)
+        self.feature.append(0)
+        self.goes_left.append(np.zeros(N_BINS, dtype=bool))
+        self.left.append(node)
+        self.right.append(node)
+        self.value.append(0.0)
+        return node
+
+    def arrays(self):
+        return (np.asarray(self.feature, dtype=np.int32), np.asarray(self.goes_left),
+                np.asarray(self.left, dtype=np.int32), np.asarray(self.right, dtype=np.int32),
+                np.asarray(self.value))
+
+
+class StreamingGBDT:
+    """Gradient-boosted trees (logistic loss) fitted out of core from binned histograms."""
+
+    def __init__(self, n_trees=300, learning_rate=0.1, max_depth=5, max_bins=255, min_samples_leaf=20,
+                 l2=1.0, holdout=0.2, patience=20, block_rows=BLOCK_ROWS, verbose=True):
+        self.n_trees = n_trees
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.max_bins = max_bins
+        self.min_samples_leaf = min_samples_leaf
+        self.l2 = l2
+        self.holdout = holdout
+        self.patience = patience
+        self.block_rows = block_rows
+        self.verbose = verbose
+
+    def get_params(self):
+        return {name: getattr(self, name) for name in ("n_trees", "learning_rate", "max_depth", "max_bins",
+                                                      "min_samples_leaf", "l2", "holdout", "patience")}
+
+    # --- binning ---
+    def _bin(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        bins = np.empty(X.shape, dtype=np.uint8)
+        for j, edges in enumerate(self.bin_edges_):
+            col = X[:, j]
+            missing = np.isnan(col)
+            if edges is None:
+                # Categorical: the bin is the encoder's code
+                codes = np.where(missing, MISSING_BIN, col)
+                bins[:, j] = np.where((codes < 0) | (codes > MISSING_BIN), MISSING_BIN, codes)
+            else:
+                bins[:, j] = np.where(missing, MISSING_BIN, np.searchsorted(edges, col, side="right"))
+        return bins
+
+    # --- fitting ---
+    def fit_file(self, path, target="Churn", id_col="customerID", chunksize=DEFAULT_CHUNKSIZE, scan=None,
+                 work_dir=".cache"):
+        """Fit on the CSV or Parquet file at ``path`` with bounded memory; returns self.
+
+        ``scan`` reuses a ``scan_file`` result (e.g. when the caller also needs its row sample).
+        The held-out rows (``holdout`` of the customers, by ID hash) drive early stopping and
+        ``holdout_metrics_``.
+        """
+        if scan is None:
+            with span("train.preprocess", what="scan"):
+                scan = scan_file(path, target, id_col, chunksize)
+        self.feature_names_in_ = np.asarray(scan.features, dtype=object)
+        self.n_features_in_ = len(scan.features)
+        self.classes_ = np.array([0, 1])
+        self.encoders_ = scan.encoders
+        self.bin_edges_ = [None if col in scan.encoders else bin_edges(scan.sketches[col], self.max_bins)
+                           for col in scan.features]
+        rate = min(max(scan.positives / scan.n_rows, 1e-6), 1 - 1e-6)
+        self.base_score_ = float(np.log(rate / (1 - rate)))
+
+        os.makedirs(work_dir, exist_ok=True)
+        scratch = tempfile.mkdtemp(dir=work_dir, prefix="streaming-gbdt-")
+        store = _RowFiles(scratch, self.n_features_in_)
+        try:
+            self._write_bins(store, path, target, id_col, chunksize)
+            self._boost(store)
+        finally:
+            store.close()
+            shutil.rmtree(scratch, ignore_errors=True)
+        return self
+
+    def _write_bins(self, store, path, target, id_col, chunksize):
+        encoder = CategoryEncoder(self.encoders_, unknown="nan")
+        features = list(self.feature_names_in_)
+        with span("train.encode", what="bins"):
+            for chunk in read_chunks(path, chunksize):
+                X = encode_chunk(chunk, encoder, features).to_numpy(dtype=np.float64)
+                store.append(bins=self._bin(X), label=churn_labels(chunk[target]),
+                             holdout=holdout_mask(chunk, id_col, self.holdout),
+                             score=np.full(len(chunk), self.base_score_))
+        if self.verbose:
+            print(f"Binned {store.n_rows:,} rows x {self.n_features_in_} features")
+
+    def _boost(self, store):
+        trees, gains, history = [], [], []
+        best, best_loss, since_best = 0, np.inf, 0
+        with span("train.fit", backend="streaming_gbdt", rows=store.n_rows):
+            root, holdout = self._apply(store, None)
+            self.train_rows_, self.holdout_rows_ = int(root[0, 0, :, 2].sum()), holdout.count
+            for i in range(self.n_trees):
+                tree, tree_gains = self._grow(store, root)
+                trees.append(tree)
+                gains.append(tree_gains)
+                root, holdout = self._apply(store, tree)
+                history.append({"tree": i + 1, "log_loss": holdout.log_loss, "roc_auc": holdout.auc()})
+                if self.verbose and (i + 1) % 10 == 0:
+                    print(f"[{i + 1} trees] holdout log loss {holdout.log_loss:.4f}, ROC AUC {holdout.auc():.4f}")
+                if not holdout.count:
+                    best = i + 1
+                    continue
+                if holdout.log_loss < best_loss - 1e-7:
+                    best, best_loss, since_best = i + 1, holdout.log_loss, 0
+                else:
+                    since_best += 1
+                    if since_best >= self.patience:
+                        break
+        self.n_iter_ = best
+        self.history_ = history
+        self.holdout_metrics_ = dict(history[best - 1], rows=self.holdout_rows_) if best else {}
+        self._set_trees(trees[:best])
+        # Split gains of the trees kept, normalized like sklearn's impurity importances
+        importances = np.sum(gains[:best], axis=0) if best else np.zeros(self.n_features_in_)
+        total = importances.sum()
+        self.feature_importances_ = importances / total if total > 0 else importances
+        if self.verbose:
+            print(f"Kept {best} trees (early stopping patience {self.patience})")
+
+    def _accumulate(self, hist, bins, slot, g, h):
+        # One bincount per statistic over (slot, feature, bin) cells
+        width = self.n_features_in_ * N_BINS
+        idx = (slot[:, None] * width + np.arange(self.n_features_in_) * N_BINS + bins).ravel()
+        size = hist.shape[0]
+        hist[:, 0] += np.bincount(idx, np.repeat(g, self.n_features_in_), minlength=size)
+        hist[:, 1] += np.bincount(idx, np.repeat(h, self.n_features_in_), minlength=size)
+        hist[:, 2] += np.bincount(idx, minlength=size)
+
+    def _histograms(self, store, tree, slots, n_slots, steps):
+        # Histograms of the training rows that ``tree`` (grown ``steps`` levels) routes to a node with a slot
+        hist = np.zeros((n_slots * self.n_features_in_ * N_BINS, 3))
+        arrays = tree.arrays()[:4]
+        for start, stop in store.blocks(self.block_rows):
+            bins = store.read("bins", start, stop)
+            slot = slots[_route(bins, *arrays, steps)]
+            keep = (slot >= 0) & (store.read("holdout", start, stop) == 0)
+            g, h = _gradients(store.read("score", start, stop)[keep], store.read("label", start, stop)[keep])
+            self._accumulate(hist, bins[keep], slot[keep], g, h)
+        return hist.reshape(n_slots, self.n_features_in_, N_BINS, 3)
+
+    def _apply(self, store, tree):
+        """Add ``tree`` to the scores; return the next root histogram and the holdout metrics."""
+        hist = np.zeros((self.n_features_in_ * N_BINS, 3))
+        holdout = StreamingAUC()
+        if tree is not None:
+            feature, goes_left, left, right, value = tree.arrays()
+        for start, stop in store.blocks(self.block_rows):
+            bins = store.read("bins", start, stop)
+            score = store.read("score", start, stop)
+            if tree is not None:
+                score += value[_route(bins, feature, goes_left, left, right, self.max_depth)]
+                store.write("score", start, score)
+            y = store.read("label", start, stop)
+            held = store.read("holdout", start, stop) == 1
+            train = ~held
+            g, h = _gradients(score[train], y[train])
+            self._accumulate(hist, bins[train], np.zeros(train.sum(), dtype=np.int64), g, h)
+            holdout.update(y[held], 1.0 / (1.0 + np.exp(-score[held])))
+        return hist.reshape(1, self.n_features_in_, N_BINS, 3), holdout
+
+    def _leaf_value(self, g, h):
+        return -self.learning_rate * g / (h + self.l2)
+
+    def _grow(self, store, root):
+        """One tree, level by level from histograms; one pass over the rows per level."""
+        tree = _Tree()
+        gains = np.zeros(self.n_features_in_)
+        frontier = [(0, root[0])]
+        for depth in range(self.max_depth):
+            splits = self._best_splits(np.stack([hist for _, hist in frontier]))
+            children = []
+            for (node, hist), split in zip(frontier, splits):
+                g, h, _ = hist[0].sum(axis=0)
+                tree.value[node] = self._leaf_value(g, h)
+                if split is None:
+                    continue
+                gain, f, goes_left, left_stats = split
+                gains[f] += gain
+                left, right = tree.add_node(), tree.add_node()
+                tree.feature[node], tree.goes_left[node] = f, goes_left
+                tree.left[node], tree.right[node] = left, right
+                children.append((left, right, left_stats, hist))
+            if not children:
+                break
+            if depth == self.max_depth - 1:
+                # Last level: the children are leaves and their sums come with the split
+                for left, right, (g, h, _), hist in children:
+                    g_total, h_total, _ = hist[0].sum(axis=0)
+                    tree.value[left] = self._leaf_value(g, h)
+                    tree.value[right] = self._leaf_value(g_total - g, h_total - h)
+                break
+            # Histogram of the smaller child of each split from the data, its sibling by subtraction
+            smaller = [left if stats[2] <= hist[0, :, 2].sum() - stats[2] else right
+                       for left, right, stats, hist in children]
+            slots = np.full(len(tree.feature), -1, dtype=np.int64)
+            slots[smaller] = np.arange(len(smaller))
+            small_hists = self._histograms(store, tree, slots, len(smaller), depth + 1)
+            frontier = []
+            for (left, right, _, hist), small, small_hist in zip(children, smaller, small_hists):
+                other = hist - small_hist
+                frontier += [(left, small_hist), (right, other)] if small == left else \
+                    [(left, other), (right, small_hist)]
+        return tree, gains
+
+    def _best_splits(self, hists):
+        """Best split of every node from its (feature, bin, [g, h, count]) histogram, or None.
+
+        Numeric features split bins ``<= t`` left, with missing values sent to whichever side
+        gains more; categorical features sort their categories by g/h and split that order.
+        """
+        lam, min_leaf = self.l2, self.min_samples_leaf
+        categorical = np.array([edges is None for edges in self.bin_edges_])
+        total = hists[:, 0].sum(axis=1)
+        order = np.broadcast_to(np.arange(N_BINS), hists.shape[:3]).copy()
+        if categorical.any():
+            cat = hists[:, categorical]
+            ratio = cat[..., 0] / (cat[..., 1] + lam)
+            # Empty categories last: unseen ones go right
+            ratio[cat[..., 2] == 0] = np.inf
+            order[:, categorical] = np.argsort(ratio, axis=-1, kind="stable")
+        prefix = np.cumsum(np.take_along_axis(hists, order[..., None], axis=2), axis=2)[:, :, :MISSING_BIN]
+        lefts = np.stack([prefix, prefix + hists[:, :, MISSING_BIN, None, :]])
+        rights = total[None, :, None, None, :] - lefts
+
+        def score(s):
+            return s[..., 0] ** 2 / (s[..., 1] + lam)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            gain = score(lefts) + score(rights) - score(total)[None, :, None, None]
+        valid = (lefts[..., 2] >= min_leaf) & (rights[..., 2] >= min_leaf)
+        # Categorical orders already place the missing bin
+        valid[1][:, categorical] = False
+        gain = np.where(valid, gain, -np.inf)
+
+        splits = []
+        for i in range(len(hists)):
+            option, f, t = np.unravel_index(np.argmax(gain[:, i]), gain[:, i].shape)
+            best = gain[option, i, f, t]
+            if not best > 1e-12:
+                splits.append(None)
+                continue
+            goes_left = np.zeros(N_BINS, dtype=bool)
+            goes_left[order[i, f, :t + 1]] = True
+            if not categorical[f]:
+                goes_left[MISSING_BIN] = bool(option)
+            splits.append((float(best), int(f), goes_left, lefts[option, i, f, t]))
+        return splits
+
+    def _set_trees(self, trees):
+        # All trees concatenated into flat arrays, child indices made global (as CompactForest does)
+        feature, goes_left, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            f, g, l, r, v = tree.arrays()
+            roots.append(offset)
+            feature.append(f)
+            goes_left.append(g)
+            left.append(l + offset)
+            right.append(r + offset)
+            value.append(v)
+            offset += len(f)
+        empty = np.empty(0, dtype=np.int32)
+        self.feature_ = np.concatenate(feature) if trees else empty
+        self.goes_left_ = np.concatenate(goes_left) if trees else np.empty((0, N_BINS), dtype=bool)
+        self.left_ = np.concatenate(left) if trees else empty
+        self.right_ = np.concatenate(right) if trees else empty
+        self.value_ = np.concatenate(value) if trees else np.empty(0)
+        self.roots_ = np.asarray(roots, dtype=np.int32)
+
+    # --- inference ---
+    def decision_function(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names_in_)]
+        bins = self._bin(X)
+        raw = np.full(len(bins), self.base_score_)
+        if not len(self.roots_):
+            return raw
+        for start in range(0, len(bins), PREDICT_BATCH_ROWS):
+            block = bins[start:start + PREDICT_BATCH_ROWS]
+            rows = np.arange(len(block))[:, None]
+            nodes = np.broadcast_to(self.roots_, (len(block), len(self.roots_)))
+            for _ in range(self.max_depth):
+                go = self.goes_left_[nodes, block[rows, self.feature_[nodes]]]
+                nodes = np.where(go, self.left_[nodes], self.right_[nodes])
+            raw[start:start + len(block)] += self.value_[nodes].sum(axis=1)
+        return raw
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return (self.decision_function(X) > 0).astype(np.int64)
@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+
+# Mergeable accumulators: each one is updated chunk by chunk and two partial
+# states (e.g. from different worker processes) combine with ``merge``.
+
+
+class Moments:
+    """Count, mean, variance, min and max per column (Chan et al. parallel update)."""
+
+    def __init__(self, n_cols):
+        self.count = np.zeros(n_cols)
+        self.mean = np.zeros(n_cols)
+        self.m2 = np.zeros(n_cols)
+        self.min = np.full(n_cols, np.inf)
+        self.max = np.full(n_cols, -np.inf)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0.0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+        other = Moments(len(count))
+        other.count, other.mean, other.m2 = count, mean, m2
+        if values.shape[0]:
+            other.min = np.where(count > 0, np.nanmin(np.where(valid, values, np.inf), axis=0), np.inf)
+            other.max = np.where(count > 0, np.nanmax(np.where(valid, values, -np.inf), axis=0), -np.inf)
+        self.merge(other)
+
+    def merge(self, other):
+        n = self.count + other.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = other.mean - self.mean
+            self.mean = np.where(n > 0, self.mean + delta * other.count / n, 0.0)
+            self.m2 = self.m2 + other.m2 + np.where(n > 0, delta ** 2 * self.count * other.count / n, 0.0)
+        self.count = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+    @property
+    def std(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(np.where(self.count > 1, self.m2 / (self.count - 1), np.nan))
+
+
+class RunningCovariance:
+    """Co-moment matrix over rows with no missing value; gives the correlation matrix."""
+
+    def __init__(self, n_cols):
+        self.n = 0
+        self.mean = np.zeros(n_cols)
+        self.comoment = np.zeros((n_cols, n_cols))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values).any(axis=1)]
+        if not len(values):
+            return
+        other = RunningCovariance(values.shape[1])
+        other.n = len(values)
+        other.mean = values.mean(axis=0)
+        centered = values - other.mean
+        other.comoment = centered.T @ centered
+        self.merge(other)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * self.n * other.n / n
+        self.mean = self.mean + delta * other.n / n
+        self.n = n
+
+    def correlation(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            d = np.sqrt(np.diag(self.comoment))
+            corr = self.comoment / np.outer(d, d)
+        # Exact ones on the diagonal (rounding would otherwise leave 0.9999...)
+        np.fill_diagonal(corr, np.where(d > 0, 1.0, np.nan))
+        return corr
+
+
+class QuantileSketch:
+    """Approximate quantiles from a uniform bottom-k sample of the stream.
+
+    Every value gets a random priority and the ``k`` lowest priorities are kept, so
+    the sample stays uniform however the stream is chunked or split across
+    workers. The rank error is roughly ``1/sqrt(k)``. The priorities come from
+    ``seed``, so the same stream gives the same quantiles on every run; sketches
+    that are merged later need different seeds.
+    """
+
+    def __init__(self, k=10_000, seed=0):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.values = np.empty(0)
+        self.priorities = np.empty(0)
+
+    def _keep_lowest(self, values, priorities):
+        if len(values) > self.k:
+            idx = np.argpartition(priorities, self.k)[:self.k]
+            values, priorities = values[idx], priorities[idx]
+        self.values, self.priorities = values, priorities
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self._keep_lowest(np.concatenate([self.values, values]),
+                          np.concatenate([self.priorities, self.rng.random(len(values))]))
+
+    def merge(self, other):
+        self._keep_lowest(np.concatenate([self.values, other.values]),
+                          np.concatenate([self.priorities, other.priorities]))
+
+    def quantile(self, q):
+        if not len(self.values):
+            return np.full(np.shape(q), np.nan)
+        return np.quantile(self.values, q)
+
+
+class DistinctRowHashes:
+    """Exact-up-to-hash-collisions duplicate counting with 64-bit row hashes."""
+
+    def __init__(self):
+        self.rows = 0
+        self._unique = np.empty(0, dtype=np.uint64)
+        self._pending = []
+        self._pending_size = 0
+
+    def update(self, frame):
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        self.rows += len(hashes)
+        self._pending.append(np.unique(hashes))
+        self._pending_size += len(self._pending[-1])
+        # Consolidate only when the pending arrays outgrow the consolidated set (amortized n log n)
+        if self._pending_size > max(len(self._unique), 1 << 16):
+            self._compact()
+
+    def _compact(self):
+        if self._pending:
+            self._unique = np.unique(np.concatenate([self._unique] + self._pending))
+            self._pending, self._pending_size = [], 0
+
+    def merge(self, other):
+        self.rows += other.rows
+        self._pending.extend([other._unique] + other._pending)
+        self._pending_size += len(other._unique) + other._pending_size
+        self._compact()
+
+    @property
+    def duplicates(self):
+        self._compact()
+        return self.rows - len(self._unique)
+
+
+class StreamingAUC:
+    """ROC AUC and log loss of a binary classifier from per-class histograms of its probabilities.
+
+    Probabilities are counted in ``n_bins`` equal-width bins; pairs in the same bin count as
+    ties, so the AUC is exact up to that resolution and memory doesn't grow with the rows.
+    """
+
+    def __init__(self, n_bins=10_000):
+        self.n_bins = n_bins
+        self.positives = np.zeros(n_bins, dtype=np.int64)
+        self.negatives = np.zeros(n_bins, dtype=np.int64)
+        self.log_loss_sum = 0.0
+
+    def update(self, y, p):
+        y = np.asarray(y, dtype=bool)
+        p = np.asarray(p, dtype=np.float64)
+        bins = np.minimum((p * self.n_bins).astype(np.int64), self.n_bins - 1)
+        self.positives += np.bincount(bins[y], minlength=self.n_bins)
+        self.negatives += np.bincount(bins[~y], minlength=self.n_bins)
+        p = np.clip(p, 1e-15, 1 - 1e-15)
+        self.log_loss_sum -= float(np.log(p[y]).sum() + np.log1p(-p[~y]).sum())
+
+    def merge(self, other):
+        self.positives += other.positives
+        self.negatives += other.negatives
+        self.log_loss_sum += other.log_loss_sum
+
+    @property
+    def count(self):
+        return int(self.positives.sum() + self.negatives.sum())
+
+    @property
+    def log_loss(self):
+        return self.log_loss_sum / self.count if self.count else float("nan")
+
+    def auc(self):
+        n_pos, n_neg = self.positives.sum(), self.negatives.sum()
+        if not n_pos or not n_neg:
+            return float("nan")
+        # Each positive beats the negatives in lower bins and ties with half of those in its own
+        negatives_below = np.cumsum(self.negatives) - self.negatives
+        return float((self.positives * (negatives_below + 0.5 * self.negatives)).sum() / (n_pos * n_neg))
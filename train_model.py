@@ -1,94 +1,676 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
-from sklearn.preprocessing import LabelEncoder
 import joblib
+# matplotlib/seaborn, scipy.stats and the search CVs are imported by the plot and --tune code that needs them
+
+from compact_model import COMPACT_MODEL_PATH, CompactForest, export_compact_model, flatten_forest
+from data_cache import DATA_PATH, load_dataset
+from drift_monitor import REFERENCE_PATH, build_reference, fold_batch, load_reference, save_reference
+from model_registry import REGISTRY_DIR, publish
+from encoding import CategoryEncoder, extend_encoders, fit_encoders
+import instrumentation
+from instrumentation import span
+from score import encode_chunk
+from streaming_gbdt import DEFAULT_CHUNKSIZE, StreamingGBDT, scan_file
+
+DEFAULT_RF_PARAMS = {"n_estimators": 100, "random_state": 42}
+DEFAULT_HGB_PARAMS = {"max_iter": 300, "learning_rate": 0.05, "early_stopping": True, "random_state": 42}
+# Model backends (--backend). Whichever is trained is saved as rf_model.pkl, the file every scorer loads
+BACKENDS = ("rf", "hgb")
+COMPARISON_PATH = "model_comparison.md"
+
+# Search spaces for --tune (random search: default_param_distributions())
+PARAM_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 8, 12, 16],
+    "min_samples_leaf": [1, 5, 10],
+    "max_features": ["sqrt", 0.5],
+}
+
+# Encoded training history (one part per full or incremental training) and tree ages
+TRAINING_STORE_DIR = "training_store"
+MANIFEST_PATH = os.path.join(TRAINING_STORE_DIR, "manifest.json")
+# Upper bound on the memory of one fitted tree node (node struct + class values)
+NODE_BYTES = 80
+# Intermediate artifacts handed between training stages
+ENCODED_PATH = os.path.join(".cache", "pipeline", "encoded.pkl")
+TEST_PREDICTIONS_PATH = os.path.join(".cache", "pipeline", "test_predictions.pkl")
+METRICS_PATH = os.path.join(".cache", "pipeline", "metrics.json")
 
-def train_churn_model():
+
+def load_training_data(path=DATA_PATH):
     print("Loading data...")
-    df = pd.read_csv("Telco_Churn_Enrichi_GCP.csv")
+    with span("train.load"):
+        df = load_dataset(path)
     
     # Preprocessing
     print("Preprocessing...")
-    # Drop ID
-    df = df.drop('customerID', axis=1)
-    
-    # Encode Categorical Variables
-    le = LabelEncoder()
-    # Identify categorical columns
-    cat_cols = df.select_dtypes(include=['object']).columns
-    
-    # Keep track of mappings if needed, but for now just encode
-    for col in cat_cols:
-        df[col] = le.fit_transform(df[col])
+    with span("train.preprocess"):
+        # Drop ID
+        df = df.drop('customerID', axis=1)
+
+        # Encode Categorical Variables
+        # Identify categorical columns (text columns come out of the cache as categoricals)
+        cat_cols = df.select_dtypes(include=['category']).columns
+
+        # Keep one encoder per column so the dashboard and score.py can reuse the exact mappings
+        encoders = fit_encoders(df, cat_cols)
+    with span("train.encode"):
+        df = CategoryEncoder(encoders).transform(df)
         
     # Split Data
     X = df.drop('Churn', axis=1)
     y = df['Churn']
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
+    return X, y, encoders
+
+
+def _save_manifest(manifest):
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _append_training_part(manifest, X, y, batch, source):
+    # Each batch of rows is written once as its own part; nothing already stored is rewritten
+    os.makedirs(TRAINING_STORE_DIR, exist_ok=True)
+    name = f"part-{batch:04d}.pkl"
+    part = X.copy()
+    part['Churn'] = y.to_numpy()
+    part.to_pickle(os.path.join(TRAINING_STORE_DIR, name))
+    manifest["parts"].append({"file": name, "rows": len(part), "batch": batch, "source": source})
+
+
+def load_training_store():
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+    parts = [pd.read_pickle(os.path.join(TRAINING_STORE_DIR, p["file"])) for p in manifest["parts"]]
+    return pd.concat(parts, ignore_index=True), manifest
+
+
+def _split(X, y):
+    # Every stage that needs the holdout recomputes the same deterministic split
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
+def make_model(backend="rf", params=None, categorical=None):
+    """Unfitted classifier for ``backend``; ``params`` override that backend's defaults.
+
+    ``categorical`` names the label-encoded columns. The random forest splits on their
+    codes as numbers; the histogram booster treats them as unordered categories
+    (native categorical splits), so the codes' order means nothing to it.
+    """
+    if backend == "rf":
+        return RandomForestClassifier(**{**DEFAULT_RF_PARAMS, **(params or {})})
+    if backend == "hgb":
+        return HistGradientBoostingClassifier(categorical_features=list(categorical or []) or None,
+                                              **{**DEFAULT_HGB_PARAMS, **(params or {})})
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+
+def _categorical_columns(X, encoders):
+    return [col for col in X.columns if col in encoders]
+
+
+# --- TRAINING STAGES (run in order by train_churn_model, or as a cached DAG by pipeline.py) ---
+def prepare_training_data(data_path=DATA_PATH, encoded_path=ENCODED_PATH, encoders_path="encoders.pkl"):
+    X, y, encoders = load_training_data(data_path)
+    os.makedirs(os.path.dirname(encoded_path), exist_ok=True)
+    joblib.dump((X, y), encoded_path)
+
+    # We need to save the encoders to properly transform input in the dashboard.
+    # They must be the ones fitted on the raw strings: re-fitting on the already
+    # encoded columns would store integer classes and every category would map to 0.
+    joblib.dump(encoders, encoders_path)
+
+
+def fit_model(encoded_path=ENCODED_PATH, model_path="rf_model.pkl", rf_params=None, backend="rf",
+              encoders_path="encoders.pkl"):
+    X, y = joblib.load(encoded_path)
+    X_train, _, y_train, _ = _split(X, y)
+
     # Train Model
-    print("Training Random Forest...")
-    rf = RandomForestClassifier(n_estimators=100, random_state=42)
-    rf.fit(X_train, y_train)
-    
+    print("Training Random Forest..." if backend == "rf" else f"Training {backend} model...")
+    model = make_model(backend, rf_params, _categorical_columns(X, joblib.load(encoders_path)))
+    with span("train.fit", backend=backend, rows=len(X_train)):
+        model.fit(X_train, y_train)
+
+    print("Saving model...")
+    joblib.dump(model, model_path)
+
+
+def evaluate_model(encoded_path=ENCODED_PATH, model_path="rf_model.pkl", report_path="model_performance.txt",
+                   predictions_path=TEST_PREDICTIONS_PATH, metrics_path=METRICS_PATH):
+    X, y = joblib.load(encoded_path)
+    _, X_test, _, y_test = _split(X, y)
+    rf = joblib.load(model_path)
+
     # Evaluate
     print("Evaluating...")
-    y_pred = rf.predict(X_test)
-    y_prob = rf.predict_proba(X_test)[:, 1]
-    
+    with span("train.predict", rows=len(X_test)):
+        y_pred = rf.predict(X_test)
+        y_prob = rf.predict_proba(X_test)[:, 1]
+
     print("\nClassification Report:")
-    report = classification_report(y_test, y_pred)
+    with span("train.aggregate"):
+        report = classification_report(y_test, y_pred)
+        auc = roc_auc_score(y_test, y_prob)
     print(report)
-    
+
     # Save Report
-    with open("model_performance.txt", "w") as f:
+    with open(report_path, "w") as f:
         f.write(report)
-        f.write(f"\nROC AUC Score: {roc_auc_score(y_test, y_prob):.4f}")
-    
-    # Save Model and Encoders for Dashboard
-    print("Saving model and encoders...")
-    joblib.dump(rf, "rf_model.pkl")
-    
-    # We need to save the encoders to properly transform input in the dashboard
-    # Retraining the encoders to ensure we capture all mappings cleanly for the dashboard
-    encoders = {}
-    for col in cat_cols:
-        le = LabelEncoder()
-        df[col] = le.fit_transform(df[col]) # Re-fit on full data for consistency in dashboard dropdowns
-        encoders[col] = le
-    joblib.dump(encoders, "encoders.pkl")
+        f.write(f"\nROC AUC Score: {auc:.4f}")
+    joblib.dump((y_test, y_pred), predictions_path)
+    # Recorded with the model version in the registry
+    with open(metrics_path, "w") as f:
+        json.dump({"backend": type(rf).__name__, "roc_auc": round(auc, 4),
+                   "accuracy": round(float((y_pred == y_test).mean()), 4), "test_rows": len(y_test)}, f)
+
+
+def export_compact(encoded_path=ENCODED_PATH, model_path="rf_model.pkl", compact_path=COMPACT_MODEL_PATH):
+    X, y = joblib.load(encoded_path)
+    _, X_test, _, _ = _split(X, y)
+
+    model = joblib.load(model_path)
+    if not isinstance(model, RandomForestClassifier):
+        # Only forests flatten; drop a stale copy so scorers don't serve it next to a different model
+        if os.path.exists(compact_path):
+            os.remove(compact_path)
+        print(f"No compact export for {type(model).__name__}")
+        return
+
+    # Flattened numpy copy of the forest for low-latency scoring (checked against rf on the test split)
+    print("Exporting compact inference model...")
+    _, max_diff = export_compact_model(model, X_test, compact_path)
+    print(f"Parity with rf.predict_proba on {len(X_test)} test rows: max |diff| = {max_diff:.2e}")
+
+
+def write_drift_reference(encoded_path=ENCODED_PATH, encoders_path="encoders.pkl", reference_path=REFERENCE_PATH):
+    # Training distribution sketch that score.py / drift_monitor.py compare new batches against
+    X, _ = joblib.load(encoded_path)
+    save_reference(build_reference(X, joblib.load(encoders_path), DATA_PATH), reference_path)
+
+
+def reset_training_store(encoded_path=ENCODED_PATH, model_path="rf_model.pkl"):
+    X, y = joblib.load(encoded_path)
+    # Tree ages only matter to forests (incremental updates); a booster records none
+    n_trees = len(getattr(joblib.load(model_path), "estimators_", []))
+
+    # Start a fresh training history: all rows and all trees belong to batch 0
+    manifest = {"current_batch": 0, "parts": [], "tree_batches": [0] * n_trees}
+    if os.path.exists(TRAINING_STORE_DIR):
+        for name in os.listdir(TRAINING_STORE_DIR):
+            os.remove(os.path.join(TRAINING_STORE_DIR, name))
+    _append_training_part(manifest, X, y, 0, DATA_PATH)
+    _save_manifest(manifest)
+
+
+def register_model(model_path="rf_model.pkl", compact_path=COMPACT_MODEL_PATH, encoders_path="encoders.pkl",
+                   reference_path=REFERENCE_PATH, metrics_path=METRICS_PATH, registry_dir=REGISTRY_DIR):
+    # Immutable copy of this training run; the dashboard and scorers switch to it when CURRENT moves
+    with open(metrics_path) as f:
+        metrics = json.load(f)
+    publish({"model": model_path, "compact": compact_path, "encoders": encoders_path,
+             "drift_reference": reference_path}, metrics=metrics, source=DATA_PATH, registry_dir=registry_dir)
+
+
+def plot_feature_importance(model_path="rf_model.pkl", plot_path="feature_importance.png", encoded_path=ENCODED_PATH):
+    import matplotlib.pyplot as plt
+    rf = joblib.load(model_path)
 
     # Feature Importance
     print("Generating Feature Importance Plot...")
-    importances = rf.feature_importances_
+    if hasattr(rf, "feature_importances_"):
+        importances = rf.feature_importances_
+    else:
+        # Boosters have no impurity importances: use the AUC lost when a column is shuffled
+        from sklearn.inspection import permutation_importance
+        X, y = joblib.load(encoded_path)
+        _, X_test, _, y_test = _split(X, y)
+        with span("train.aggregate", what="permutation_importance"):
+            importances = permutation_importance(rf, X_test, y_test, scoring="roc_auc", n_repeats=5,
+                                                 random_state=42).importances_mean
     indices = np.argsort(importances)[::-1]
-    
-    plt.figure(figsize=(10, 6))
-    plt.title("Feature Importances (Top 10)")
-    plt.bar(range(10), importances[indices][:10], align="center")
-    plt.xticks(range(10), [X.columns[i] for i in indices[:10]], rotation=45, ha='right')
-    plt.tight_layout()
-    plt.savefig('feature_importance.png')
-    plt.close()
-    
+
+    with span("train.render", plot=plot_path):
+        plt.figure(figsize=(10, 6))
+        plt.title("Feature Importances (Top 10)")
+        plt.bar(range(10), importances[indices][:10], align="center")
+        plt.xticks(range(10), [rf.feature_names_in_[i] for i in indices[:10]], rotation=45, ha='right')
+        plt.tight_layout()
+        plt.savefig(plot_path)
+        plt.close()
+
+
+def plot_confusion_matrix(predictions_path=TEST_PREDICTIONS_PATH, plot_path="confusion_matrix.png"):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    y_test, y_pred = joblib.load(predictions_path)
+
     # Confusion Matrix
     print("Generating Confusion Matrix...")
     cm = confusion_matrix(y_test, y_pred)
-    plt.figure(figsize=(6, 5))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-    plt.title('Confusion Matrix')
-    plt.ylabel('Actual')
-    plt.xlabel('Predicted')
-    plt.savefig('confusion_matrix.png')
-    plt.close()
-    
+    with span("train.render", plot=plot_path):
+        plt.figure(figsize=(6, 5))
+        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
+        plt.title('Confusion Matrix')
+        plt.ylabel('Actual')
+        plt.xlabel('Predicted')
+        plt.savefig(plot_path)
+        plt.close()
+
+
+def train_churn_model(rf_params=None, backend="rf", plots=True):
+    # Every stage, unconditionally; `python pipeline.py` skips the ones whose inputs didn't change
+    prepare_training_data()
+    fit_model(rf_params=rf_params, backend=backend)
+    evaluate_model()
+    export_compact()
+    write_drift_reference()
+    reset_training_store()
+    register_model()
+    if not plots:
+        print("Done. Artifacts saved: model_performance.txt (plots skipped)")
+        return
+    plot_feature_importance()
+    plot_confusion_matrix()
+
     print("Done. Artifacts saved: feature_importance.png, confusion_matrix.png, model_performance.txt")
 
+
+
+# --- BACKEND COMPARISON ---
+def _single_row_latency_ms(predict, rows):
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, [50, 99])
+
+
+def _batch_rows_per_s(predict, X, repeat=3):
+    best = min(_timed(predict, X) for _ in range(repeat))
+    return len(X) / best
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def compare_backends(backends=BACKENDS, params=None, data_path=DATA_PATH, report_path=COMPARISON_PATH,
+                     single_rows=200):
+    """Fit every backend on the usual split and report ROC AUC, size, fit time and scoring latency.
+
+    AUC is the holdout score ``model_performance.txt`` reports. Single-row latency
+    is one ``predict_proba`` per customer on a one-row frame, as the dashboard and
+    the scoring server call it; for the forest the compact numpy copy they actually
+    serve is measured too. ``params`` maps backend to parameter overrides.
+    """
+    X, y, encoders = load_training_data(data_path)
+    X_train, X_test, y_train, y_test = _split(X, y)
+    categorical = _categorical_columns(X, encoders)
+    frames = [X_test.iloc[[i]] for i in range(min(single_rows, len(X_test)))]
+
+    rows = []
+    for backend in backends:
+        model = make_model(backend, (params or {}).get(backend), categorical)
+        print(f"Fitting {backend}...")
+        fit_s = _timed(model.fit, X_train, y_train)
+        auc = roc_auc_score(y_test, model.predict_proba(X_test)[:, 1])
+        candidates = [(backend, model)]
+        if isinstance(model, RandomForestClassifier):
+            candidates.append((f"{backend} (compact)", CompactForest(flatten_forest(model))))
+
+        for name, scorer in candidates:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "model.pkl")
+                joblib.dump(scorer.arrays if isinstance(scorer, CompactForest) else scorer, path)
+                size_mb = os.path.getsize(path) / 2**20
+            p50, p99 = _single_row_latency_ms(scorer.predict_proba, frames)
+            rows.append({
+                "backend": name,
+                "roc_auc": round(auc, 4),
+                "size_mb": round(size_mb, 2),
+                "fit_s": round(fit_s, 2),
+                "single_row_p50_ms": round(p50, 3),
+                "single_row_p99_ms": round(p99, 3),
+                "batch_rows_per_s": round(_batch_rows_per_s(scorer.predict_proba, X_test)),
+            })
+            print(f"  {name}: AUC {auc:.4f}, {size_mb:.1f} MB, single row p50 {p50:.2f} ms")
+
+    board = pd.DataFrame(rows).set_index("backend")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("# Model Backend Comparison\n\n")
+        f.write(f"Trained on {len(X_train)} rows, evaluated on {len(X_test)} holdout rows of {data_path}. "
+                f"Single-row latency over {len(frames)} one-row `predict_proba` calls; "
+                f"batch throughput on the whole holdout.\n\n")
+        f.write("| Backend | ROC AUC | Size (MB) | Fit (s) | Single row p50 (ms) | Single row p99 (ms) | Batch rows/s |\n")
+        f.write("|---|---|---|---|---|---|---|\n")
+        for name, r in board.iterrows():
+            f.write(f"| {name} | {r['roc_auc']:.4f} | {r['size_mb']:.2f} | {r['fit_s']:.2f} | "
+                    f"{r['single_row_p50_ms']:.3f} | {r['single_row_p99_ms']:.3f} | {r['batch_rows_per_s']:,.0f} |\n")
+    print(board.to_string())
+    print(f"Done. Comparison saved to {report_path}")
+    return board
+
+
+# --- INCREMENTAL RETRAINING ---
+def _decode(X, encoders):
+    # Category codes back to labels, the raw form DriftMonitor bins
+    X = X.copy()
+    for col in X.columns.intersection(list(encoders)):
+        X[col] = np.asarray(encoders[col].classes_).astype(str)[X[col].to_numpy().astype(np.int64)]
+    return X
+
+
+def _follow_reference(manifest, live_before, live, batch_rows, encoders):
+    # Fold the new batch into the stored reference and take out the parts whose trees were
+    # all retired, so only those rows are read. If the stored reference doesn't describe the
+    # previous live parts (missing, or written by another training run), rebuild it from them.
+    source = f"{MANIFEST_PATH} (batches {sorted(live)})"
+    parts = {p["batch"]: p for p in manifest["parts"]}
+    expected_rows = sum(parts[b]["rows"] for b in live_before if b in parts)
+    reference = load_reference(REFERENCE_PATH) if os.path.exists(REFERENCE_PATH) else None
+    if reference is None or reference["rows"] != expected_rows:
+        print("Drift reference doesn't match the training store; rebuilding it from the live batches")
+        history = pd.concat([pd.read_pickle(os.path.join(TRAINING_STORE_DIR, parts[b]["file"]))
+                             for b in sorted(live) if b in parts], ignore_index=True)
+        return build_reference(history.drop(columns='Churn'), encoders, source)
+
+    reference = fold_batch(reference, batch_rows, source=source)
+    for b in sorted(live_before - live):
+        if b in parts:
+            retired = pd.read_pickle(os.path.join(TRAINING_STORE_DIR, parts[b]["file"]))
+            reference = fold_batch(reference, _decode(retired.drop(columns='Churn'), encoders), sign=-1, source=source)
+    return reference
+
+
+def update_churn_model(new_data_path, n_new_trees=20, max_tree_age=None):
+    """Grow the saved forest with trees fitted on a new batch of customers only.
+
+    The new rows are appended to the training store, unseen categories are appended
+    to the encoders (existing codes are kept), and with ``max_tree_age`` trees older
+    than that many batches are retired. Cost scales with the new batch, not the history.
+    """
+    rf = joblib.load("rf_model.pkl")
+    if not isinstance(rf, RandomForestClassifier):
+        raise ValueError(f"Incremental updates grow a random forest; the saved model is a {type(rf).__name__}. "
+                         "Retrain with --backend instead.")
+    encoders = joblib.load("encoders.pkl")
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+    batch = manifest["current_batch"] + 1
+    live_before = set(manifest["tree_batches"])
+
+    print(f"Loading new data from {new_data_path}...")
+    with span("train.load"):
+        raw = load_dataset(new_data_path).drop('customerID', axis=1)
+    added = extend_encoders(encoders, raw)
+    for col, values in added.items():
+        print(f"New categories in {col}: {', '.join(map(str, values))}")
+    with span("train.encode"):
+        df = CategoryEncoder(encoders).transform(raw)
+
+    X = df[list(rf.feature_names_in_)]
+    y = df['Churn']
+    if y.nunique() < 2:
+        raise ValueError("The new batch must contain both churned and retained customers")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    # Retire trees that are too old, then add fresh ones fitted on the new rows only
+    tree_batches = np.asarray(manifest["tree_batches"])
+    if max_tree_age is not None:
+        keep = batch - tree_batches <= max_tree_age
+        print(f"Retiring {int((~keep).sum())} trees older than {max_tree_age} batches")
+        rf.estimators_ = [est for est, k in zip(rf.estimators_, keep) if k]
+        tree_batches = tree_batches[keep]
+
+    print(f"Growing forest: {len(rf.estimators_)} existing + {n_new_trees} new trees on {len(X_train)} rows...")
+    rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + n_new_trees)
+    with span("train.fit", backend="rf", rows=len(X_train), incremental=True):
+        rf.fit(X_train, y_train)
+    rf.set_params(warm_start=False)
+
+    with span("train.predict", rows=len(X_test)):
+        auc = roc_auc_score(y_test, rf.predict_proba(X_test)[:, 1])
+    print(f"ROC AUC on the new batch's holdout ({len(X_test)} rows): {auc:.4f}")
+
+    print("Saving model and encoders...")
+    joblib.dump(rf, "rf_model.pkl")
+    export_compact_model(rf, X_test, COMPACT_MODEL_PATH)
+    joblib.dump(encoders, "encoders.pkl")
+
+    manifest["tree_batches"] = tree_batches.tolist() + [batch] * n_new_trees
+    manifest["current_batch"] = batch
+    _append_training_part(manifest, X, y, batch, new_data_path)
+    _save_manifest(manifest)
+
+    # The drift reference follows the rows behind the trees still in the forest
+    live = set(manifest["tree_batches"])
+    with span("train.preprocess", what="drift_reference"):
+        save_reference(_follow_reference(manifest, live_before, live, raw, encoders), REFERENCE_PATH)
+    publish({"model": "rf_model.pkl", "compact": COMPACT_MODEL_PATH, "encoders": "encoders.pkl",
+             "drift_reference": REFERENCE_PATH},
+            metrics={"roc_auc_new_batch": round(auc, 4), "batch": batch}, source=new_data_path)
+    print(f"Done. Batch {batch}: forest has {len(rf.estimators_)} trees, "
+          f"training store has {sum(p['rows'] for p in manifest['parts'])} rows")
+    return rf
+
+
+# --- OUT-OF-CORE TRAINING ---
+def train_out_of_core(data_path, chunksize=DEFAULT_CHUNKSIZE, params=None, model_path="rf_model.pkl",
+                      encoders_path="encoders.pkl", report_path="model_performance.txt",
+                      reference_path=REFERENCE_PATH, metrics_path=METRICS_PATH):
+    """Train a histogram boosted model on a CSV/Parquet file too large to load, a chunk at a time.
+
+    Evaluation uses the held-out customers of the same streaming passes; the drift reference
+    comes from a uniform sample of the file. Saves the usual artifacts and publishes a version.
+    """
+    print(f"Scanning {data_path} in chunks of {chunksize:,} rows...")
+    with span("train.preprocess", what="scan"):
+        scan = scan_file(data_path, chunksize=chunksize)
+    print(f"{scan.n_rows:,} rows, {len(scan.features)} features ({len(scan.categorical)} categorical), "
+          f"churn rate {scan.positives / scan.n_rows:.1%}")
+
+    print("Training streaming histogram gradient boosting...")
+    model = StreamingGBDT(**(params or {})).fit_file(data_path, chunksize=chunksize, scan=scan)
+    holdout = model.holdout_metrics_
+    print(f"Holdout ({holdout['rows']:,} rows): ROC AUC {holdout['roc_auc']:.4f}, log loss {holdout['log_loss']:.4f}")
+
+    print("Saving model...")
+    joblib.dump(model, model_path)
+    joblib.dump(scan.encoders, encoders_path)
+    with open(report_path, "w") as f:
+        f.write(f"Out-of-core histogram gradient boosting: {model.n_iter_} trees, "
+                f"{model.train_rows_:,} training rows of {data_path}\n")
+        f.write(f"Holdout rows: {holdout['rows']:,}\n")
+        f.write(f"Holdout log loss: {holdout['log_loss']:.4f}\n")
+        f.write(f"\nROC AUC Score: {holdout['roc_auc']:.4f}")
+    metrics = {"backend": type(model).__name__, "roc_auc": round(holdout["roc_auc"], 4),
+               "log_loss": round(holdout["log_loss"], 4), "test_rows": holdout["rows"], "train_rows": model.train_rows_}
+    os.makedirs(os.path.dirname(metrics_path), exist_ok=True)
+    with open(metrics_path, "w") as f:
+        json.dump(metrics, f)
+    # A compact forest of the previous model must not be served next to this one
+    if os.path.exists(COMPACT_MODEL_PATH):
+        os.remove(COMPACT_MODEL_PATH)
+
+    encoder = CategoryEncoder(scan.encoders, unknown="nan")
+    sample = encode_chunk(scan.sample, encoder, scan.features)
+    save_reference(build_reference(sample, scan.encoders, f"{data_path} (sample of {len(sample):,} rows)"),
+                   reference_path)
+    publish({"model": model_path, "encoders": encoders_path, "drift_reference": reference_path},
+            metrics=metrics, source=data_path)
+    print(f"Done. Artifacts saved: {model_path}, {encoders_path}, {report_path}")
+    return model
+
+
+# --- HYPERPARAMETER SEARCH ---
+def _worker_memory_bytes(X, candidates):
+    # Rough upper bound for one worker: a few copies of the data plus the largest
+    # full-depth forest it may grow (at most ~2 nodes per training row per tree)
+    max_trees = max(c.get("n_estimators", DEFAULT_RF_PARAMS["n_estimators"]) for c in candidates)
+    data_bytes = X.memory_usage(deep=True).sum()
+    return 3 * data_bytes + max_trees * 2 * len(X) * NODE_BYTES
+
+
+def _effective_n_jobs(n_jobs, memory_budget_mb, per_worker_bytes):
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    if memory_budget_mb:
+        fits = int(memory_budget_mb * 2**20 // per_worker_bytes)
+        n_jobs = max(1, min(n_jobs, fits))
+    return n_jobs
+
+
+def default_param_distributions():
+    # Built on demand so that importing this module doesn't import scipy.stats
+    from scipy.stats import randint, uniform
+    return {
+        "n_estimators": randint(30, 300),
+        "max_depth": [None, 6, 8, 10, 12, 16, 20],
+        "min_samples_leaf": randint(1, 20),
+        "max_features": uniform(0.1, 0.8),
+    }
+
+
+def _candidates_for_budget(search, param_grid, param_distributions):
+    if search == "grid":
+        from sklearn.model_selection import ParameterGrid
+        return list(ParameterGrid(param_grid))
+    # Only n_estimators matters for the memory bound; use the top of its range
+    dist = param_distributions.get("n_estimators", [DEFAULT_RF_PARAMS["n_estimators"]])
+    top = dist.support()[1] if hasattr(dist, "support") else max(dist)
+    return [{"n_estimators": top}]
+
+
+def build_leaderboard(cv_results, n_samples, n_splits):
+    res = pd.DataFrame(cv_results)
+    res["params_json"] = res["params"].apply(lambda p: json.dumps(p, sort_keys=True, default=str))
+    if "iter" not in res:
+        res["iter"] = 0
+        res["n_resources"] = n_samples
+    # Successive halving reports one row per candidate per round: keep the last round each reached
+    res = res.sort_values("iter").groupby("params_json", sort=False).tail(1)
+    val_rows = res["n_resources"] / n_splits
+
+    board = pd.DataFrame({
+        "roc_auc": res["mean_test_score"],
+        "roc_auc_std": res["std_test_score"],
+        "fit_time_s": res["mean_fit_time"],
+        "predict_time_s": res["mean_score_time"],
+        "predict_ms_per_1k_rows": res["mean_score_time"] / val_rows * 1000,
+        "rounds_survived": res["iter"] + 1,
+        "n_samples": res["n_resources"],
+        "params": res["params_json"],
+    })
+    # Candidates that survived more halving rounds rank first, then by AUC
+    board = board.sort_values(["rounds_survived", "roc_auc"], ascending=False).reset_index(drop=True)
+    board.index.name = "rank"
+    board.index += 1
+    return board
+
+
+def tune_churn_model(search="grid", n_iter=30, cv=5, n_jobs=-1, memory_budget_mb=None, halving=True,
+                     leaderboard_path="tuning_leaderboard.csv", best_params_path="best_params.json",
+                     param_grid=None, param_distributions=None):
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import (GridSearchCV, HalvingGridSearchCV, HalvingRandomSearchCV,
+                                         RandomizedSearchCV, StratifiedKFold)
+
+    X, y, _ = load_training_data()
+    param_grid = param_grid or PARAM_GRID
+    param_distributions = param_distributions or default_param_distributions()
+
+    candidates = _candidates_for_budget(search, param_grid, param_distributions)
+    n_jobs = _effective_n_jobs(n_jobs, memory_budget_mb, _worker_memory_bytes(X, candidates))
+
+    # Each forest stays single-threaded; parallelism comes from the process pool over (candidate, fold)
+    rf = RandomForestClassifier(random_state=42, n_jobs=1)
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+    common = dict(scoring="roc_auc", cv=folds, n_jobs=n_jobs, refit=False, verbose=1)
+
+    if search == "grid":
+        searcher = (HalvingGridSearchCV(rf, param_grid, factor=3, random_state=42, **common) if halving
+                    else GridSearchCV(rf, param_grid, **common))
+    else:
+        # "exhaust" (the grid variant's default) sizes the first round so the last one uses all rows;
+        # the random variant defaults to the smallest round, leaving the winner picked on a few hundred
+        searcher = (HalvingRandomSearchCV(rf, param_distributions, n_candidates=n_iter, factor=3,
+                                          min_resources="exhaust", random_state=42, **common)
+                    if halving else RandomizedSearchCV(rf, param_distributions, n_iter=n_iter, random_state=42, **common))
+
+    print(f"Tuning Random Forest ({search} search, {cv}-fold CV, halving={halving}, n_jobs={n_jobs})...")
+    searcher.fit(X, y)
+
+    board = build_leaderboard(searcher.cv_results_, len(X), cv)
+    board.to_csv(leaderboard_path)
+    best = json.loads(board.iloc[0]["params"])
+    with open(best_params_path, "w") as f:
+        json.dump(best, f, indent=2)
+
+    print(board.head(10).to_string())
+    print(f"Done. Leaderboard saved to {leaderboard_path}, best params to {best_params_path}")
+    return board
+
+
 if __name__ == "__main__":
-    train_churn_model()
+    parser = argparse.ArgumentParser(description="Train (or tune) the churn model")
+    parser.add_argument("--params", help="JSON file of model params for --backend (e.g. best_params.json)")
+    parser.add_argument("--backend", choices=BACKENDS, default="rf",
+                        help="rf = random forest, hgb = histogram gradient boosting with native categoricals")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help=f"Fit every backend and write AUC/size/fit time/latency to {COMPARISON_PATH}")
+    parser.add_argument("--tune", action="store_true", help="Run cross-validated hyperparameter search instead")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--n-iter", type=int, default=30, help="Candidates for random search")
+    parser.add_argument("--cv", type=int, default=5, help="Stratified folds")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    parser.add_argument("--memory-budget-mb", type=float, default=None, help="Caps workers so estimated memory fits")
+    parser.add_argument("--no-halving", action="store_true", help="Evaluate every candidate on all data")
+    parser.add_argument("--leaderboard", default="tuning_leaderboard.csv")
+    parser.add_argument("--incremental", metavar="CSV", help="Warm-start the saved forest on a new batch of rows")
+    parser.add_argument("--new-trees", type=int, default=20, help="Trees added per incremental batch")
+    parser.add_argument("--max-tree-age", type=int, default=None, help="Retire trees older than this many batches")
+    parser.add_argument("--out-of-core", metavar="CSV",
+                        help="Train a streaming histogram boosted model on a file too large for memory")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk for --out-of-core")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="Skip the feature importance and confusion matrix plots (matplotlib is never imported)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    if args.compare_backends:
+        compare_backends()
+    elif args.out_of_core:
+        params = None
+        if args.params:
+            with open(args.params) as f:
+                params = json.load(f)
+        train_out_of_core(args.out_of_core, chunksize=args.chunksize, params=params)
+    elif args.incremental:
+        update_churn_model(args.incremental, n_new_trees=args.new_trees, max_tree_age=args.max_tree_age)
+    elif args.tune:
+        tune_churn_model(search=args.search, n_iter=args.n_iter, cv=args.cv, n_jobs=args.n_jobs,
+                         memory_budget_mb=args.memory_budget_mb, halving=not args.no_halving,
+                         leaderboard_path=args.leaderboard)
+    else:
+        params = None
+        if args.params:
+            with open(args.params) as f:
+                params = json.load(f)
+        train_churn_model(params, backend=args.backend, plots=not args.no_plots)
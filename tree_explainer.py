@@ -0,0 +1,230 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from compact_model import CompactForest, flatten_forest
+
+# Leaf paths per work unit; blocks are spread over threads
+LEAVES_PER_BLOCK = 500
+# Rows per step are sized so one block's (leaves x slots x rows) temporaries stay cache-sized
+BLOCK_ELEMENTS = 250_000
+
+
+def is_forest(model):
+    """Whether TreeExplainer accepts ``model``: a fitted RandomForestClassifier, a CompactForest or its arrays."""
+    if isinstance(model, (dict, CompactForest)):
+        return True
+    from sklearn.ensemble import RandomForestClassifier
+    return isinstance(model, RandomForestClassifier) and hasattr(model, "estimators_")
+
+
+def _forest_arrays(model):
+    if isinstance(model, dict):
+        return model
+    if isinstance(model, CompactForest):
+        return model.arrays
+    if not is_forest(model):
+        raise ValueError(f"Risk drivers need a random forest, not a {type(model).__name__}")
+    return flatten_forest(model)
+
+
+def _leaf_paths(arrays):
+    """Root-to-leaf paths of every tree, as ``(leaf, {feature: (lo, hi, nan_ok, z)})``.
+
+    The splits a path makes on one feature collapse into ``lo < x <= hi`` (``nan_ok``:
+    a missing value follows the path too) and ``z``, the share of the training cover
+    that goes down the path's branches on that feature.
+    """
+    feature = arrays["feature"].tolist()
+    threshold = arrays["threshold"].tolist()
+    left, right = arrays["left"].tolist(), arrays["right"].tolist()
+    cover = arrays["cover"].tolist()
+    nan_left = arrays["missing_go_to_left"].tolist()
+
+    paths = []
+    for root in arrays["roots"].tolist():
+        stack = [(root, {})]
+        while stack:
+            node, conds = stack.pop()
+            if left[node] == node:
+                paths.append((node, conds))
+                continue
+            f, thr = feature[node], threshold[node]
+            for child, is_left in ((left[node], True), (right[node], False)):
+                lo, hi, nan_ok, z = conds.get(f, (-np.inf, np.inf, True, 1.0))
+                if is_left:
+                    hi = min(hi, thr)
+                else:
+                    lo = max(lo, thr)
+                branch = dict(conds)
+                branch[f] = (lo, hi, nan_ok and nan_left[node] == is_left, z * cover[child] / cover[node])
+                stack.append((child, branch))
+    return paths
+
+
+def _make_block(paths, value, n_features):
+    # Pad every path to the block's longest one with neutral entries (always satisfied, z=1)
+    width = max(len(conds) for _, conds in paths)
+    shape = (len(paths), width)
+    block = {
+        "feature": np.zeros(shape, dtype=np.intp),
+        "lo": np.full(shape, -np.inf),
+        "hi": np.full(shape, np.inf),
+        "nan_ok": np.ones(shape, dtype=bool),
+        "z": np.ones(shape),
+        "value": np.array([value[leaf] for leaf, _ in paths]),
+    }
+    for i, (_, conds) in enumerate(paths):
+        for j, (f, (lo, hi, nan_ok, z)) in enumerate(conds.items()):
+            block["feature"][i, j] = f
+            block["lo"][i, j], block["hi"][i, j] = lo, hi
+            block["nan_ok"][i, j], block["z"][i, j] = nan_ok, z
+
+    # The integrand has degree < width, so ceil(width / 2) Gauss-Legendre points are exact
+    t, w = np.polynomial.legendre.leggauss(max(1, (width + 1) // 2))
+    t, w = (t + 1) / 2, w / 2
+    # With o_j in {0, 1} every factor is either a_j(t) = z_j + (1 - z_j) t (satisfied) or
+    # b_j(t) = z_j (1 - t), so a row's product is exp(sum log b + o @ (log a - log b))
+    z = block["z"][..., None]
+    a, b = z + (1 - z) * t, z * (1 - t)
+    block["log_b"] = np.log(b).sum(axis=1)[..., None]
+    block["log_ratio"] = (np.log(a) - np.log(b)).transpose(0, 2, 1)
+    # Integral weights with the leaf value folded in: phi = from_b @ E + o * ((from_a - from_b) @ E)
+    value = block["value"][:, None, None]
+    from_a = value * (1 - z) * w / a
+    from_b = -value * z * w / b
+    block["weights"] = np.concatenate([from_b, from_a - from_b], axis=1)
+
+    # Sums the (leaf, slot) contributions into per-feature totals; padding slots are dropped
+    used = np.zeros(shape, dtype=bool)
+    for i, (_, conds) in enumerate(paths):
+        used[i, :len(conds)] = True
+    slots = np.flatnonzero(used.ravel())
+    # scipy is only needed once an explainer is built, not by everything that imports this module
+    import scipy.sparse as sp
+    block["scatter"] = sp.csr_matrix(
+        (np.ones(len(slots)), (block["feature"].ravel()[slots], slots)), shape=(n_features, used.size),
+    )
+    return block
+
+
+class TreeExplainer:
+    """Exact path-dependent SHAP values (TreeSHAP) for a random forest, in numpy.
+
+    Each leaf is a product game over the distinct features on its path,
+    ``v(S) = value * prod_{j in S} o_j * prod_{j not in S} z_j`` with ``o_j`` = "the row
+    satisfies the path's conditions on j", and its Shapley values have a closed form:
+
+        phi_i = value * (o_i - z_i) * integral_0^1 prod_{j != i} (z_j + (o_j - z_j) t) dt
+
+    The integral is evaluated exactly by quadrature, so explaining a batch is dense
+    array arithmetic over (rows x leaves) instead of a recursive walk per row.
+    Accepts a fitted ``RandomForestClassifier``, a ``CompactForest`` or its arrays.
+    """
+
+    def __init__(self, model, n_jobs=None):
+        arrays = _forest_arrays(model)
+        if "cover" not in arrays:
+            raise ValueError("Model arrays have no node cover; re-run train_model.py to re-export rf_compact.pkl")
+        self.feature_names = np.asarray(arrays["feature_names"], dtype=object)
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+
+        n_trees = len(arrays["roots"])
+        # Forest output is the mean over trees, so each leaf counts 1/n_trees
+        value = arrays["value"] / n_trees
+        self.expected_value = float(value[arrays["roots"]].sum())
+
+        # Shortest paths first so each block pads to a similar width (single-leaf trees add nothing)
+        paths = sorted((p for p in _leaf_paths(arrays) if p[1]), key=lambda p: len(p[1]))
+        self.blocks = [
+            _make_block(paths[i:i + LEAVES_PER_BLOCK], value, len(self.feature_names))
+            for i in range(0, len(paths), LEAVES_PER_BLOCK)
+        ]
+
+    def _block_values(self, block, X, has_nan):
+        n_leaves, width = block["feature"].shape
+        step = max(1, BLOCK_ELEMENTS // (n_leaves * 3 * width))
+        phi = np.empty((X.shape[1], len(self.feature_names)))
+        for start in range(0, X.shape[1], step):
+            # (leaves, slots, rows): every leaf is one small matrix product below, no transposes
+            x = X[:, start:start + step][block["feature"]]
+            satisfied = (x > block["lo"][..., None]) & (x <= block["hi"][..., None])
+            if has_nan:
+                satisfied |= np.isnan(x) & block["nan_ok"][..., None]
+            o = satisfied.astype(np.float64)
+            products = np.exp(block["log_b"] + block["log_ratio"] @ o)
+            parts = block["weights"] @ products
+            contrib = parts[:, :width] + o * parts[:, width:]
+            phi[start:start + step] = (block["scatter"] @ contrib.reshape(-1, x.shape[2])).T
+        return phi
+
+    def contributions(self, X):
+        return self.shap_values(X)
+
+    def shap_values(self, X):
+        """``(n_rows, n_features)`` contributions; each row sums to prediction - ``expected_value``."""
+        # Same float32 view of the features as the forest's own traversal
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        # Feature-major, so gathering a block's path features gives (leaves, slots, rows)
+        X = np.ascontiguousarray(X.T)
+        has_nan = bool(np.isnan(X).any())
+        if self.n_jobs == 1 or len(self.blocks) == 1:
+            parts = [self._block_values(block, X, has_nan) for block in self.blocks]
+        else:
+            with ThreadPoolExecutor(self.n_jobs) as pool:
+                parts = list(pool.map(lambda block: self._block_values(block, X, has_nan), self.blocks))
+        return np.sum(parts, axis=0)
+
+
+class PathExplainer:
+    """Decision-path contributions (Saabas) for a random forest: fast, not Shapley values.
+
+    Each split on a row's path credits its feature with the change in churn rate from
+    the node to the child the row goes to. The totals are precomputed per leaf, so a
+    row costs one leaf lookup per tree and a sum (~10k rows/s on the 100-tree forest).
+    Rows still sum to prediction - ``expected_value``, but unlike ``TreeExplainer`` the
+    branches a row does not take get no say, and features split near the root tend to
+    get less credit.
+    """
+
+    def __init__(self, model):
+        arrays = _forest_arrays(model)
+        self.forest = CompactForest(arrays)
+        self.feature_names = np.asarray(arrays["feature_names"], dtype=object)
+        n_trees = len(arrays["roots"])
+        value = arrays["value"] / n_trees
+        self.expected_value = float(value[arrays["roots"]].sum())
+
+        # Walk all trees one depth level at a time: a child's totals are its parent's plus its own step
+        left, right, feature = arrays["left"], arrays["right"], arrays["feature"]
+        totals = np.zeros((len(left), len(self.feature_names)))
+        level = np.asarray(arrays["roots"])
+        while len(level):
+            level = level[left[level] != level]
+            for child in (left[level], right[level]):
+                totals[child] = totals[level]
+                totals[child, feature[level]] += value[child] - value[level]
+            level = np.concatenate([left[level], right[level]])
+        leaves = np.flatnonzero(left == np.arange(len(left)))
+        # Leaf node -> row of the per-leaf table
+        self.leaf_row = np.full(len(left), -1)
+        self.leaf_row[leaves] = np.arange(len(leaves))
+        self.leaf_totals = totals[leaves]
+
+    def contributions(self, X):
+        """``(n_rows, n_features)`` contributions; each row sums to prediction - ``expected_value``."""
+        rows = self.leaf_row[self.forest.apply(X)]
+        phi = np.zeros((rows.shape[0], len(self.feature_names)))
+        for t in range(rows.shape[1]):
+            phi += self.leaf_totals[rows[:, t]]
+        return phi
+
+
+def top_drivers(phi, feature_names, k=3):
+    """Names and contributions of the ``k`` features pushing each row's risk up the most."""
+    phi = np.atleast_2d(phi)
+    order = np.argsort(-phi, axis=1, kind="stable")[:, :k]
+    return np.asarray(feature_names, dtype=object)[order], np.take_along_axis(phi, order, axis=1)
@@ -0,0 +1,188 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_cache import DATA_PATH, load_dataset
+from encoding import CategoryEncoder
+from score import HIGH_RISK_THRESHOLD, encode_chunk, load_scoring_bundle
+
+# Rows per predict_proba call: one call for thousands of scenarios, bounded memory for millions
+DEFAULT_CHUNKSIZE = 100_000
+# Customers averaged over per scenario in a partial-dependence sweep (a random sample above that),
+# fewer when there are many scenarios so the scored matrix stays under MAX_SWEEP_ROWS
+MAX_SEGMENT_ROWS = 1_000
+MAX_SWEEP_ROWS = 100_000
+# Numeric levels per swept axis (integer features with a small range use every value)
+DEFAULT_LEVELS = 12
+
+
+def axis_values(df, col, levels=DEFAULT_LEVELS):
+    """Values a sweep over ``col`` visits: every category, every integer, or evenly spaced levels."""
+    values = df[col]
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+        return sorted(pd.unique(values.dropna()).tolist())
+    lo, hi = float(values.min()), float(values.max())
+    if pd.api.types.is_integer_dtype(values) and hi - lo <= 100:
+        return list(range(int(lo), int(hi) + 1))
+    return np.linspace(lo, hi, levels).round(2).tolist()
+
+
+def scenario_grid(axes):
+    """Every combination of ``axes`` (``{feature: [values]}``), first axis varying slowest."""
+    return pd.MultiIndex.from_product(list(axes.values()), names=list(axes)).to_frame(index=False)
+
+
+def _encode_values(encoder, col, values):
+    if col in encoder.categories:
+        codes = encoder.codes(col, values).astype(np.float64)
+        codes[codes < 0] = np.nan
+        return codes
+    return np.asarray(values, dtype=np.float64)
+
+
+def _derive(X, index, changed):
+    # Keep the enriched columns consistent with what changed, as they are in the source data:
+    # TotalCharges follows tenure x MonthlyCharges, profitability is TotalCharges - acquisition cost
+    changed = set(changed)
+    if {"tenure", "MonthlyCharges"} & changed and "TotalCharges" not in changed and "TotalCharges" in index:
+        X[:, index["TotalCharges"]] = X[:, index["tenure"]] * X[:, index["MonthlyCharges"]]
+        changed.add("TotalCharges")
+    profit = "Rentabilite_Nette_Simulee"
+    if {"TotalCharges", "Cout_Acquisition_Client"} & changed and profit not in changed and profit in index:
+        X[:, index[profit]] = X[:, index["TotalCharges"]] - X[:, index["Cout_Acquisition_Client"]]
+
+
+def build_matrix(base, grid, feature_names, encoder, derive=True):
+    """Encoded rows of ``base`` under every scenario of ``grid``, scenario-major.
+
+    ``base`` is one encoded profile or a matrix of them; the result has
+    ``len(grid) * len(base)`` rows, the ``base`` rows repeated once per scenario.
+    """
+    index = {col: i for i, col in enumerate(feature_names)}
+    base = np.atleast_2d(np.asarray(base, dtype=np.float64))
+    X = np.tile(base, (len(grid), 1))
+    for col in grid.columns:
+        X[:, index[col]] = np.repeat(_encode_values(encoder, col, grid[col]), len(base))
+    if derive:
+        _derive(X, index, grid.columns)
+    return X
+
+
+def predict_chunked(model, X, feature_names, chunksize=DEFAULT_CHUNKSIZE):
+    probs = np.empty(len(X))
+    for start in range(0, len(X), chunksize):
+        chunk = pd.DataFrame(X[start:start + chunksize], columns=feature_names)
+        probs[start:start + chunksize] = model.predict_proba(chunk)[:, 1]
+    return probs
+
+
+def sweep(model, encoder, base, axes, chunksize=DEFAULT_CHUNKSIZE, derive=True):
+    """Churn probability for every combination of ``axes`` applied to ``base``.
+
+    With one profile this is its ICE surface; with a matrix of real customers the
+    probability is averaged over them (partial dependence). The whole sweep is
+    one matrix scored in ``chunksize`` slices. Returns the grid with a
+    ``churn_probability`` column.
+    """
+    feature_names = list(model.feature_names_in_)
+    grid = scenario_grid(axes)
+    base = np.atleast_2d(np.asarray(base, dtype=np.float64))
+    probs = predict_chunked(model, build_matrix(base, grid, feature_names, encoder, derive), feature_names, chunksize)
+    grid["churn_probability"] = probs.reshape(len(grid), len(base)).mean(axis=1)
+    return grid
+
+
+def segment_mask(df, segment):
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in segment.items():
+        mask &= (df[col] == value).to_numpy()
+    return mask
+
+
+def sample_segment(customers, n_scenarios=1, seed=42):
+    max_rows = max(1, min(MAX_SEGMENT_ROWS, MAX_SWEEP_ROWS // n_scenarios))
+    return customers if len(customers) <= max_rows else customers.sample(max_rows, random_state=seed)
+
+
+def segment_whatif(model, encoder, customers, changes, id_col="customerID", chunksize=DEFAULT_CHUNKSIZE, derive=True):
+    """Risk of real ``customers`` now and after ``changes`` (``{feature: new value}``), one row each."""
+    feature_names = list(model.feature_names_in_)
+    X = encode_chunk(customers, encoder, feature_names).to_numpy(dtype=np.float64)
+    # Current and changed profiles stacked, so both sides come from the same predict_proba calls
+    after = build_matrix(X, pd.DataFrame({col: [value] for col, value in changes.items()}), feature_names, encoder,
+                         derive)
+    probs = predict_chunked(model, np.vstack([X, after]), feature_names, chunksize)
+    result = pd.DataFrame({"before": probs[:len(X)], "after": probs[len(X):]})
+    if id_col in customers.columns:
+        result.insert(0, id_col, customers[id_col].to_numpy())
+    result["delta"] = result["after"] - result["before"]
+    return result
+
+
+def summarize_whatif(result, threshold=HIGH_RISK_THRESHOLD):
+    high_before, high_after = result["before"] > threshold, result["after"] > threshold
+    return {
+        "customers": len(result),
+        "mean_before": float(result["before"].mean()),
+        "mean_after": float(result["after"].mean()),
+        "high_risk_before": int(high_before.sum()),
+        "high_risk_after": int(high_after.sum()),
+        "leave_high_risk": int((high_before & ~high_after).sum()),
+        "enter_high_risk": int((~high_before & high_after).sum()),
+    }
+
+
+def _parse_assignments(items, df):
+    # "Col=value" pairs; values are cast to the column's type
+    parsed = {}
+    for item in items or []:
+        col, sep, value = item.partition("=")
+        if not sep or col not in df.columns:
+            raise ValueError(f"Expected COLUMN=VALUE with a known column, got {item!r}")
+        if pd.api.types.is_numeric_dtype(df[col]):
+            value = float(value)
+        parsed[col] = value
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score what-if scenarios with the current model version")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--segment", nargs="+", metavar="COL=VALUE", help="Only customers matching all of these")
+    parser.add_argument("--set", nargs="+", metavar="COL=VALUE", help="Segment what-if: apply these changes")
+    parser.add_argument("--grid", nargs="+", metavar="COL", help="Sweep every combination of these features")
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS, help="Levels per numeric grid axis")
+    parser.add_argument("-o", "--output", help="Write the per-customer or per-scenario results to this CSV")
+    args = parser.parse_args()
+    if not args.set and not args.grid:
+        parser.error("give --set (segment what-if) or --grid (sweep)")
+
+    bundle = load_scoring_bundle()
+    encoder = CategoryEncoder(bundle.encoders, unknown="nan")
+    df = load_dataset(args.data)
+    customers = df[segment_mask(df, _parse_assignments(args.segment, df))]
+    print(f"Model {bundle.version}, {len(customers):,} customers in segment")
+
+    start = time.perf_counter()
+    if args.set:
+        result = segment_whatif(bundle.model, encoder, customers, _parse_assignments(args.set, df))
+        s = summarize_whatif(result)
+        print(f"Mean churn risk {s['mean_before']:.1%} -> {s['mean_after']:.1%}; "
+              f"high risk {s['high_risk_before']:,} -> {s['high_risk_after']:,} "
+              f"({s['leave_high_risk']:,} leave, {s['enter_high_risk']:,} enter)")
+    else:
+        axes = {col: axis_values(df, col, args.levels) for col in args.grid}
+        n_scenarios = int(np.prod([len(values) for values in axes.values()]))
+        base = encode_chunk(sample_segment(customers, n_scenarios), encoder, bundle.feature_names)
+        result = sweep(bundle.model, encoder, base, axes)
+        print(result.sort_values("churn_probability").to_string(index=False, max_rows=20))
+    print(f"Scored in {time.perf_counter() - start:.2f}s")
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()